@@ -0,0 +1,52 @@
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from wmb_browser.backend.cemba_cell import CEMBAsnmCCells
+from wmb_browser.backend.dataset import Dataset
+
+# the backend package exports the lazy cemba_cell dataset under the module name
+cemba_cell_module = importlib.import_module("wmb_browser.backend.cemba_cell")
+
+
+class _FakeGenome:
+    gene_ids = {"Gad1": "ENSMUSG01.1", "Gad1-alias": "ENSMUSG01.1", "Sst": "ENSMUSG02.1"}
+
+    def gene_name_to_id(self, name):
+        return self.gene_ids[name]
+
+
+@pytest.fixture
+def cells(monkeypatch):
+    monkeypatch.setattr(cemba_cell_module, "mm10", _FakeGenome())
+    obs_ids = pd.Index([f"c{i}" for i in range(100)], name="cell")
+    values = np.random.default_rng(0).random((100, 3)).astype("float32")
+    genes = ["ENSMUSG01.1", "ENSMUSG02.1", "ENSMUSG03.1"]
+
+    # only the Dataset part of the cells, without the browser data files
+    cells = object.__new__(CEMBAsnmCCells)
+    Dataset.__init__(cells, "cells", obs_ids, "cell")
+    cells.add_var_matrix(
+        "gene_mch", xr.DataArray(values, dims=("cell", "gene"), coords={"cell": obs_ids, "gene": genes}), "gene"
+    )
+    return cells, values
+
+
+def test_genes_values_with_repeated_genes(cells):
+    cells, values = cells
+    data = cells.get_genes_values("gene_mch", ["Sst", "Gad1", "Sst", "Gad1-alias", "ENSMUSG01.1"])
+
+    assert data.columns.tolist() == ["Sst", "Gad1", "Gad1-alias", "ENSMUSG01.1"]
+    np.testing.assert_array_equal(data.to_numpy(), values[:, [1, 0, 0, 0]])
+    # each gene is read and cached once
+    assert cells.var_cache_stats["items"] == 2
+
+
+def test_var_values_batch_with_repeated_vars(cells):
+    cells, values = cells
+    data = cells.get_var_values_batch("gene_mch", ["ENSMUSG03.1", "ENSMUSG01.1", "ENSMUSG03.1"])
+    assert data.columns.tolist() == ["ENSMUSG03.1", "ENSMUSG01.1"]
+    np.testing.assert_array_equal(data.to_numpy(), values[:, [2, 0]])
@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from wmb_browser.backend import dataset as dataset_module
+from wmb_browser.backend.dataset import Dataset
+
+
+@pytest.fixture
+def coords():
+    obs_ids = pd.Index([f"c{i}" for i in range(1000)], name="cell")
+    values = np.random.default_rng(0).random((1000, 2)).astype("float16")
+    return pd.DataFrame(values, index=obs_ids)
+
+
+@pytest.fixture
+def dataset(coords):
+    ds = Dataset("test", coords.index, "cell")
+    ds.add_metadata(pd.Series(pd.Categorical([f"g{i % 7}" for i in range(1000)]), index=coords.index, name="group"))
+    ds.add_coords("umap", coords)
+    return ds
+
+
+def test_add_coords_does_not_copy(dataset, coords):
+    """Coords already in the target dtype are stored without a copy."""
+    cached = dataset.get_coords("umap")
+    assert cached is dataset.get_coords("umap")
+    assert np.shares_memory(cached["umap_0"].to_numpy(), coords.to_numpy())
+
+
+def test_plot_data_of_all_rows_are_views(dataset):
+    cached = dataset.get_coords("umap")
+    plot_data = dataset.get_plot_data("umap", "group")
+
+    assert plot_data.shape == (1000, 3)
+    for col in ["umap_0", "umap_1"]:
+        assert np.shares_memory(plot_data[col].to_numpy(), cached[col].to_numpy())
+    assert np.shares_memory(plot_data["group"].cat.codes.to_numpy(), dataset.get_metadata("group").cat.codes.to_numpy())
+
+
+@pytest.mark.parametrize("sample", [None, 100])
+def test_plotting_many_genes_keeps_memory_bounded(dataset, coords, sample):
+    """Plotting hundreds of distinct genes neither grows the cached coords nor the var cache beyond its budget."""
+    genes = [f"G{i}" for i in range(300)]
+    values = np.random.default_rng(0).random((1000, 300)).astype("float32")
+    dataset.add_var_matrix(
+        "gene", xr.DataArray(values, dims=("cell", "gene"), coords={"cell": coords.index, "gene": genes}), "gene"
+    )
+    column_bytes = 1000 * 4
+    dataset.set_var_cache(max_bytes=50 * column_bytes)
+
+    cached = dataset.get_coords("umap")
+    columns = cached.columns.tolist()
+    memory_usage = cached.memory_usage(deep=True)
+    metadata_columns = dataset._metadata.columns.tolist()
+    for i, gene in enumerate(genes):
+        # plot every gene twice, the second request reads and caches the full column
+        for _ in range(2):
+            plot_data = dataset.get_plot_data("umap", "group", var_dict={"gene": gene}, sample=sample)
+            np.testing.assert_array_equal(plot_data[f"gene:{gene}"].to_numpy(), values[plot_data.index, i])
+
+    assert dataset.get_coords("umap") is cached
+    assert cached.columns.tolist() == columns
+    pd.testing.assert_series_equal(cached.memory_usage(deep=True), memory_usage)
+    assert dataset._metadata.columns.tolist() == metadata_columns
+    stats = dataset.var_cache_stats
+    assert stats["bytes"] <= stats["max_bytes"] == 50 * column_bytes
+    assert stats["items"] <= 50
+    assert stats["evictions"] > 0
+
+
+def test_sampled_plot_data_matches_coords(dataset, coords):
+    plot_data = dataset.get_plot_data("umap", "group", sample=100)
+
+    assert plot_data.shape == (100, 3)
+    np.testing.assert_array_equal(plot_data[["umap_0", "umap_1"]].to_numpy(), coords.to_numpy()[plot_data.index])
+    assert (plot_data["group"].to_numpy() == [f"g{i % 7}" for i in plot_data.index]).all()
+
+
+@pytest.mark.parametrize("sample", [None, 100])
+def test_replacing_plot_data_columns_keeps_coords(dataset, coords, sample):
+    """Figures replace the plot data columns with quantized values, the cached coords must stay the same."""
+    expected = coords.to_numpy().copy()
+    plot_data = dataset.get_plot_data("umap", "group", sample=sample)
+    plot_data["umap_0"] = np.zeros(plot_data.shape[0], dtype="float16")
+    plot_data["umap_1"] = plot_data["umap_1"].round(1)
+
+    np.testing.assert_array_equal(dataset.get_coords("umap").to_numpy(), expected)
+    assert dataset.get_plot_data("umap", sample=sample)["umap_0"].ne(0).any()
+
+
+def test_stratified_sample_order_caps_reserved(coords, monkeypatch):
+    """Rare categories are kept in small samples, but the reserved objects never dominate the sample."""
+    monkeypatch.setattr(dataset_module, "SAMPLE_MAX_RESERVED", 100)
+    groups = ["rare" if i < 3 else f"g{i % 50}" for i in range(1000)]
+    ds = Dataset("test", coords.index, "cell")
+    ds.add_metadata(pd.Series(pd.Categorical(groups), index=coords.index, name="group"))
+    ds.add_coords("umap", coords)
+    ds.set_sample_order(stratify_by="group", min_per_group=10)
+
+    plot_data = ds.get_plot_data("umap", "group", sample=200)
+    counts = plot_data["group"].value_counts()
+    assert counts["rare"] >= 1
+    # 51 categories share 100 reserved objects, one per category, the rest of the sample is uniform
+    assert counts.max() < 20
+    first = ds.get_plot_data("umap", "group", sample=51)["group"]
+    assert first.nunique() == 51
+
+
+def test_trimmed_coord_bounds_are_computed_on_demand(dataset, coords):
+    assert list(dataset._coord_bounds["umap"]) == [0.0]
+    values = coords.to_numpy(dtype="float32")
+    np.testing.assert_array_equal(dataset.get_coord_bounds("umap"), np.stack([values.min(0), values.max(0)], axis=1))
+
+    trimmed = dataset.get_coord_bounds("umap", delta=0.01)
+    np.testing.assert_allclose(trimmed, np.quantile(values, [0.01, 0.99], axis=0).T, rtol=1e-6)
+    assert 0.01 in dataset._coord_bounds["umap"]
+
+
+def test_first_plot_of_a_gene_reads_only_sampled_rows(dataset, coords, monkeypatch):
+    """The top up batches of one request count as one request, the full column is read on the second request."""
+    values = np.random.default_rng(0).random((1000, 3)).astype("float32")
+    # missing values drop sampled rows, so the request reads several top up batches
+    values[::3, 0] = np.nan
+    dataset.add_var_matrix(
+        "gene",
+        xr.DataArray(values, dims=("cell", "gene"), coords={"cell": coords.index, "gene": ["G0", "G1", "G2"]}),
+        "gene",
+    )
+    reads = []
+    read_var_columns = dataset._read_var_columns
+
+    def _counted_read(set_name, var_names, obs_positions=None):
+        reads.append("full" if obs_positions is None else "rows")
+        return read_var_columns(set_name, var_names, obs_positions)
+
+    monkeypatch.setattr(dataset, "_read_var_columns", _counted_read)
+
+    plot_data = dataset.get_plot_data("umap", var_dict={"gene": "G0"}, sample=100)
+    assert plot_data.shape[0] == 100
+    assert len(reads) > 1 and set(reads) == {"rows"}
+
+    reads.clear()
+    second = dataset.get_plot_data("umap", var_dict={"gene": "G0"}, sample=100)
+    assert reads == ["full"]
+    pd.testing.assert_frame_equal(second, plot_data)
+
+    reads.clear()
+    dataset.get_plot_data("umap", var_dict={"gene": "G0"}, sample=100)
+    assert reads == []
+
+
+def test_missing_value_masks_are_computed_once(coords, monkeypatch):
+    ds = Dataset("test", coords.index, "cell")
+    group = pd.Series([np.nan if i % 5 == 0 else f"g{i % 7}" for i in range(1000)], index=coords.index, name="group")
+    ds.add_metadata(group)
+    with_nan = coords.copy()
+    with_nan.iloc[::2, 0] = np.nan
+    ds.add_coords("umap", with_nan)
+
+    first = ds.get_plot_data("umap", "group", sample=100)
+    assert first.notnull().all().all()
+    assert not np.isin(first.index, np.r_[0:1000:2, 0:1000:5]).any()
+
+    def _no_scan(self):
+        raise AssertionError("missing values are scanned again")
+
+    monkeypatch.setattr(pd.DataFrame, "isnull", _no_scan)
+    monkeypatch.setattr(pd.Series, "isnull", _no_scan)
+    pd.testing.assert_frame_equal(ds.get_plot_data("umap", "group", sample=100), first)
+    monkeypatch.undo()
+
+    # replaced coords get a new mask
+    ds.add_coords("umap", coords)
+    assert ds.get_plot_data("umap", "group").shape[0] == 800
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from wmb_browser.backend import gene_store
+
+
+@pytest.fixture
+def cell_by_gene_store(tmp_path):
+    values = np.random.default_rng(0).random((100, 30, 2)).astype("float32")
+    da = xr.DataArray(
+        values,
+        dims=("cell", "gene", "mc_type"),
+        coords={"cell": [f"c{i}" for i in range(100)], "gene": [f"G{i}" for i in range(30)], "mc_type": ["CHN", "CGN"]},
+    )
+    path = tmp_path / "cell_by_gene.zarr"
+    da.to_dataset(name="frac").chunk({"cell": 50, "gene": 30}).to_zarr(path)
+    return path, values
+
+
+def test_build_gene_major_store(cell_by_gene_store, tmp_path):
+    input_path, values = cell_by_gene_store
+    output_path = tmp_path / "gene_major.zarr"
+    gene_store.build_gene_major_store(input_path, output_path, da_name="frac", gene_dim="gene", genes_per_block=8)
+
+    assert not (tmp_path / "gene_major.zarr.building").exists()
+    da = xr.open_zarr(output_path)["frac"]
+    assert da.chunks[1] == (1,) * 30
+    np.testing.assert_array_equal(da.values, values)
+
+
+def test_interrupted_build_is_not_used(cell_by_gene_store, tmp_path, monkeypatch):
+    input_path, _ = cell_by_gene_store
+    output_path = tmp_path / "gene_major.zarr"
+    monkeypatch.setattr(gene_store, "CELL_BY_GENE_MC_FRAC_ZARR_PATH", str(input_path))
+    monkeypatch.setattr(gene_store, "GENE_MAJOR_MC_FRAC_ZARR_PATH", str(output_path))
+
+    n_writes = []
+    to_zarr = xr.Dataset.to_zarr
+
+    def _interrupted_to_zarr(self, *args, **kwargs):
+        if "region" in kwargs and len(n_writes) > 0:
+            raise KeyboardInterrupt
+        n_writes.append(1)
+        return to_zarr(self, *args, **kwargs)
+
+    monkeypatch.setattr(xr.Dataset, "to_zarr", _interrupted_to_zarr)
+    with pytest.raises(KeyboardInterrupt):
+        gene_store.build_gene_major_store(input_path, output_path, da_name="frac", gene_dim="gene", genes_per_block=8)
+    assert gene_store.gene_major_store_path() == str(input_path)
+
+    monkeypatch.setattr(xr.Dataset, "to_zarr", to_zarr)
+    gene_store.build_gene_major_store(input_path, output_path, da_name="frac", gene_dim="gene", genes_per_block=8)
+    assert gene_store.gene_major_store_path() == str(output_path)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from wmb_browser.backend.genome import GenomeCoordIndex
+
+
+@pytest.fixture
+def genome_index():
+    chrom_sizes = pd.Series([1000, 500], index=["chr1", "chr2"])
+    gene_meta = pd.DataFrame(
+        [
+            ("ENSMUSG01.1", "chr1", 100, 200, "Gene1"),
+            ("ENSMUSG02.3", "chr2", 10, 20, "Dup"),
+            ("ENSMUSG03.1", "chr1", 300, 400, "Dup"),
+            ("ENSMUSG04.1", "chrUn", 1, 2, "Other"),
+        ],
+        columns=["gene_id", "chrom", "start", "end", "gene_name"],
+    ).set_index("gene_id")
+    return GenomeCoordIndex(chrom_sizes, gene_meta)
+
+
+def test_regions_and_genes_to_global_coords(genome_index):
+    coords = genome_index.to_global_coords(["chr2:1-5", "Gene1", "ENSMUSG02.3", "ENSMUSG02"])
+    np.testing.assert_array_equal(coords, [[1001, 1005], [100, 200], [1010, 1020], [1010, 1020]])
+
+
+def test_duplicated_gene_name_resolves_like_gene_name_to_id(genome_index):
+    """The last gene of a duplicated name wins, like the reversed gene name dict of MM10GenomeRef."""
+    np.testing.assert_array_equal(genome_index.to_global_coords(["Dup"]), [[300, 400]])
+    with pytest.raises(KeyError):
+        genome_index.to_global_coords(["Other"])
@@ -0,0 +1,44 @@
+import importlib
+
+import pytest
+
+higlass_module = importlib.import_module("wmb_browser.backend.higlass")
+
+
+class _Catalog:
+    def __init__(self):
+        self.checked = []
+
+    def check_tracks(self, cell_types, modalities):
+        self.checked.append(list(modalities))
+
+
+@pytest.fixture
+def browser():
+    browser = object.__new__(higlass_module.HiglassBrowser)
+    browser.default_modality_2d = "Impute 10K"
+    browser.default_modality_1d = ("mCH Frac", "ATAC CPM")
+    browser.track_catalog = _Catalog()
+    return browser
+
+
+@pytest.mark.parametrize(
+    "modality_2d, modality_1d, expected",
+    [
+        (None, None, ["Impute 10K", "mCH Frac", "ATAC CPM"]),
+        # empty modalities are not replaced by the defaults
+        ("Raw 100K", [], ["Raw 100K"]),
+        (None, "mCG Frac", ["Impute 10K", "mCG Frac"]),
+    ],
+)
+def test_2d_view_checks_the_built_modalities(browser, monkeypatch, modality_2d, modality_1d, expected):
+    built = []
+
+    def _view(cell_type, modality_2d=None, modality_1d=None, **kwargs):
+        built.append([modality_2d, *modality_1d])
+        raise StopIteration
+
+    monkeypatch.setattr(browser, "_get_cell_type_2d_view", _view)
+    with pytest.raises(StopIteration):
+        browser.multi_cell_type_2d_viewconf("CA3 Glut", modality_2d=modality_2d, modality_1d=modality_1d)
+    assert browser.track_catalog.checked == built == [expected]
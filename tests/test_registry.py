@@ -0,0 +1,112 @@
+import gc
+import os
+import pathlib
+import signal
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from wmb_browser.backend.dataset import Dataset
+from wmb_browser.backend.registry import LazyRegistry
+
+pytest.importorskip("dask")
+
+
+def _write_zarr(path, obs_index, n_vars=50):
+    values = np.random.default_rng(0).random((obs_index.size, n_vars)).astype("float32")
+    genes = [f"G{i}" for i in range(n_vars)]
+    da = xr.DataArray(values, dims=(obs_index.name, "gene"), coords={obs_index.name: obs_index, "gene": genes})
+    da.to_dataset(name="v").chunk({obs_index.name: 500, "gene": 10}).to_zarr(path)
+    return values
+
+
+def _create_dataset(tmp_path):
+    obs_ids = pd.Index([f"c{i}" for i in range(2000)], name="cell")
+    groups = pd.Index([f"g{i}" for i in range(10)], name="group")
+    obs_path = tmp_path / "obs.zarr"
+    group_path = tmp_path / "group.zarr"
+    _write_zarr(obs_path, obs_ids)
+    _write_zarr(group_path, groups)
+
+    ds = Dataset("test", obs_ids, "cell")
+    ds.add_metadata(pd.Series(pd.Categorical([f"g{i % 10}" for i in range(2000)]), index=obs_ids, name="group"))
+    ds.add_lazy_var_matrix("obs", lambda: xr.open_zarr(obs_path)["v"], var_dim="gene")
+    # group level matrices are loaded, which runs a dask compute during warm up
+    ds.add_lazy_var_matrix("group", lambda: xr.open_zarr(group_path)["v"], var_dim="gene", obs_dim="group")
+    return ds
+
+
+def _warm_up_and_fork(tmp_path, synchronous):
+    """Warm up a dataset like the gunicorn master, fork, and return the exit status of the forked worker."""
+    expected = np.random.default_rng(0).random((2000, 50)).astype("float32")[:, 4]
+    registry = LazyRegistry()
+    dataset = registry.register("dataset", lambda: _create_dataset(tmp_path))
+    registry.warm_up(background=False, synchronous=synchronous)
+    gc.freeze()
+
+    pid = os.fork()
+    if pid == 0:
+        # worker, killed by SIGALRM if the dask compute hangs
+        signal.alarm(20)
+        try:
+            ok = np.array_equal(dataset.get_var_values("obs", "G4").to_numpy(), expected)
+            ok = ok and dataset.get_var_values("group", "G3").notnull().all()
+            os._exit(0 if ok else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    return status
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_synchronous_warm_up_is_fork_safe(tmp_path):
+    """A forked worker can read var values after the components are warmed up in the master."""
+    # run the master in a fresh interpreter, no dask thread pool may exist before the warm up
+    script = (
+        "import os, pathlib, sys\n"
+        f"sys.path.insert(0, {str(pathlib.Path(__file__).parent)!r})\n"
+        "from test_registry import _warm_up_and_fork\n"
+        f"status = _warm_up_and_fork(pathlib.Path({str(tmp_path)!r}), synchronous=True)\n"
+        "sys.exit(0 if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0 else 1)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+
+
+class _Component:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.warm = False
+
+    def warm_up(self):
+        if self.fail:
+            raise RuntimeError("warm up failed")
+        self.warm = True
+
+
+def _broken_factory():
+    raise OSError("missing file")
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_failing_component_does_not_stop_warm_up(background):
+    registry = LazyRegistry()
+    registry.register("broken", _broken_factory)
+    registry.register("failing_warm_up", lambda: _Component(fail=True))
+    ok = registry.register("ok", _Component)
+
+    thread = registry.warm_up(background=background)
+    if background:
+        thread.join(timeout=10)
+
+    assert ok.loaded and ok.warm
+    status = registry.status
+    assert not status["broken"]["loaded"]
+    assert "missing file" in status["broken"]["warm_up_error"]
+    assert status["failing_warm_up"]["loaded"]
+    assert "warm up failed" in status["failing_warm_up"]["warm_up_error"]
+    assert "warm_up_error" not in status["ok"]
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from wmb_browser.backend import cache as cache_module
+from wmb_browser.backend import tile_proxy as tile_proxy_module
+from wmb_browser.backend.tile_proxy import TileProxy
+from wmb_browser.backend.tile_server import LocalTileServer, register_tile_routes, write_synthetic_tilesets
+
+flask = pytest.importorskip("flask")
+serving = pytest.importorskip("werkzeug.serving")
+
+
+@pytest.fixture
+def proxy(tmp_path):
+    return TileProxy("http://upstream.invalid/api/v1", tmp_path, timeout=1)
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    """A local tile server on a free port, recording the tile ids of each request it receives."""
+    track_table = pd.DataFrame({"uuid": ["u1", "u2"], "CellSubClass": ["CA3 Glut", "Sst Gaba"]})
+    chrom_sizes = pd.Series([20_000_000, 10_000_000], index=["chr1", "chr2"])
+    write_synthetic_tilesets(track_table, chrom_sizes, tmp_path / "tilesets", ["CA3 Glut", "Sst Gaba"])
+    tile_server = LocalTileServer.from_track_table(track_table, tmp_path / "tilesets", max_workers=2)
+
+    app = flask.Flask(__name__)
+    register_tile_routes(app, tile_server, prefix="/api/v1")
+    requests = []
+
+    @app.before_request
+    def _record():
+        requests.append(flask.request.args.getlist("d"))
+        # slow upstream, so concurrent proxy requests overlap
+        time.sleep(0.2)
+
+    server = serving.make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/api/v1", tile_server, requests
+    server.shutdown()
+    thread.join()
+
+
+@pytest.fixture(params=["requests", "urllib"])
+def http_client(request, monkeypatch):
+    """Run the tests with the pooled requests session and with the urllib fallback."""
+    if request.param == "requests":
+        if tile_proxy_module.requests is None:
+            pytest.skip("requests is not installed")
+    else:
+        monkeypatch.setattr(tile_proxy_module, "requests", None)
+    return request.param
+
+
+def test_proxy_serves_upstream_tiles(upstream, http_client, tmp_path):
+    url, tile_server, requests = upstream
+    proxy = TileProxy(url, tmp_path / "cache", timeout=5)
+
+    tile_ids = ["u1.2.0", "u2.1.1", "u9.0.0"]
+    result = json.loads(proxy.get_json("tiles", tile_ids))
+    assert result == json.loads(tile_server.tiles_json(tile_ids))
+    assert "error" in result["u9.0.0"]
+    info = json.loads(proxy.get_json("tileset_info", ["u1"]))
+    assert info == tile_server.tileset_info(["u1"])
+    assert len(requests) == 2
+
+
+def test_concurrent_requests_are_coalesced(upstream, http_client, tmp_path):
+    url, _, requests = upstream
+    proxy = TileProxy(url, tmp_path / "cache", timeout=5)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(proxy.get_json("tiles", ["u1.2.0", "u1.2.1"])))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert requests == [["u1.2.0", "u1.2.1"]]
+    assert len(set(results)) == 1
+    assert proxy.coalesced == 6
+    assert proxy._inflight == {}
+
+
+def test_expired_tiles_are_fetched_again(upstream, http_client, tmp_path, monkeypatch):
+    url, _, requests = upstream
+    now = [1000.0]
+    monkeypatch.setattr(cache_module, "time", type("Clock", (), {"time": staticmethod(lambda: now[0])}))
+    proxy = TileProxy(url, tmp_path / "cache", ttl=60, timeout=5)
+
+    first = proxy.get_json("tiles", ["u1.2.0"])
+    now[0] += 30
+    assert proxy.get_json("tiles", ["u1.2.0"]) == first
+    assert len(requests) == 1
+
+    now[0] += 31
+    assert proxy.get_json("tiles", ["u1.2.0"]) == first
+    assert len(requests) == 2
+    assert proxy.stats["disk"]["expirations"] == 1
+
+
+def test_tileset_hit_rates(upstream, http_client, tmp_path):
+    url, _, _ = upstream
+    proxy = TileProxy(url, tmp_path / "cache", timeout=5)
+
+    proxy.get_json("tiles", ["u1.2.0", "u1.2.1", "u2.2.0"])
+    proxy.get_json("tiles", ["u1.2.0", "u1.2.1", "u1.2.2"])
+    tilesets = proxy.stats["tilesets"]
+    assert tilesets["u1"] == {"hits": 2, "misses": 3, "hit_rate": 0.4}
+    assert tilesets["u2"] == {"hits": 0, "misses": 1, "hit_rate": 0.0}
+
+
+def test_cache_write_failure_still_serves_tiles(proxy, monkeypatch):
+    monkeypatch.setattr(proxy, "_fetch_upstream", lambda route, ids: {i: {"dense": i} for i in ids})
+
+    def _disk_full(key, value):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(proxy._cache, "put", _disk_full)
+    result = json.loads(proxy.get_json("tiles", ["u1.0.0", "u1.1.0"]))
+    assert result == {"u1.0.0": {"dense": "u1.0.0"}, "u1.1.0": {"dense": "u1.1.0"}}
+    assert proxy._inflight == {}
+
+
+def test_bad_upstream_payload_resolves_waiters(proxy, monkeypatch):
+    monkeypatch.setattr(proxy, "_fetch_upstream", lambda route, ids: ["not", "a", "dict"])
+    result = json.loads(proxy.get_json("tiles", ["u1.0.0"]))
+    assert "error" in result["u1.0.0"]
+    assert proxy._inflight == {}
+
+    # the tile is requested again, not blocked by a stale in-flight key
+    monkeypatch.setattr(proxy, "_fetch_upstream", lambda route, ids: {i: {"dense": i} for i in ids})
+    assert json.loads(proxy.get_json("tiles", ["u1.0.0"])) == {"u1.0.0": {"dense": "u1.0.0"}}
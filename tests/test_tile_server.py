@@ -0,0 +1,76 @@
+import base64
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wmb_browser.backend.tile_server import LocalTileServer, register_tile_routes, write_synthetic_tilesets
+
+flask = pytest.importorskip("flask")
+
+
+@pytest.fixture
+def track_table():
+    rows = [
+        ("CA3 Glut mCH Frac", "u1", "CA3 Glut", "mCH Frac"),
+        ("CA3 Glut ATAC CPM", "u2", "CA3 Glut", "ATAC CPM"),
+        ("Sst Gaba mCH Frac", "u3", "Sst Gaba", "mCH Frac"),
+    ]
+    return pd.DataFrame(rows, columns=["name", "uuid", "CellSubClass", "TrackType"]).set_index("name")
+
+
+@pytest.fixture
+def tile_server(track_table, tmp_path):
+    # 3000 bins of 10 kb, 3 tiles of 1024 bins at the max zoom level 2
+    chrom_sizes = pd.Series([20_000_000, 10_000_000], index=["chr1", "chr2"])
+    uuids = write_synthetic_tilesets(track_table, chrom_sizes, tmp_path, ["CA3 Glut"], modalities=["mCH Frac"])
+    assert uuids == ["u1"]
+    return LocalTileServer.from_track_table(track_table, tmp_path, max_workers=2)
+
+
+@pytest.fixture
+def client(tile_server):
+    app = flask.Flask(__name__)
+    register_tile_routes(app, tile_server, prefix="/api/v1")
+    return app.test_client()
+
+
+def _decode(tile):
+    return np.frombuffer(base64.b64decode(tile["dense"]), dtype="float32")
+
+
+def test_tileset_info(client):
+    response = client.get("/api/v1/tileset_info/?d=u1&d=u3")
+    assert response.headers["Access-Control-Allow-Origin"] == "*"
+    info = response.get_json()
+    assert info["u1"] == {
+        "min_pos": [0],
+        "max_pos": [30_000_000],
+        "max_width": 1024 * 4 * 10_000,
+        "tile_size": 1024,
+        "max_zoom": 2,
+    }
+    # u3 is in the track table but was not written
+    assert "error" in info["u3"]
+
+
+def test_tiles(client, tile_server, tmp_path):
+    values = np.load(tmp_path / "u1.npy")
+    tiles = client.get("/api/v1/tiles/?d=u1.2.1&d=u1.0.0&d=u1.1.5&d=u1.3.0&d=u9.0.0&d=u1.x.0").get_json()
+
+    np.testing.assert_allclose(_decode(tiles["u1.2.1"]), values[1024:2048])
+    # each value of the zoom 0 tile is the mean of 4 bins, the bins past the genome end are missing
+    expected = np.pad(values, (0, 4096 - values.size), constant_values=np.nan).reshape(1024, 4)
+    np.testing.assert_allclose(_decode(tiles["u1.0.0"])[:750], expected[:750].mean(axis=1), rtol=1e-5)
+    assert np.isnan(_decode(tiles["u1.0.0"])[750:]).all()
+    # a tile past the genome end has no values
+    assert np.isnan(_decode(tiles["u1.1.5"])).all()
+    # invalid zoom level, unknown tileset and malformed tile id
+    for tile_id in ["u1.3.0", "u9.0.0", "u1.x.0"]:
+        assert "error" in tiles[tile_id]
+
+    # valid tiles are cached, errors are not
+    stats = tile_server.tile_cache_stats
+    assert stats["items"] == 3
+    client.get("/api/v1/tiles/?d=u1.2.1&d=u1.3.0")
+    assert tile_server.tile_cache_stats["hits"] == stats["hits"] + 1
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from wmb_browser.backend.track_catalog import TrackCatalog
+
+
+@pytest.fixture
+def track_table():
+    rows = [
+        ("CA3 Glut mCH Frac", "u1", "CA3 Glut", "mCH Frac"),
+        ("CA3 Glut Impute 10K", "u2", "CA3 Glut", "Impute 10K"),
+        ("Sst Gaba mCH Frac", "u3", "Sst Gaba", "mCH Frac"),
+        ("mm10 main chrom sizes", "u4", np.nan, "chrom sizes"),
+    ]
+    return pd.DataFrame(rows, columns=["name", "uuid", "CellSubClass", "TrackType"]).set_index("name")
+
+
+@pytest.mark.parametrize("drop_track_type", [False, True])
+def test_catalog_index(track_table, drop_track_type):
+    if drop_track_type:
+        track_table = track_table.drop(columns="TrackType")
+    catalog = TrackCatalog(track_table)
+
+    assert catalog.cell_types == ["CA3 Glut", "Sst Gaba"]
+    assert catalog.modalities == ["mCH Frac", "Impute 10K"]
+    assert catalog.resolve("Sst Gaba", "mCH Frac") == ("Sst Gaba mCH Frac", "u3")
+    assert catalog.resolve("mm10 main chrom sizes") == ("mm10 main chrom sizes", "u4")
+    assert not catalog.has_track("Sst Gaba", "Impute 10K")
+    with pytest.raises(KeyError):
+        catalog.resolve("Sst Gaba", "Impute 10K")
+
+
+def test_check_tracks_reports_all_missing(track_table):
+    catalog = TrackCatalog(track_table)
+    assert catalog.missing_tracks(["CA3 Glut", "Sst Gaba", "Foo"], ["mCH Frac", "Impute 10K"]) == [
+        ("Sst Gaba", "Impute 10K"),
+        ("Foo", "mCH Frac"),
+        ("Foo", "Impute 10K"),
+    ]
+    with pytest.raises(KeyError, match="3 tracks"):
+        catalog.check_tracks(["CA3 Glut", "Sst Gaba", "Foo"], ["mCH Frac", "Impute 10K"])
+
+
+def test_check_tracks_accepts_track_names(track_table):
+    """Validation agrees with resolve, full track names are valid."""
+    catalog = TrackCatalog(track_table)
+    catalog.check_tracks(["mm10 main chrom sizes"], [None])
+    catalog.check_tracks(["Sst Gaba mCH Frac"], ["mCH Frac"])
+    for ct, m in [("mm10 main chrom sizes", None), ("Sst Gaba mCH Frac", "mCH Frac")]:
+        assert catalog.has_track(ct, m)
+        catalog.resolve(ct, m)
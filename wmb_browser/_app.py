@@ -51,6 +51,64 @@ app.index_string = """
 """
 server = app.server
 
+
+@server.route(f"/{APP_ROOT_NAME}health")
+def health():
+    """Health check, passes before the backend data is loaded, also reports the load status of each component."""
+    from wmb_browser.backend.registry import registry
+
+    return {"status": "ok", "components": registry.status}
+
+
+@server.route(f"/{APP_ROOT_NAME}memory")
+def memory():
+    """Report the resident vs. shared memory (MB) of the gunicorn master and each worker."""
+    from wmb_browser.backend.utilities import get_workers_memory_report
+
+    return get_workers_memory_report()
+
+
+@server.route(f"/{APP_ROOT_NAME}cache")
+def cache_stats():
+    """Report the hit rate of the backend caches of this worker, components not loaded yet are skipped."""
+    from wmb_browser.backend.registry import registry
+
+    stats = {}
+    cemba_cell = registry["cemba_cell"]
+    if cemba_cell.loaded:
+        stats["cemba_cell"] = {"var": cemba_cell.var_cache_stats, "figure": cemba_cell.figure_cache_stats}
+    higlass = registry["higlass"]
+    if higlass.loaded:
+        stats["higlass"] = {"html": higlass.html_cache_stats}
+    from wmb_browser.backend.tile_proxy import tile_proxy
+    from wmb_browser.backend.tile_server import tile_server
+
+    if tile_server is not None and tile_server.loaded:
+        stats["tile_server"] = {"tiles": tile_server.tile_cache_stats}
+    if tile_proxy is not None and tile_proxy.loaded:
+        stats["tile_proxy"] = tile_proxy.stats
+    return stats
+
+
+def _register_tile_server():
+    """
+    Mount the optional local tile server and tile proxy.
+
+    They are enabled by setting WMB_BROWSER_TILE_SERVER_DIR and WMB_BROWSER_TILE_PROXY_DIR.
+    """
+    from wmb_browser.backend.tile_proxy import register_tile_proxy_routes, tile_proxy
+    from wmb_browser.backend.tile_server import register_tile_routes, tile_server
+
+    if tile_server is not None:
+        register_tile_routes(server, tile_server, prefix=f"/{APP_ROOT_NAME}api/v1")
+    if tile_proxy is not None:
+        register_tile_proxy_routes(server, tile_proxy, prefix=f"/{APP_ROOT_NAME}proxy/api/v1")
+    return
+
+
+_register_tile_server()
+
+
 # judge which server I am running and change the prefix
 host_name = subprocess.run(["hostname"], stdout=subprocess.PIPE, encoding="utf-8").stdout.strip()
 print("App is running on host: ", host_name)
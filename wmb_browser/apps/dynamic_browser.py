@@ -3,17 +3,19 @@ import re
 
 import dash_bootstrap_components as dbc
 from dash import (ALL, MATCH, Input, Output, Patch, State, callback,
-                  callback_context, dcc, html)
+                  callback_context, clientside_callback, dcc, html, no_update)
 from dash.exceptions import PreventUpdate
 
 from wmb_browser.backend import *
 
 MAX_FIGURE_NUM = 8
+MAX_CLIPBOARD_CELLS = 200
 
 plot_examples = {
     "Gene mCH": ("cemba_cell,continuous_scatter,mc_all_tsne,gene_mch:Gad1", "primary"),
     "Gene mCG": ("cemba_cell,continuous_scatter,mc_all_tsne,gene_mcg:Gad1", "primary"),
     "Gene RNA": ("cemba_cell,continuous_scatter,mc_all_tsne,gene_rna:Gad1", "primary"),
+    "Gene mCH All Cells": ("cemba_cell,continuous_scatter,mc_all_tsne,gene_mch:Gad1,render=raster", "primary"),
     "Cell Subclass": ("cemba_cell,categorical_scatter,mc_all_tsne,CellSubClass", "success"),
     "Dissection Region": ("cemba_cell,categorical_scatter,mc_all_tsne,DissectionRegion", "success"),
     "Cell Subclass MERFISH": ("cemba_cell,categorical_scatter,slice59_merfish,DissectionRegion", "success"),
@@ -396,33 +398,32 @@ def update_cell_clipboard(cat_click_data, cont_click_data, curr_cell_clip_ids):
     For each click event on scatter plot,
     add a new card containing cell metadata to the clipboard, and turn on the offcanvas
     """
-    # # print all inputs
-    # print("cat_click_data", cat_click_data)
-    # print("cont_click_data", cont_click_data)
-    # print("curr_cell_clip_ids", curr_cell_clip_ids)
-
-    patch = Patch()
-    update = False
-    for data in cat_click_data + cont_click_data:
+    new_cell_ids = []
+    # only the clicked graphs, the clickData of the other graphs is from earlier clicks
+    for trigger in callback_context.triggered:
+        data = trigger["value"]
         if data is None:
             continue
-        cell_num_index = data["points"][0]["customdata"][0]
-        if cell_num_index in curr_cell_clip_ids:
+        cell_num_index = data["points"][0]["customdata"]
+        if cell_num_index in curr_cell_clip_ids or cell_num_index in new_cell_ids:
             continue
-        else:
-            curr_cell_clip_ids.append(cell_num_index)
-            update = True
-            if len(curr_cell_clip_ids) > 6:
-                del patch[-1]
-
-        card = cemba_cell.get_cell_metadata_markdown(cell_num_index)
-        col = dbc.Col(card, xl=6)
-        patch.prepend(col)
-    if update:
-        return patch, curr_cell_clip_ids
-    else:
+        new_cell_ids.append(cell_num_index)
+    if len(new_cell_ids) == 0:
         raise PreventUpdate
 
+    patch = Patch()
+    for card in cemba_cell.get_cells_metadata_cards(new_cell_ids):
+        patch.prepend(dbc.Col(card, xl=6))
+    curr_cell_clip_ids = curr_cell_clip_ids + new_cell_ids
+
+    # remove the oldest cards, which are at the end
+    n_remove = len(curr_cell_clip_ids) - MAX_CLIPBOARD_CELLS
+    if n_remove > 0:
+        for _ in range(n_remove):
+            del patch[-1]
+        curr_cell_clip_ids = curr_cell_clip_ids[n_remove:]
+    return patch, curr_cell_clip_ids
+
 
 @callback(
     Output("new-item-input", "value", allow_duplicate=True),
@@ -549,22 +550,39 @@ def delete_fugure(n_clicks):
 
 @callback(
     Output({"index": MATCH, "type": "continuous_scatter-graph"}, "figure"),
+    Output({"index": MATCH, "type": "continuous_scatter-params"}, "data"),
     Input({"index": MATCH, "type": "continuous_scatter_update-btn"}, "n_clicks"),
     State({"index": MATCH, "type": "color_input"}, "value"),
     State({"index": MATCH, "type": "color_range"}, "value"),
+    State({"index": MATCH, "type": "color_range"}, "min"),
+    State({"index": MATCH, "type": "color_range"}, "max"),
     State({"index": MATCH, "type": "coord_input"}, "value"),
     State({"index": MATCH, "type": "sample_input"}, "value"),
+    State({"index": MATCH, "type": "render_input"}, "value"),
+    State({"index": MATCH, "type": "continuous_scatter-params"}, "data"),
     prevent_initial_call=True,
 )
-def update_continous_scatter_graph(n_clicks, color, color_range, coord, sample):
+def update_continous_scatter_graph(
+    n_clicks, color, color_range, color_range_min, color_range_max, coord, sample, render, figure_params
+):
+    params = {"coord": coord, "color": color, "sample": sample, "render": render}
+    if params == figure_params and render == "points":
+        # only the color range changed, update the color axis without rebuilding the figure
+        patch = Patch()
+        patch["layout"]["coloraxis"]["cmin"] = color_range[0]
+        patch["layout"]["coloraxis"]["cmax"] = color_range[1]
+        return patch, no_update
+
     fig = cemba_cell.continuous_scatter_figure(
         color=color,
         color_range=color_range,
         coord=coord,
         sample=sample,
         marker_size="auto",
+        render=render,
+        max_color_range=(color_range_min, color_range_max),
     )
-    return fig
+    return fig, params
 
 
 @callback(
@@ -573,32 +591,78 @@ def update_continous_scatter_graph(n_clicks, color, color_range, coord, sample):
     State({"index": MATCH, "type": "color_input"}, "value"),
     State({"index": MATCH, "type": "coord_input"}, "value"),
     State({"index": MATCH, "type": "sample_input"}, "value"),
+    State({"index": MATCH, "type": "render_input"}, "value"),
     prevent_initial_call=True,
 )
-def update_categorical_scatter_graph(n_clicks, color, coord, sample):
+def update_categorical_scatter_graph(n_clicks, color, coord, sample, render):
     fig = cemba_cell.categorical_scatter_figure(
         color=color,
         coord=coord,
         sample=sample,
         marker_size="auto",
+        render=render,
     )
     return fig
 
 
+# show the category name of the hovered point, the figure only has the int category code of each point
+# as marker color and the category names once in layout.meta, so the name is looked up in the browser
+clientside_callback(
+    """
+    function(hoverData, figure) {
+        const meta = figure && figure.layout && figure.layout.meta;
+        if (!hoverData || !meta || !meta.categories) {
+            return [false, window.dash_clientside.no_update, window.dash_clientside.no_update];
+        }
+        const point = hoverData.points[0];
+        let code = point["marker.color"];
+        if (code === undefined) {
+            code = figure.data[point.curveNumber].marker.color[point.pointIndex];
+        }
+        return [true, point.bbox, `${meta.color}: ${meta.categories[code]}`];
+    }
+    """,
+    Output({"index": MATCH, "type": "categorical_scatter-tooltip"}, "show"),
+    Output({"index": MATCH, "type": "categorical_scatter-tooltip"}, "bbox"),
+    Output({"index": MATCH, "type": "categorical_scatter-tooltip"}, "children"),
+    Input({"index": MATCH, "type": "categorical_scatter-graph"}, "hoverData"),
+    State({"index": MATCH, "type": "categorical_scatter-graph"}, "figure"),
+)
+
+
+def _states_by_index(states):
+    return {state["id"]["index"]: state.get("value") for state in states}
+
+
 @callback(
     Output({"index": ALL, "type": "continuous_scatter-graph"}, "figure", allow_duplicate=True),
     Output({"index": ALL, "type": "categorical_scatter-graph"}, "figure", allow_duplicate=True),
     Input({"index": ALL, "type": "continuous_scatter-graph"}, "relayoutData"),
     Input({"index": ALL, "type": "categorical_scatter-graph"}, "relayoutData"),
     State({"index": ALL, "type": "coord_input"}, "value"),
+    State({"index": ALL, "type": "color_input"}, "value"),
+    State({"index": ALL, "type": "color_range"}, "value"),
+    State({"index": ALL, "type": "color_range"}, "min"),
+    State({"index": ALL, "type": "color_range"}, "max"),
+    State({"index": ALL, "type": "sample_input"}, "value"),
+    State({"index": ALL, "type": "render_input"}, "value"),
     prevent_initial_call=True,
 )
-def update_scatter_graph_relayout_data(cont_args, cat_args, coords):
+def update_scatter_graph_relayout_data(
+    cont_args, cat_args, coords, colors, color_ranges, color_range_mins, color_range_maxs, samples, renders
+):
+    """
+    Re-query the cells inside the new axis ranges for all panels with the same coord as the zoomed panel,
+    so zooming in shows more cells while the number of plotted cells stays within the sample budget.
+    """
     trigger = callback_context.triggered[0]
     trigger_layout = trigger["value"]
 
-    if "autosize" in trigger_layout:
+    if trigger_layout is None or "autosize" in trigger_layout:
         raise PreventUpdate
+    elif "xaxis.autorange" in trigger_layout or "yaxis.autorange" in trigger_layout:
+        # reset axes, plot the whole embedding again
+        viewport = None
     else:
         try:
             xaxis_min = trigger_layout["xaxis.range[0]"]
@@ -607,45 +671,97 @@ def update_scatter_graph_relayout_data(cont_args, cat_args, coords):
             yaxis_max = trigger_layout["yaxis.range[1]"]
         except KeyError:
             raise PreventUpdate
+        viewport = (
+            min(xaxis_min, xaxis_max),
+            max(xaxis_min, xaxis_max),
+            min(yaxis_min, yaxis_max),
+            max(yaxis_min, yaxis_max),
+        )
 
-    # get coord for each index
-    idx_to_coord = {}
-    for state_dict in callback_context.states_list[0]:
-        idx = state_dict["id"]["index"]
-        coord = state_dict["value"]
-        idx_to_coord[idx] = coord
+    # get the panel states for each index
+    (
+        coord_states,
+        color_states,
+        color_range_states,
+        color_range_min_states,
+        color_range_max_states,
+        sample_states,
+        render_states,
+    ) = callback_context.states_list
+    idx_to_coord = _states_by_index(coord_states)
+    idx_to_color = _states_by_index(color_states)
+    idx_to_color_range = _states_by_index(color_range_states)
+    idx_to_color_range_min = _states_by_index(color_range_min_states)
+    idx_to_color_range_max = _states_by_index(color_range_max_states)
+    idx_to_sample = _states_by_index(sample_states)
+    idx_to_render = _states_by_index(render_states)
     trigger_coord = idx_to_coord[callback_context.triggered_id["index"]]
 
     cont_inputs, cat_inputs = callback_context.inputs_list
     cont_outputs, cat_outputs = [], []
 
-    # print all states
-    # print("cont_args", cont_args)
-    # print("cat_args", cat_args)
-    # print("coords", coords)
-    # print("trigger", trigger)
-    # print("trigger_layout", trigger_layout)
-
     for input in cont_inputs:
-        _p = Patch()
-        coord = idx_to_coord[input["id"]["index"]]
-        if coord == trigger_coord:
-            _p["layout"]["xaxis"]["range"] = [xaxis_min, xaxis_max]
-            _p["layout"]["yaxis"]["range"] = [yaxis_min, yaxis_max]
-        cont_outputs.append(_p)
+        idx = input["id"]["index"]
+        if idx_to_coord[idx] != trigger_coord:
+            cont_outputs.append(no_update)
+            continue
+        fig = cemba_cell.continuous_scatter_figure(
+            coord=trigger_coord,
+            color=idx_to_color[idx],
+            color_range=idx_to_color_range[idx],
+            sample=idx_to_sample[idx],
+            marker_size="auto",
+            render=idx_to_render[idx],
+            viewport=viewport,
+            max_color_range=(idx_to_color_range_min[idx], idx_to_color_range_max[idx]),
+        )
+        cont_outputs.append(fig)
 
     for input in cat_inputs:
-        _p = Patch()
-        coord = idx_to_coord[input["id"]["index"]]
-        if coord == trigger_coord:
-            _p["layout"]["xaxis"]["range"] = [xaxis_min, xaxis_max]
-            _p["layout"]["yaxis"]["range"] = [yaxis_min, yaxis_max]
-        cat_outputs.append(_p)
+        idx = input["id"]["index"]
+        if idx_to_coord[idx] != trigger_coord:
+            cat_outputs.append(no_update)
+            continue
+        fig = cemba_cell.categorical_scatter_figure(
+            coord=trigger_coord,
+            color=idx_to_color[idx],
+            sample=idx_to_sample[idx],
+            marker_size="auto",
+            render=idx_to_render[idx],
+            viewport=viewport,
+        )
+        cat_outputs.append(fig)
 
     return cont_outputs, cat_outputs
 
 
-# TODO click and select event callback for categorical scatter
+def _selection_summary(selected_data, coord, color):
+    if selected_data is None or ("range" not in selected_data and "lassoPoints" not in selected_data):
+        # selection cleared
+        return None
+    return cemba_cell.selection_summary_card(coord, color, selected_data)
+
+
+@callback(
+    Output({"index": MATCH, "type": "selection_summary"}, "children", allow_duplicate=True),
+    Input({"index": MATCH, "type": "continuous_scatter-graph"}, "selectedData"),
+    State({"index": MATCH, "type": "coord_input"}, "value"),
+    State({"index": MATCH, "type": "color_input"}, "value"),
+    prevent_initial_call=True,
+)
+def update_continuous_scatter_selection(selected_data, coord, color):
+    return _selection_summary(selected_data, coord, color)
+
+
+@callback(
+    Output({"index": MATCH, "type": "selection_summary"}, "children", allow_duplicate=True),
+    Input({"index": MATCH, "type": "categorical_scatter-graph"}, "selectedData"),
+    State({"index": MATCH, "type": "coord_input"}, "value"),
+    State({"index": MATCH, "type": "color_input"}, "value"),
+    prevent_initial_call=True,
+)
+def update_categorical_scatter_selection(selected_data, coord, color):
+    return _selection_summary(selected_data, coord, color)
 
 
 @callback(
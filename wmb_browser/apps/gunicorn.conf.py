@@ -1,2 +1,35 @@
+import gc
+import os
+
 bind = "0.0.0.0:80"
 workers = 4
+
+# shared-data mode: load the backend data once in the master before forking the workers,
+# so the workers share the loaded pages copy-on-write instead of holding one copy each.
+# Set WMB_BROWSER_SHARED_DATA=0 to load the data in each worker in the background instead.
+shared_data = os.environ.get("WMB_BROWSER_SHARED_DATA", "1") == "1"
+preload_app = shared_data
+
+
+def when_ready(server):
+    """Load the backend data in the master, before the workers are forked."""
+    if not shared_data:
+        return
+    from wmb_browser.backend import registry
+    from wmb_browser.backend.utilities import get_process_memory
+
+    # no dask thread pool may be started in the master, the forked workers would hang on their first dask compute
+    registry.warm_up(background=False, synchronous=True)
+    # move all loaded objects to the permanent generation, so the garbage collector in the workers
+    # does not write to their pages and trigger copy-on-write
+    gc.freeze()
+    server.log.info(f"Backend data loaded in master: {get_process_memory()}")
+
+
+def post_worker_init(worker):
+    """Load the backend data in the background, so the worker serves the health check right after boot."""
+    if shared_data:
+        return
+    from wmb_browser.backend import registry
+
+    registry.warm_up(background=True)
@@ -1,3 +1,4 @@
 from .cemba_cell import cemba_cell
 from .gpt_function_call import chatgpt_string_to_args_and_kwargs
 from .higlass_dash import higlass
+from .registry import registry
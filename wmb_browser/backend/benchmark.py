@@ -0,0 +1,230 @@
+"""
+Benchmarks for the backend data access.
+
+These benchmarks read the real data, run them on the browser VM where the data is mounted:
+
+    python -m wmb_browser.backend.benchmark
+"""
+
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import xarray as xr
+import zarr
+from plotly import express as px
+
+from .colors import color_collection
+from .dataset import Dataset
+from .gene_store import (
+    CELL_BY_GENE_MC_FRAC_ZARR_PATH,
+    GENE_DIM,
+    GENE_MAJOR_MC_FRAC_ZARR_PATH,
+    GENE_MC_FRAC_DA_NAME,
+)
+
+
+@contextmanager
+def count_zarr_reads():
+    """
+    Count the number of chunk reads and bytes read from zarr stores inside the context.
+
+    Yields
+    ------
+    dict with "reads" and "bytes" keys, updated in place
+    """
+    counter = {"reads": 0, "bytes": 0}
+    store_classes = [zarr.storage.DirectoryStore, zarr.storage.FSStore]
+    original_getitems = {cls: cls.__getitem__ for cls in store_classes}
+
+    def _wrap(getitem):
+        def __getitem__(self, key):
+            value = getitem(self, key)
+            counter["reads"] += 1
+            counter["bytes"] += len(value)
+            return value
+
+        return __getitem__
+
+    for cls, getitem in original_getitems.items():
+        cls.__getitem__ = _wrap(getitem)
+    try:
+        yield counter
+    finally:
+        for cls, getitem in original_getitems.items():
+            cls.__getitem__ = getitem
+
+
+def _timed(func, repeat):
+    """Run func repeat times, return the median seconds, zarr reads and bytes of a single run."""
+    records = []
+    for _ in range(repeat):
+        with count_zarr_reads() as counter:
+            start = time.perf_counter()
+            func()
+            seconds = time.perf_counter() - start
+        records.append({"seconds": seconds, **counter})
+    return pd.DataFrame(records).median()
+
+
+def _full_read_plot_data(dataset: Dataset, coord: str, set_name: str, var_name: str, sample: int):
+    """The plot data assembly that reads the var column over all cells before sampling."""
+    plot_data = dataset.get_coords(coord).copy()
+    plot_data[f"{set_name}:{var_name}"] = dataset.get_var_values(set_name, var_name)
+    plot_data = plot_data.dropna()
+    if plot_data.shape[0] > sample:
+        plot_data = plot_data.sample(sample, random_state=0)
+    return plot_data
+
+
+def benchmark_plot_data(
+    dataset: Dataset, coord: str, set_name: str, var_name: str, sample: int = 50000, repeat: int = 3
+) -> pd.DataFrame:
+    """
+    Compare the full column read and the planned read of Dataset.get_plot_data.
+
+    Parameters
+    ----------
+    dataset : the dataset to benchmark
+    coord : name of the coordinates
+    set_name : name of the feature set
+    var_name : name of the variable
+    sample : number of objects to sample
+    repeat : number of repeats, the median is reported
+
+    Returns
+    -------
+    pd.DataFrame with seconds, zarr chunk reads and bytes read for each mode
+    """
+    modes = {
+        "full_read": lambda: _full_read_plot_data(dataset, coord, set_name, var_name, sample),
+        "planned_read": lambda: Dataset.get_plot_data(
+            dataset, coord, var_dict={set_name: var_name}, sample=sample
+        ),
+    }
+    # measure the reads from the store, not the column cache
+    var_cache = dataset._var_cache
+    dataset.set_var_cache(max_bytes=0)
+    try:
+        result = pd.DataFrame({mode: _timed(func, repeat) for mode, func in modes.items()}).T
+    finally:
+        dataset._var_cache = var_cache
+    result["MB"] = result["bytes"] / 1024**2
+    return result
+
+
+def _per_category_scatter_figure(dataset, coord: str, color: str, sample: int):
+    """The categorical scatter figure with one px.scatter trace per category."""
+    plot_data = dataset.get_plot_data(coord, color, sample=sample)
+    plot_data[color] = plot_data[color].astype(str)
+    return px.scatter(
+        plot_data,
+        x=f"{coord}_0",
+        y=f"{coord}_1",
+        color=color,
+        hover_data=None,
+        custom_data=[plot_data.index.astype("uint32")],
+        color_discrete_map=color_collection.get_colors(color),
+    )
+
+
+def benchmark_categorical_figure(dataset, coord: str, color: str, sample: int = 50000, repeat: int = 3):
+    """
+    Compare the figure build time and JSON size of the per-category and the single-trace categorical scatter.
+
+    Parameters
+    ----------
+    dataset : the CEMBAsnmCCells dataset to benchmark
+    coord : name of the coordinates
+    color : name of the categorical metadata
+    sample : number of objects to sample
+    repeat : number of repeats, the median is reported
+
+    Returns
+    -------
+    pd.DataFrame with the number of traces, build seconds, JSON serialization seconds and JSON MB of each mode
+    """
+    modes = {
+        "per_category": lambda: _per_category_scatter_figure(dataset, coord, color, sample),
+        "single_trace": lambda: dataset._build_categorical_scatter_figure(coord, color, sample=sample),
+    }
+    records = {}
+    for mode, func in modes.items():
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fig = func()
+            build_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            fig_json = fig.to_json()
+            json_seconds = time.perf_counter() - start
+            runs.append({
+                "traces": len(fig.data),
+                "build_seconds": build_seconds,
+                "json_seconds": json_seconds,
+                "json_MB": len(fig_json) / 1024**2,
+            })
+        records[mode] = pd.DataFrame(runs).median()
+    return pd.DataFrame(records).T
+
+
+def benchmark_gene_stores(
+    store_paths: dict,
+    gene_ids: list,
+    da_name: str = GENE_MC_FRAC_DA_NAME,
+    gene_dim: str = GENE_DIM,
+    mc_type: str = "CHN",
+) -> pd.DataFrame:
+    """
+    Compare the per-gene read latency and bytes read of several zarr stores of the same cell-by-gene matrix.
+
+    Parameters
+    ----------
+    store_paths : dict of store label to zarr store path
+    gene_ids : gene ids to read, each gene is read once from each store
+    da_name : name of the data array
+    gene_dim : name of the gene dimension
+    mc_type : mc_type to read
+
+    Returns
+    -------
+    pd.DataFrame with the median seconds, zarr chunk reads and bytes read per gene for each store
+    """
+    records = {}
+    for label, path in store_paths.items():
+        da = xr.open_zarr(path)[da_name].sel(mc_type=mc_type)
+        per_gene = pd.DataFrame({gene: _timed(lambda: da.sel({gene_dim: gene}).values, 1) for gene in gene_ids}).T
+        records[label] = per_gene.median()
+    result = pd.DataFrame(records).T
+    result["MB"] = result["bytes"] / 1024**2
+    return result
+
+
+if __name__ == "__main__":
+    from .cemba_cell import cemba_cell
+
+    gene_id = cemba_cell._to_gene_id("Gad1")
+    for _set_name in ["gene_mch", "gene_mcg"]:
+        print(f"get_plot_data, mc_all_tsne, {_set_name}:Gad1, sample=50000")
+        print(benchmark_plot_data(cemba_cell, "mc_all_tsne", _set_name, gene_id))
+    print("continuous_scatter_figure, mc_all_tsne, gene_mch:Gad1, sample=50000")
+    print(
+        _timed(
+            lambda: cemba_cell._build_continuous_scatter_figure(
+                "mc_all_tsne", "gene_mch:Gad1", (0.7, 1.5), sample=50000
+            ),
+            repeat=3,
+        )
+    )
+
+    for _color in ["CellSubClass", "CellGroup", "DissectionRegion"]:
+        print(f"categorical_scatter_figure, mc_all_tsne, {_color}, sample=50000")
+        print(benchmark_categorical_figure(cemba_cell, "mc_all_tsne", _color))
+
+    print("Per-gene read, original store vs. gene-major store")
+    _gene_ids = [cemba_cell._to_gene_id(g) for g in ["Gad1", "Slc17a7", "Sst", "Pvalb", "Vip", "Mbp"]]
+    print(
+        benchmark_gene_stores(
+            {"original": CELL_BY_GENE_MC_FRAC_ZARR_PATH, "gene_major": GENE_MAJOR_MC_FRAC_ZARR_PATH}, _gene_ids
+        )
+    )
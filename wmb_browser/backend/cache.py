@@ -0,0 +1,273 @@
+"""Size bounded in-memory and on-disk caches for the backend."""
+
+import hashlib
+import os
+import pathlib
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def _default_sizeof(value) -> int:
+    try:
+        return int(value.nbytes)
+    except AttributeError:
+        return len(value)
+
+
+class SizedCache:
+    """
+    In-memory cache bounded by the total bytes of the cached values.
+
+    Values are evicted by least recently used (LRU) or least frequently used (LFU) order
+    once the total size exceeds max_bytes. Hit, miss and eviction counters are kept for monitoring.
+    """
+
+    def __init__(self, max_bytes: int, policy: str = "lru", sizeof=None, max_ghost_keys: int = 4096) -> None:
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        max_bytes : memory budget of the cached values in bytes, 0 disables the cache
+        policy : eviction policy, either 'lru' or 'lfu'
+        sizeof : function to get the size of a value in bytes, default uses value.nbytes or len(value)
+        max_ghost_keys : number of recently missed keys remembered for admission decisions
+        """
+        if policy not in {"lru", "lfu"}:
+            raise ValueError(f"Invalid cache policy '{policy}', only support 'lru' or 'lfu'.")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self._sizeof = _default_sizeof if sizeof is None else sizeof
+        self._max_ghost_keys = max_ghost_keys
+
+        self._lock = threading.RLock()
+        self._data = OrderedDict()  # key: (value, size), ordered from least to most recently used
+        self._freq = {}
+        self._ghost_keys = OrderedDict()  # recently missed keys that are not cached
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        return
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Get a cached value and update the usage, return default if the key is not cached."""
+        with self._lock:
+            try:
+                value, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                self._ghost_keys[key] = None
+                self._ghost_keys.move_to_end(key)
+                if len(self._ghost_keys) > self._max_ghost_keys:
+                    self._ghost_keys.popitem(last=False)
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            self._freq[key] += 1
+            return value
+
+    def seen(self, key) -> bool:
+        """Whether the key was recently requested but missed."""
+        return key in self._ghost_keys
+
+    def put(self, key, value) -> None:
+        """Cache a value, evict other values if the memory budget is exceeded."""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._ghost_keys.pop(key, None)
+            self._data[key] = (value, size)
+            self._freq[key] = 1
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                self._pop(self._victim())
+                self.evictions += 1
+        return
+
+    def _victim(self):
+        if self.policy == "lru":
+            return next(iter(self._data))
+        else:
+            # the least frequently used key, ties broken by the least recently used
+            return min(self._data, key=self._freq.__getitem__)
+
+    def _pop(self, key):
+        _, size = self._data.pop(key)
+        del self._freq[key]
+        self.current_bytes -= size
+        return
+
+    def invalidate(self, predicate) -> int:
+        """
+        Remove all cached values whose key matches the predicate.
+
+        Parameters
+        ----------
+        predicate : function taking a key and returning True if the key should be removed
+
+        Returns
+        -------
+        number of removed values
+        """
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                self._pop(k)
+            for k in [k for k in self._ghost_keys if predicate(k)]:
+                del self._ghost_keys[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove all cached values, counters are kept."""
+        self.invalidate(lambda k: True)
+        return
+
+    @property
+    def stats(self) -> dict:
+        """Get the cache statistics."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total > 0 else 0.0,
+            "items": len(self._data),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class DiskCache:
+    """
+    On-disk cache of bytes values bounded by the total bytes of the cached files.
+
+    Each value is stored in a file named by the hash of its key, files are written atomically,
+    so all processes using the same directory (e.g. the gunicorn workers) share the cache.
+    Files are evicted by least recently used order, using the file modification time, which is updated on hits.
+    If ttl is set, the write time is stored in the file header and values older than ttl are treated as missing.
+    Hit and miss counters are kept for monitoring, they only count the requests of this process.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, ttl: float = None, evict_every_bytes: int = 0) -> None:
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        cache_dir : directory of the cached files, created if it does not exist
+        max_bytes : disk budget of the cached files in bytes
+        ttl : time to live of the cached values in seconds, default no expiration
+        evict_every_bytes : bytes written by this process between two scans of the directory for eviction,
+            default scans on every put; caches of many small values should scan less often,
+            the budget may then be exceeded by this amount per process
+        """
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evict_every_bytes = evict_every_bytes
+        self._bytes_since_evict = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        return
+
+    def _path(self, key) -> pathlib.Path:
+        return self.cache_dir / f"{hashlib.sha1(repr(key).encode()).hexdigest()}.cache"
+
+    def _files(self) -> list:
+        files = []
+        for path in self.cache_dir.glob("*.cache"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # evicted by another process
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def get(self, key, default=None):
+        """Get a cached value and update its modification time, return default if the key is not cached."""
+        path = self._path(key)
+        try:
+            value = path.read_bytes()
+            if self.ttl is not None:
+                (write_time,) = struct.unpack(">d", value[:8])
+                value = value[8:]
+                if time.time() - write_time > self.ttl:
+                    self.expirations += 1
+                    path.unlink()
+                    raise FileNotFoundError(path)
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def put(self, key, value: bytes) -> None:
+        """Cache a value, evict the least recently used files if the disk budget is exceeded."""
+        if len(value) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            if self.ttl is not None:
+                f.write(struct.pack(">d", time.time()))
+            f.write(value)
+        os.replace(tmp_path, self._path(key))
+
+        self._bytes_since_evict += len(value)
+        if self._bytes_since_evict < self.evict_every_bytes:
+            return
+        self._bytes_since_evict = 0
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files, key=lambda f: f[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        return
+
+    def clear(self) -> None:
+        """Remove all cached files, counters are kept."""
+        for _, _, path in self._files():
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        return
+
+    @property
+    def stats(self) -> dict:
+        """Get the cache statistics."""
+        total = self.hits + self.misses
+        files = self._files()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / total if total > 0 else 0.0,
+            "items": len(files),
+            "bytes": sum(size for _, size, _ in files),
+            "max_bytes": self.max_bytes,
+        }
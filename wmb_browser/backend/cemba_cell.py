@@ -1,15 +1,33 @@
+import json
+import os
+import pathlib
+from functools import lru_cache, partial
 from typing import Tuple, Union
 
 import dash_bootstrap_components as dbc
 import joblib
+import numpy as np
 import pandas as pd
 import xarray as xr
 from dash import dcc, html
 from plotly import express as px
+from plotly import graph_objects as go
 
+from .cache import DiskCache, SizedCache
 from .colors import color_collection
+from .coord_store import CELL_COORDS_PATH, CELL_COORDS_STORE_DIR, CELL_METADATA_PATH, CoordStore
 from .dataset import Dataset
+from .gene_store import GENE_DIM, GENE_MC_FRAC_DA_NAME, gene_major_store_path
 from .genome import mm10
+from .raster import (
+    colorize_categorical,
+    colorize_continuous,
+    png_data_uri,
+    rasterize_majority,
+    rasterize_mean,
+    to_rgb_array,
+)
+from .registry import registry
 from .utilities import *
 
 CELL_META_CLIP_INFO = """
@@ -25,11 +43,33 @@ CELL_META_CLIP_INFO = """
 - **Cell SubClass**: {CellSubClass}
 - **Cell Group**: {CellGroup}
 """
-
-
-def _get_x_y_lim(df, coord, delta=0, sync=True):
-    xmin, xmax = df[f"{coord}_0"].quantile([delta, 1 - delta]).values
-    ymin, ymax = df[f"{coord}_1"].quantile([delta, 1 - delta]).values
+CELL_META_CLIP_FIELDS = [
+    "CEMBARegion",
+    "CellClass",
+    "CellSubClass",
+    "CellGroup",
+    "MajorRegion",
+    "SubRegion",
+    "DissectionRegion",
+    "Slice",
+    "Sample",
+    "Technology",
+    "CCF_broad",
+    "CCF_acronym",
+]
+
+# color of the categories not in the palette
+DEFAULT_CATEGORY_COLOR = "#D3D3D3"
+
+# cache of the scatter figure dicts in memory and their JSON on disk,
+# the on-disk cache is shared by all workers and only used if the dir is set
+FIGURE_CACHE_BYTES = 256 * 1024**2
+FIGURE_CACHE_DIR = os.environ.get("WMB_BROWSER_FIGURE_CACHE_DIR")
+FIGURE_DISK_CACHE_BYTES = 4 * 1024**3
+
+
+def _get_x_y_lim(bounds, sync=True):
+    (xmin, xmax), (ymin, ymax) = bounds[:2].tolist()
     if sync:
         xmin = min(xmin, ymin)
         xmax = max(xmax, ymax)
@@ -38,13 +78,55 @@ def _get_x_y_lim(df, coord, delta=0, sync=True):
     return xmin, xmax, ymin, ymax
 
 
+def _figure_nbytes(value) -> int:
+    """Approximate memory size of a figure dict, counting the arrays and strings in it."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    elif isinstance(value, str):
+        return len(value)
+    elif isinstance(value, dict):
+        return sum(_figure_nbytes(v) for v in value.values())
+    elif isinstance(value, (list, tuple)):
+        return sum(_figure_nbytes(v) for v in value)
+    else:
+        return 8
+
+
+def _discrete_colorscale(colors):
+    """Stepwise colorscale mapping the int code i to colors[i], use with cmin=-0.5 and cmax=len(colors)-0.5."""
+    if len(colors) == 0:
+        return [[0, DEFAULT_CATEGORY_COLOR], [1, DEFAULT_CATEGORY_COLOR]]
+    n = len(colors)
+    colorscale = []
+    for i, c in enumerate(colors):
+        colorscale.extend([[i / n, c], [(i + 1) / n, c]])
+    return colorscale
+
+
+@lru_cache(maxsize=None)
+def _open_gene_mc_frac_ds(path):
+    ds = xr.open_zarr(path)
+    ds = ds.rename({GENE_DIM: "gene"})
+    return ds
+
+
+def _open_gene_mc_frac_da(path, mc_type):
+    return _open_gene_mc_frac_ds(path)[GENE_MC_FRAC_DA_NAME].sel(mc_type=mc_type)
+
+
+def _open_gene_rna_da(path):
+    ds = xr.open_zarr(path)
+    return ds["rna_da"]
+
+
 class CEMBAsnmCCells(Dataset):
     def __init__(self) -> None:
         name = "cemba_snmc_cells"
         obs_dim = "cell"
-        metadata_path = "/browser/metadata/CEMBA_snmC.cell_metadata.pickle"
-        coords_path = "/browser/metadata/CEMBA_snmC.cell_coords.lib"
-        cell_by_gene_mc_frac_zarr_path = "/cemba/wmb/GeneChunks/CEMBA.snmC/"
+        metadata_path = CELL_METADATA_PATH
+        coords_path = CELL_COORDS_PATH
+        # prefer the browser-optimized gene-major store if it has been built
+        cell_by_gene_mc_frac_zarr_path = gene_major_store_path()
         cell_group_by_gene_rna_zarr_path = "/browser/matrix/CEMBA.snmC.L4Region.AIBS_TENX.log1pCPM.zarr"
 
         cell_meta = pd.read_pickle(metadata_path)
@@ -54,30 +136,49 @@ class CEMBAsnmCCells(Dataset):
         # add metadata
         self.add_metadata_df(cell_meta)
 
-        # add coords
-        coords = joblib.load(coords_path)
-        for name, coord_df in coords.items():
-            self.add_coords(name, coord_df)
+        # add coords, prefer the memory-mapped coord store, which is loaded lazily and shared between processes
+        if pathlib.Path(CELL_COORDS_STORE_DIR).exists():
+            coord_store = CoordStore(CELL_COORDS_STORE_DIR)
+            for name in coord_store.names:
+                self.add_lazy_coords(name, partial(coord_store.load, name, self.obs_ids))
+        else:
+            coords = joblib.load(coords_path)
+            for name, coord_df in coords.items():
+                self.add_coords(name, coord_df)
 
-        # add cell-by-gene matrices
-        ds = xr.open_zarr(cell_by_gene_mc_frac_zarr_path)
-        ds = ds.rename({"geneslop2k-vm23": "gene"})
-        gene_mch_frac_da = ds["geneslop2k-vm23_da_frac_fc"].sel(mc_type="CHN")
-        gene_mcg_frac_da = ds["geneslop2k-vm23_da_frac_fc"].sel(mc_type="CGN")
-        self.add_var_matrix("gene_mch", gene_mch_frac_da, var_dim="gene")
-        self.add_var_matrix("gene_mcg", gene_mcg_frac_da, var_dim="gene")
+        # keep rare subclasses when downsampling scatter plots
+        self.set_sample_order(stratify_by="CellSubClass", min_per_group=5)
+
+        # add cell-by-gene matrices, the zarr stores are opened on first access
+        self.add_lazy_var_matrix(
+            "gene_mch", partial(_open_gene_mc_frac_da, cell_by_gene_mc_frac_zarr_path, "CHN"), var_dim="gene"
+        )
+        self.add_lazy_var_matrix(
+            "gene_mcg", partial(_open_gene_mc_frac_da, cell_by_gene_mc_frac_zarr_path, "CGN"), var_dim="gene"
+        )
 
         # add cell-group-by-gene matrices
-        ds = xr.open_zarr(cell_group_by_gene_rna_zarr_path)
-        rna_da = ds["rna_da"]
-        self.add_var_matrix("gene_rna", rna_da, var_dim="gene", obs_dim="CellGroup")
+        self.add_lazy_var_matrix(
+            "gene_rna",
+            partial(_open_gene_rna_da, cell_group_by_gene_rna_zarr_path),
+            var_dim="gene",
+            obs_dim="CellGroup",
+        )
+
+        # cache of the scatter figure dicts, key: normalized figure parameters, value: (figure dict, size)
+        self._figure_cache = SizedCache(max_bytes=FIGURE_CACHE_BYTES, sizeof=lambda v: v[1])
+        if FIGURE_CACHE_DIR is not None:
+            self._figure_disk_cache = DiskCache(FIGURE_CACHE_DIR, max_bytes=FIGURE_DISK_CACHE_BYTES)
+        else:
+            self._figure_disk_cache = None
 
         # plot default
         self._graph_style = {"height": "70vh", "width": "auto"}
         self._default_graph_config = {
             "scrollZoom": True,
             "displaylogo": False,
-            "modeBarButtonsToRemove": ["select", "select2d", "autoScale"],
+            # box and lasso select are summarized by the selection callbacks
+            "modeBarButtonsToRemove": ["autoScale"],
             "toImageButtonOptions": {
                 "format": "png",  # one of png, svg, jpeg, webp
                 "filename": "custom_image",
@@ -85,33 +186,115 @@ class CEMBAsnmCCells(Dataset):
             },
         }
 
+    def warm_up(self) -> None:
+        """Load all lazy coords and var matrices, and build the clipboard metadata row store."""
+        super().warm_up()
+        self._get_metadata_row_store(tuple(CELL_META_CLIP_FIELDS))
+        return
+
+    def get_selected_cells(self, coord: str, selected_data: dict) -> np.ndarray:
+        """
+        Get the int ids of all cells inside a box or lasso selection, not only the plotted cells.
+
+        Parameters
+        ----------
+        coord : name of the coordinates of the scatter plot
+        selected_data : the selectedData of the scatter plot graph, with "range" for box selections
+            or "lassoPoints" for lasso selections
+
+        Returns
+        -------
+        np.ndarray of the selected cell int ids
+        """
+        if "range" in selected_data:
+            (xmin, xmax), (ymin, ymax) = selected_data["range"]["x"], selected_data["range"]["y"]
+            viewport = (min(xmin, xmax), max(xmin, xmax), min(ymin, ymax), max(ymin, ymax))
+            rows = self.query_viewport_rows(coord, viewport)
+        elif "lassoPoints" in selected_data:
+            lasso = selected_data["lassoPoints"]
+            rows = self.query_polygon_rows(coord, np.stack([lasso["x"], lasso["y"]], axis=1))
+        else:
+            raise ValueError("selected_data has neither a box range nor lasso points.")
+        int_ids = self._coord_obs_positions[coord][rows]
+        return int_ids[int_ids >= 0]
+
+    def get_selection_summary(self, coord: str, color: str, selected_data: dict, top: int = 10) -> dict:
+        """
+        Summarize the cells inside a box or lasso selection.
+
+        Parameters
+        ----------
+        coord : name of the coordinates of the scatter plot
+        color : the color of the scatter plot, the mean is reported if it is a gene, e.g. "gene_mch:Gad1"
+        selected_data : the selectedData of the scatter plot graph
+        top : number of the most frequent subclasses and regions to report
+
+        Returns
+        -------
+        dict with the number of cells, the mean gene value and the top subclass and region counts
+        """
+        int_ids = self.get_selected_cells(coord, selected_data)
+        summary = {"n_cells": int(int_ids.size), "color": color, "mean": None}
+
+        dataset, *var = color.split(":")
+        if len(var) > 0 and dataset in self.var_sets:
+            values = self._get_var_values_at(dataset, [self._to_gene_id(var[0])], int_ids)
+            values = next(iter(values.values()))
+            if values.size > 0 and not np.isnan(values).all():
+                summary["mean"] = float(np.nanmean(values))
+
+        count_names = ["CellSubClass", "MajorRegion"]
+        if color in self.metadata_names and color not in count_names:
+            count_names.append(color)
+        summary["counts"] = {name: self.get_metadata_counts(int_ids, name).head(top) for name in count_names}
+        return summary
+
+    def selection_summary_card(self, coord: str, color: str, selected_data: dict) -> dbc.Card:
+        """Make a card summarizing the cells inside a box or lasso selection."""
+        summary = self.get_selection_summary(coord, color, selected_data)
+        body = [html.P(f"{summary['n_cells']} cells selected", className="mb-2")]
+        if summary["mean"] is not None:
+            body.append(html.P(f"Mean {color}: {summary['mean']:.3f}", className="mb-2"))
+        tables = []
+        for name, counts in summary["counts"].items():
+            table_df = counts.rename_axis(name).reset_index(name="Cells")
+            table = dbc.Table.from_dataframe(table_df, size="sm", striped=True, className="small")
+            tables.append(dbc.Col(table, md=12 // len(summary["counts"])))
+        body.append(dbc.Row(tables))
+        return dbc.Card([dbc.CardHeader("Selection"), dbc.CardBody(body)], className="mt-3")
+
+    def get_cells_metadata_cards(self, cell_int_ids) -> list:
+        """
+        Get the metadata cards of a batch of cells for the cell clipboard.
+
+        All metadata fields of all cells are read from the metadata row store at once.
+
+        Parameters
+        ----------
+        cell_int_ids : int ids of the cells
+
+        Returns
+        -------
+        list of dbc.Card, one per cell
+        """
+        cell_int_ids = np.atleast_1d(np.asarray(cell_int_ids, dtype="int64"))
+        rows = self.get_metadata_rows(cell_int_ids, CELL_META_CLIP_FIELDS)
+        rows["CellID"] = self.to_obs_ids(cell_int_ids)
+
+        cards = []
+        for meta_dict in rows.to_dict(orient="records"):
+            card = dbc.Card(
+                [
+                    dbc.CardHeader(meta_dict["CellSubClass"]),
+                    dbc.CardBody([dcc.Markdown(CELL_META_CLIP_INFO.format(**meta_dict), className="small m-0")]),
+                ],
+                className="mt-3",
+            )
+            cards.append(card)
+        return cards
+
     def get_cell_metadata_markdown(self, cell_int_id):
-        cell_id = self._int_id_to_original_id[cell_int_id]
-        use_meta_names = [
-            "CEMBARegion",
-            "CellClass",
-            "CellSubClass",
-            "CellGroup",
-            "MajorRegion",
-            "SubRegion",
-            "DissectionRegion",
-            "Slice",
-            "Sample",
-            "Technology",
-            "CCF_broad",
-            "CCF_acronym",
-        ]
-        meta_dict = {k: self.get_metadata(k).loc[cell_id] for k in use_meta_names}
-        meta_dict["CellID"] = cell_id
-
-        card = dbc.Card(
-            [
-                dbc.CardHeader(meta_dict["CellSubClass"]),
-                dbc.CardBody([dcc.Markdown(CELL_META_CLIP_INFO.format(**meta_dict), className="small m-0")]),
-            ],
-            className="mt-3",
-        )
-        return card
+        return self.get_cells_metadata_cards([cell_int_id])[0]
 
     @staticmethod
     def _to_gene_id(name):
@@ -137,8 +320,42 @@ class CEMBAsnmCCells(Dataset):
         gene = self._to_gene_id(gene)
         return self.get_var_values("gene_mcg", gene)
 
+    def get_genes_values(self, set_name: str, genes: list) -> pd.DataFrame:
+        """
+        Get the values of several genes in a given gene feature set, reading each chunk only once.
+
+        Parameters
+        ----------
+        set_name : the name of the gene feature set, e.g. gene_mch, gene_mcg, gene_rna
+        genes : gene names or gene ids
+
+        Returns
+        -------
+        pd.DataFrame with cell ids as index and the unique input genes as columns, in the input order
+        """
+        genes = list(dict.fromkeys(genes))
+        gene_ids = [self._to_gene_id(gene) for gene in genes]
+        # a gene name and its gene id, or two names of the same gene, are read once and share the values
+        data = self.get_var_values_batch(set_name, list(dict.fromkeys(gene_ids)))[gene_ids]
+        data.columns = genes
+        return data
+
+    def get_genes_mch_frac(self, genes: list) -> pd.DataFrame:
+        """Get the mCH fraction for several genes."""
+        return self.get_genes_values("gene_mch", genes)
+
+    def get_genes_mcg_frac(self, genes: list) -> pd.DataFrame:
+        """Get the mCG fraction for several genes."""
+        return self.get_genes_values("gene_mcg", genes)
+
     def get_plot_data(
-        self, coord: str, *args, use_obs: pd.Index = None, missing_value: str = "drop", sample: int = None
+        self,
+        coord: str,
+        *args,
+        use_obs: pd.Index = None,
+        missing_value: str = "drop",
+        sample: int = None,
+        viewport: tuple = None,
     ) -> pd.DataFrame:
         metadata = []
         var_dict = {}
@@ -147,12 +364,12 @@ class CEMBAsnmCCells(Dataset):
         for arg in args:
             if isinstance(arg, str):
                 if arg in self.metadata_names:
-                    metadata = arg
+                    metadata.append(arg)
                 else:
                     dataset, *var = arg.split(":")
                     if dataset in self.var_sets:
                         gene_id = self._to_gene_id(var[0])
-                        var_dict[dataset] = gene_id
+                        var_dict.setdefault(dataset, []).append(gene_id)
                         rename_dict[f"{dataset}:{gene_id}"] = arg
 
         if len(metadata) == 0:
@@ -160,7 +377,7 @@ class CEMBAsnmCCells(Dataset):
         if len(var_dict) == 0:
             var_dict = None
 
-        _df = super().get_plot_data(coord, metadata, var_dict, use_obs, missing_value, sample)
+        _df = super().get_plot_data(coord, metadata, var_dict, use_obs, missing_value, sample, viewport)
         _df = _df.rename(columns=rename_dict)
         return _df
 
@@ -176,15 +393,198 @@ class CEMBAsnmCCells(Dataset):
             dragmode="pan",
         )
 
-    def continuous_scatter_figure(self, coord, color, color_range, marker_size="auto", sample=50000):
-        plot_data = self.get_plot_data(coord, color, sample=sample)
+    @staticmethod
+    def _add_raster_image(fig, rgba, xmin, xmax, ymin, ymax):
+        fig.add_layout_image(
+            source=png_data_uri(rgba),
+            xref="x",
+            yref="y",
+            x=xmin,
+            y=ymax,
+            sizex=xmax - xmin,
+            sizey=ymax - ymin,
+            sizing="stretch",
+            layer="below",
+        )
+        fig.update_layout(
+            xaxis=dict(range=[xmin, xmax]),
+            yaxis=dict(range=[ymin, ymax]),
+        )
+
+    def continuous_raster_figure(self, coord, color, color_range, raster_size=512, viewport=None):
+        """Make a continuous scatter figure of all cells, rasterized into a raster_size x raster_size image."""
+        plot_data = self.get_plot_data(coord, color, viewport=viewport)
+        xmin, xmax, ymin, ymax = self._get_plot_lim(coord, viewport)
+
+        grid = rasterize_mean(
+            plot_data[f"{coord}_0"],
+            plot_data[f"{coord}_1"],
+            plot_data[color],
+            x_range=(xmin, xmax),
+            y_range=(ymin, ymax),
+            width=raster_size,
+            height=raster_size,
+        )
+        vmin, vmax = color_range
+        colorscale = px.colors.sequential.Viridis
+        rgba = colorize_continuous(grid, vmin, vmax, colorscale)
+
+        # an invisible trace only to show the colorbar of the image
+        fig = go.Figure(
+            go.Scatter(
+                x=[None, None],
+                y=[None, None],
+                mode="markers",
+                marker=dict(color=[vmin, vmax], coloraxis="coloraxis"),
+                showlegend=False,
+                hoverinfo="skip",
+            )
+        )
+        self._add_raster_image(fig, rgba, xmin, xmax, ymin, ymax)
+        fig.update_layout(
+            coloraxis=dict(
+                colorscale=colorscale,
+                cmin=vmin,
+                cmax=vmax,
+                colorbar=dict(thickness=10, len=0.2, y=0.5, title=None),
+            ),
+        )
+        self._common_fig_layout(fig)
+        return fig
+
+    def _get_plot_lim(self, coord, viewport=None):
+        """Get the axis ranges of a figure, the viewport if zoomed, otherwise the precomputed coords bounds."""
+        if viewport is not None:
+            return tuple(viewport)
+        return _get_x_y_lim(self.get_coord_bounds(coord))
+
+    def _normalize_color(self, color):
+        """Normalize the gene name in a "set_name:gene" color to its gene id."""
+        dataset, *var = color.split(":")
+        if len(var) > 0 and dataset in self.var_sets:
+            return f"{dataset}:{self._to_gene_id(var[0])}"
+        return color
+
+    def _figure_key(self, scatter_type, coord, color, color_range, max_color_range, marker_size, sample, render):
+        if render == "raster":
+            # raster figures always use all cells and the exact values
+            marker_size = sample = max_color_range = None
+        else:
+            marker_size = marker_size if marker_size == "auto" else float(marker_size)
+            sample = None if sample is None else int(sample)
+        if color_range is not None:
+            color_range = tuple(float(v) for v in color_range)
+        if max_color_range is not None:
+            max_color_range = tuple(float(v) for v in max_color_range)
+        return (
+            scatter_type,
+            coord,
+            self._normalize_color(color),
+            color_range,
+            max_color_range,
+            marker_size,
+            sample,
+            render,
+        )
+
+    def _cached_figure(self, key, build) -> dict:
+        """
+        Get the figure dict from the memory or disk cache, build and cache it if not cached.
+
+        The memory cache keeps the figure dicts, so a hit is neither parsed nor serialized,
+        the figures are only serialized to JSON for the disk cache.
+        The returned dict is shared by all requests of the key and must not be modified.
+        """
+        cached = self._figure_cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+        if self._figure_disk_cache is not None:
+            fig_bytes = self._figure_disk_cache.get(key)
+            if fig_bytes is not None:
+                fig_dict = json.loads(fig_bytes)
+                self._figure_cache.put(key, (fig_dict, len(fig_bytes)))
+                return fig_dict
+
+        fig = build()
+        fig_dict = fig.to_dict()
+        self._figure_cache.put(key, (fig_dict, _figure_nbytes(fig_dict)))
+        if self._figure_disk_cache is not None:
+            self._figure_disk_cache.put(key, fig.to_json().encode())
+        return fig_dict
+
+    @property
+    def figure_cache_stats(self) -> dict:
+        """Get the memory and disk figure cache statistics."""
+        return {
+            "memory": self._figure_cache.stats,
+            "disk": None if self._figure_disk_cache is None else self._figure_disk_cache.stats,
+        }
+
+    def continuous_scatter_figure(
+        self,
+        coord,
+        color,
+        color_range,
+        marker_size="auto",
+        sample=50000,
+        render="points",
+        viewport=None,
+        max_color_range=None,
+    ) -> dict:
+        """
+        Get the continuous scatter figure dict, figures of the whole embedding are cached by their parameters.
+
+        Zoomed figures (viewport is not None) are not cached, their viewports rarely repeat.
+        The color values are quantized in max_color_range (default color_range), the range of the color slider,
+        so the color axis can be patched to any range in it without rebuilding the figure.
+        """
+        build = partial(
+            self._build_continuous_scatter_figure,
+            coord,
+            color,
+            color_range,
+            marker_size,
+            sample,
+            render,
+            viewport,
+            max_color_range,
+        )
+        if viewport is not None:
+            return build().to_dict()
+        key = self._figure_key("continuous", coord, color, color_range, max_color_range, marker_size, sample, render)
+        return self._cached_figure(key, build)
+
+    def _build_continuous_scatter_figure(
+        self,
+        coord,
+        color,
+        color_range,
+        marker_size="auto",
+        sample=50000,
+        render="points",
+        viewport=None,
+        max_color_range=None,
+    ):
+        if render == "raster":
+            return self.continuous_raster_figure(coord, color, color_range, viewport=viewport)
+        elif render != "points":
+            raise ValueError(f"Unknown render mode '{render}', use 'points' or 'raster'.")
+
+        plot_data = self.get_plot_data(coord, color, sample=sample, viewport=viewport)
+        xmin, xmax, ymin, ymax = self._get_plot_lim(coord, viewport)
+        # round to the plot resolution, so the figure JSON has short numbers instead of long float16 decimals
+        plot_data[f"{coord}_0"] = quantize(plot_data[f"{coord}_0"], (xmin, xmax))
+        plot_data[f"{coord}_1"] = quantize(plot_data[f"{coord}_1"], (ymin, ymax))
+        if max_color_range is None:
+            max_color_range = color_range
+        plot_data[color] = quantize(plot_data[color], max_color_range, n_levels=1000)
 
         fig = px.scatter(
             plot_data,
             x=f"{coord}_0",
             y=f"{coord}_1",
             color=color,
-            custom_data=[plot_data.index.astype("uint32")],
             hover_data=None,
             color_continuous_scale="viridis",
             range_color=color_range,
@@ -196,11 +596,12 @@ class CEMBAsnmCCells(Dataset):
         else:
             marker_size = float(marker_size)
 
-        fig.update_traces(marker=dict(size=marker_size), hovertemplate=f"{color}=%{{marker.color:.2f}}<extra></extra>")
-        if "merfish" in coord:
-            xmin, xmax, ymin, ymax = _get_x_y_lim(plot_data, coord)
-        else:
-            xmin, xmax, ymin, ymax = _get_x_y_lim(plot_data, coord, delta=0)
+        fig.update_traces(
+            marker=dict(size=marker_size),
+            hovertemplate=f"{color}=%{{marker.color:.2f}}<extra></extra>",
+            # the int id of each cell, a flat list is shorter in JSON than one list per point
+            customdata=plot_data.index.to_numpy(dtype="uint32"),
+        )
         fig.update_layout(
             coloraxis_colorbar=dict(thickness=10, len=0.2, y=0.5, title=None),
             xaxis=dict(range=[xmin, xmax]),
@@ -239,6 +640,7 @@ class CEMBAsnmCCells(Dataset):
         sample: int = 50000,
         color_range="auto",
         max_color_range="auto",
+        render: str = "points",
     ) -> Tuple[dcc.Graph, dbc.Form]:
         """
         Making a scatter plot color by an continuous variable with pre-computed coordinates.
@@ -257,6 +659,8 @@ class CEMBAsnmCCells(Dataset):
             The range of the color bar.
         max_color_range
             The min and max range of the color control slider.
+        render
+            "points" to plot the sampled cells as points, "raster" to plot all cells as a server-side rendered image.
 
         Returns
         -------
@@ -269,7 +673,9 @@ class CEMBAsnmCCells(Dataset):
 
         color_range, max_color_range = self._get_color_range_by_color(color, color_range, max_color_range)
 
-        fig = self.continuous_scatter_figure(coord, color, color_range, sample=sample)
+        fig = self.continuous_scatter_figure(
+            coord, color, color_range, sample=sample, render=render, max_color_range=max_color_range
+        )
 
         graph = dcc.Graph(
             id={"index": index, "type": "continuous_scatter-graph"},
@@ -277,6 +683,7 @@ class CEMBAsnmCCells(Dataset):
             style=self._graph_style,
             config=self._default_graph_config,
         )
+        graph = html.Div([graph, html.Div(id={"index": index, "type": "selection_summary"})])
 
         graph_control = self._scatter_control(
             index,
@@ -286,24 +693,67 @@ class CEMBAsnmCCells(Dataset):
             sample=sample,
             color_range=color_range,
             max_color_range=max_color_range,
+            render=render,
         )
         return graph, graph_control
 
-    def categorical_scatter_figure(self, coord, color, marker_size="auto", sample=50000):
-        plot_data = self.get_plot_data(coord, color, sample=sample)
-
-        plot_data[color] = plot_data[color].astype(str)
+    @staticmethod
+    def _get_category_codes_and_colors(values, color):
+        """Get the int category code of each value, the name and the palette color of each code."""
+        categories = pd.Categorical(values).remove_unused_categories()
         palette = color_collection.get_colors(color)
-
-        fig = px.scatter(
-            plot_data,
-            x=f"{coord}_0",
-            y=f"{coord}_1",
-            color=color,
-            hover_data=None,
-            custom_data=[plot_data.index.astype("uint32")],
-            color_discrete_map=palette,
+        names = [str(c) for c in categories.categories]
+        colors = [palette.get(name, DEFAULT_CATEGORY_COLOR) for name in names]
+        return categories.codes, names, colors
+
+    def categorical_raster_figure(self, coord, color, raster_size=512, viewport=None):
+        """Make a categorical scatter figure of all cells, rasterized into a raster_size x raster_size image."""
+        plot_data = self.get_plot_data(coord, color, viewport=viewport)
+        xmin, xmax, ymin, ymax = self._get_plot_lim(coord, viewport)
+
+        codes, _, colors = self._get_category_codes_and_colors(plot_data[color], color)
+
+        grid = rasterize_majority(
+            plot_data[f"{coord}_0"],
+            plot_data[f"{coord}_1"],
+            codes,
+            x_range=(xmin, xmax),
+            y_range=(ymin, ymax),
+            width=raster_size,
+            height=raster_size,
         )
+        rgba = colorize_categorical(grid, to_rgb_array(colors))
+
+        fig = go.Figure()
+        self._add_raster_image(fig, rgba, xmin, xmax, ymin, ymax)
+        self._common_fig_layout(fig)
+        return fig
+
+    def categorical_scatter_figure(
+        self, coord, color, marker_size="auto", sample=50000, render="points", viewport=None
+    ) -> dict:
+        """
+        Get the categorical scatter figure dict, figures of the whole embedding are cached by their parameters.
+
+        Zoomed figures (viewport is not None) are not cached, their viewports rarely repeat.
+        """
+        build = partial(self._build_categorical_scatter_figure, coord, color, marker_size, sample, render, viewport)
+        if viewport is not None:
+            return build().to_dict()
+        key = self._figure_key("categorical", coord, color, None, None, marker_size, sample, render)
+        return self._cached_figure(key, build)
+
+    def _build_categorical_scatter_figure(
+        self, coord, color, marker_size="auto", sample=50000, render="points", viewport=None
+    ):
+        if render == "raster":
+            return self.categorical_raster_figure(coord, color, viewport=viewport)
+        elif render != "points":
+            raise ValueError(f"Unknown render mode '{render}', use 'points' or 'raster'.")
+
+        plot_data = self.get_plot_data(coord, color, sample=sample, viewport=viewport)
+        codes, names, colors = self._get_category_codes_and_colors(plot_data[color], color)
+        xmin, xmax, ymin, ymax = self._get_plot_lim(coord, viewport)
 
         if marker_size == "auto":
             _scale = 1.5 if "merfish" in coord else 3
@@ -311,25 +761,39 @@ class CEMBAsnmCCells(Dataset):
         else:
             marker_size = float(marker_size)
 
-        if "merfish" in coord:
-            xmin, xmax, ymin, ymax = _get_x_y_lim(plot_data, coord)
-        else:
-            xmin, xmax, ymin, ymax = _get_x_y_lim(plot_data, coord, delta=0)
-
-        fig.update_traces(
-            marker=dict(size=marker_size),
-            showlegend=False,
-            # hovertemplate=f'{color}=%{{marker.color:.2f}}<extra></extra>'
+        # one webgl trace for all categories, the points are colored by their category codes
+        # through a stepwise colorscale, click a point to see its metadata in the cell clipboard.
+        # The category names are sent once in layout.meta and the browser maps the hovered code to its name,
+        # one name per point or one legend trace per category would undo the payload savings of the single trace.
+        fig = go.Figure(
+            go.Scattergl(
+                # round to the plot resolution, so the figure JSON has short numbers
+                x=quantize(plot_data[f"{coord}_0"], (xmin, xmax)),
+                y=quantize(plot_data[f"{coord}_1"], (ymin, ymax)),
+                mode="markers",
+                marker=dict(
+                    color=codes,
+                    colorscale=_discrete_colorscale(colors),
+                    cmin=-0.5,
+                    cmax=max(len(colors), 1) - 0.5,
+                    size=marker_size,
+                ),
+                customdata=plot_data.index.to_numpy(dtype="uint32"),
+                # no plotly hover label, the hover events still fire for the category tooltip
+                hoverinfo="none",
+                showlegend=False,
+            )
         )
         fig.update_layout(
             xaxis=dict(range=[xmin, xmax]),
             yaxis=dict(range=[ymin, ymax]),
+            meta=dict(color=color, categories=names),
         )
         self._common_fig_layout(fig)
         return fig
 
     def categorical_scatter(
-        self, index: Union[int, str], coord: str, color: str, sample: int = 50000
+        self, index: Union[int, str], coord: str, color: str, sample: int = 50000, render: str = "points"
     ) -> Tuple[dcc.Graph, dbc.Form]:
         """
         Making a scatter plot color by an categorical variable with pre-computed coordinates.
@@ -344,6 +808,8 @@ class CEMBAsnmCCells(Dataset):
             The name of the categorical variable to be used for coloring the scatter plot.
         sample
             The number of cells to be sampled for plotting. If set to None, all cells will be used.
+        render
+            "points" to plot the sampled cells as points, "raster" to plot all cells as a server-side rendered image.
 
         Returns
         -------
@@ -354,7 +820,7 @@ class CEMBAsnmCCells(Dataset):
         """
         sample = int(sample)
 
-        fig = self.categorical_scatter_figure(coord, color, sample=sample)
+        fig = self.categorical_scatter_figure(coord, color, sample=sample, render=render)
 
         graph = dcc.Graph(
             id={"index": index, "type": "categorical_scatter-graph"},
@@ -362,6 +828,13 @@ class CEMBAsnmCCells(Dataset):
             style=self._graph_style,
             config=self._default_graph_config,
         )
+        graph = html.Div(
+            [
+                graph,
+                dcc.Tooltip(id={"index": index, "type": "categorical_scatter-tooltip"}),
+                html.Div(id={"index": index, "type": "selection_summary"}),
+            ]
+        )
 
         graph_control = self._scatter_control(
             index,
@@ -369,6 +842,7 @@ class CEMBAsnmCCells(Dataset):
             coord=coord,
             color=color,
             sample=sample,
+            render=render,
         )
         return graph, graph_control
 
@@ -381,6 +855,7 @@ class CEMBAsnmCCells(Dataset):
         sample,
         color_range=None,
         max_color_range=None,
+        render="points",
     ):
         # color control
         color_control = dbc.Row(
@@ -420,7 +895,13 @@ class CEMBAsnmCCells(Dataset):
                 ],
                 className="g-2 mb-3",
             )
-            color_control = html.Div([color_control, range_slider], className="mb-3")
+            # parameters of the current figure, if only the color range changes, the figure is patched, not rebuilt
+            figure_params = dcc.Store(
+                id={"index": index, "type": "continuous_scatter-params"},
+                data={"coord": coord, "color": color, "sample": sample, "render": render},
+                storage_type="memory",
+            )
+            color_control = html.Div([color_control, range_slider, figure_params], className="mb-3")
 
         # coord control
         coord_control = dbc.Row(
@@ -457,6 +938,26 @@ class CEMBAsnmCCells(Dataset):
             className="g-2 mb-3",
         )
 
+        # render control
+        render_control = dbc.Row(
+            [
+                dbc.Label("Render", width="auto"),
+                dbc.Col(
+                    dbc.RadioItems(
+                        id={"index": index, "type": "render_input"},
+                        options=[
+                            {"label": "Points (downsampled)", "value": "points"},
+                            {"label": "Image (all cells)", "value": "raster"},
+                        ],
+                        value=render,
+                        inline=True,
+                    ),
+                    className="me-3",
+                ),
+            ],
+            className="g-2 mb-3",
+        )
+
         # final update button
         if scatter_type.startswith("continuous"):
             btn_type = "continuous_scatter_update-btn"
@@ -480,8 +981,8 @@ class CEMBAsnmCCells(Dataset):
             class_name="m-3",
         )
 
-        form = dbc.Form([color_control, coord_control, sample_control, update_button, delete_button])
+        form = dbc.Form([color_control, coord_control, sample_control, render_control, update_button, delete_button])
         return form
 
 
-cemba_cell = CEMBAsnmCCells()
+cemba_cell = registry.register("cemba_cell", CEMBAsnmCCells)
@@ -2,6 +2,8 @@
 
 import joblib
 
+from .registry import registry
+
 _palette_alias = {
     "cellsubclass": "subclass",
     "dissection_region": "cemba_dissection_region",
@@ -36,4 +38,4 @@ class Color:
             raise KeyError(f"Color for '{name}' not found. Use these names: {self.palette_names}")
 
 
-color_collection = Color()
+color_collection = registry.register("color_collection", Color)
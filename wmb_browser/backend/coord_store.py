@@ -0,0 +1,86 @@
+"""
+Memory-mapped coordinate store.
+
+Each embedding is stored as two raw .npy files in the store directory:
+``{name}.npy`` with the (n_obs, n_dims) coordinates, and ``{name}.obs.npy`` with the int32 positions of
+each row in the dataset obs_ids. The files are opened with np.memmap, so the coordinates are loaded lazily
+and shared through the page cache by all processes reading the same store.
+
+Build the store once from the joblib coords file:
+
+    python -m wmb_browser.backend.coord_store
+"""
+
+import pathlib
+
+import joblib
+import numpy as np
+import pandas as pd
+
+CELL_METADATA_PATH = "/browser/metadata/CEMBA_snmC.cell_metadata.pickle"
+CELL_COORDS_PATH = "/browser/metadata/CEMBA_snmC.cell_coords.lib"
+CELL_COORDS_STORE_DIR = "/browser/metadata/CEMBA_snmC.cell_coords"
+
+_OBS_SUFFIX = ".obs.npy"
+
+
+def write_coord_store(coords: dict, obs_ids: pd.Index, output_dir: str, dtype: str = "float16") -> None:
+    """
+    Write coordinates to a memory-mapped coordinate store.
+
+    Parameters
+    ----------
+    coords : dict of coordinate name to pd.DataFrame with object ids as index
+    obs_ids : object ids of the dataset, the row positions are relative to them
+    output_dir : directory of the store
+    dtype : data type to cast the coordinates to
+
+    Returns
+    -------
+    None
+    """
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for name, coord_df in coords.items():
+        positions = obs_ids.get_indexer(coord_df.index)
+        use_rows = positions >= 0
+        if not use_rows.all():
+            print(f"{(~use_rows).sum()} objects of coords '{name}' are not in obs_ids, skipped.")
+        np.save(output_dir / f"{name}.npy", coord_df.to_numpy(dtype=dtype)[use_rows])
+        np.save(output_dir / f"{name}{_OBS_SUFFIX}", positions[use_rows].astype("int32"))
+    return
+
+
+class CoordStore:
+    """Read-only memory-mapped coordinate store."""
+
+    def __init__(self, store_dir: str) -> None:
+        self.store_dir = pathlib.Path(store_dir)
+        return
+
+    @property
+    def names(self) -> list:
+        """Get the names of the coordinates in the store."""
+        return sorted(p.name[: -len(_OBS_SUFFIX)] for p in self.store_dir.glob(f"*{_OBS_SUFFIX}"))
+
+    def load(self, name: str, obs_ids: pd.Index) -> pd.DataFrame:
+        """
+        Open the coordinates with np.memmap, the data is read from disk on first access.
+
+        Parameters
+        ----------
+        name : name of the coordinates
+        obs_ids : object ids of the dataset
+
+        Returns
+        -------
+        pd.DataFrame backed by the memory-mapped array, with object ids as index
+        """
+        values = np.load(self.store_dir / f"{name}.npy", mmap_mode="r")
+        positions = np.load(self.store_dir / f"{name}{_OBS_SUFFIX}")
+        return pd.DataFrame(values, index=obs_ids[positions], copy=False)
+
+
+if __name__ == "__main__":
+    cell_meta = pd.read_pickle(CELL_METADATA_PATH)
+    write_coord_store(joblib.load(CELL_COORDS_PATH), cell_meta.index, CELL_COORDS_STORE_DIR)
@@ -1,35 +1,88 @@
-from typing import Union
+import threading
+from typing import Tuple, Union
 
+import numpy as np
 import pandas as pd
 import xarray as xr
 
+from .cache import SizedCache
+
+# trim fractions of the precomputed coords bounds, 0 is the exact min and max,
+# the figures only use the exact bounds, trimmed bounds need a quantile over all rows and are computed on first use
+COORD_BOUND_DELTAS = (0.0,)
+# at most this many objects are put in front of a stratified sample order,
+# 10% of the default figure sample, so the reserved objects never dominate a sample
+SAMPLE_MAX_RESERVED = 5000
+
 _RESERVED_KEYS = {"metadata", "coords"}
 
 
 class Dataset:
     """Dataset class for the WMB Browser backend."""
 
-    def __init__(self, name: str, obs_ids: pd.Index, obs_dim: str) -> None:
+    def __init__(
+        self,
+        name: str,
+        obs_ids: pd.Index,
+        obs_dim: str,
+        var_cache_bytes: int = 1024**3,
+        var_cache_policy: str = "lru",
+    ) -> None:
         self.name = name
         self.obs_ids = obs_ids
         self.obs_dim = obs_dim
 
         self.total_obs = obs_ids.size
 
-        # create a mapping from the original object ids to the internal ids
-        self._obs_ids_int_ids = pd.Index(range(len(obs_ids)))
-        self._original_id_to_int_id = {_id: int_id for int_id, _id in enumerate(obs_ids)}
-        self._int_id_to_original_id = {v: k for k, v in self._original_id_to_int_id.items()}
+        # the internal int id of an object is its position in obs_ids,
+        # metadata, coords and var values are all aligned to obs_ids by position
 
         self._var_matrices = {}
+        # positions of each obs in the obs level var matrices, None if the matrix is already aligned to obs_ids
+        self._var_obs_positions = {}
+        # int32 row of each obs in the group level var matrices, -1 if the obs is not in any group
+        self._var_group_codes = {}
+        # cache of full var columns, key: (set_name, var_name)
+        self._var_cache = SizedCache(max_bytes=var_cache_bytes, policy=var_cache_policy)
 
         self._metadata = pd.DataFrame(index=self.obs_ids)
+        # row stores of metadata columns, key: tuple of column names, value: (structured code array, categories)
+        self._metadata_row_stores = {}
 
         self._coords = {}
+        # positions of each coords row in obs_ids, -1 if the row is not an obs of this dataset
+        self._coord_obs_positions = {}
+        # lower and upper bounds of each coords dimension, key: coord name, value: dict of trim delta to bounds
+        self._coord_bounds = {}
+        # functions returning coords or var matrices, called on first access
+        self._coord_loaders = {}
+        self._var_matrix_loaders = {}
+        self._lazy_lock = threading.RLock()
+
+        # random key of each obs, shared by all coords so the same cells are sampled across panels
+        self._obs_sample_key = np.random.default_rng(0).random(self.total_obs)
+        # precomputed sample order of the coords rows, key: coord name
+        self._sample_orders = {}
+        self._sample_stratify_by = None
+        self._sample_min_per_group = 0
+        # uniform grid spatial index of the coords rows, key: coord name
+        self._coord_grids = {}
+        # missing value masks, so planning rows does not scan all coords and metadata on every request,
+        # key: coord name, True for the coords rows with missing coordinates or not an obs of this dataset
+        self._coord_null = {}
+        # key: metadata name, True for the obs with missing metadata
+        self._metadata_null = {}
         return
 
     def add_var_matrix(
-        self, name: str, var_matrix: xr.DataArray, var_dim: str, obs_dim=None, load: bool = False, dtype: str = None
+        self,
+        name: str,
+        var_matrix: xr.DataArray,
+        var_dim: str,
+        obs_dim=None,
+        load: bool = False,
+        dtype: str = None,
+        overwrite: bool = False,
     ) -> None:
         """
         Add an obj-by-var 2D matrix to the dataset.
@@ -41,19 +94,26 @@ class Dataset:
         var_dim : name of the variable dimension
         load : whether to load the data into memory
         dtype : data type to cast the data to
+        overwrite : whether to replace an existing feature set, its cached columns are invalidated
 
         Returns
         -------
         None
         """
         if name in self._var_matrices:
-            raise ValueError(f"Feature set '{name}' already exists.")
+            if not overwrite:
+                raise ValueError(f"Feature set '{name}' already exists.")
+            self._var_cache.invalidate(lambda key: key[0] == name)
+            self._var_obs_positions.pop(name, None)
+            self._var_group_codes.pop(name, None)
         if name in _RESERVED_KEYS:
             raise ValueError(f"Feature set name '{name}' is reserved.")
         if obs_dim is None:
             obs_dim = self.obs_dim
         else:
             assert obs_dim in self.metadata_names
+            # group level matrix is small, always hold it in memory
+            load = True
 
         if var_matrix.dims != (obs_dim, var_dim):
             raise ValueError(f"Dimensions of feature set '{name}' do not match.")
@@ -67,10 +127,61 @@ class Dataset:
         var_matrix = var_matrix.rename({var_dim: "var"})
         if obs_dim == self.obs_dim:
             var_matrix = var_matrix.rename({obs_dim: "obs"})
+            matrix_positions = var_matrix.get_index("obs").get_indexer(self.obs_ids)
+            if np.array_equal(matrix_positions, np.arange(self.total_obs)):
+                matrix_positions = None
+            self._var_obs_positions[name] = matrix_positions
+        else:
+            self._var_group_codes[name] = self._get_group_codes(obs_dim, var_matrix.get_index(obs_dim))
 
         self._var_matrices[name] = var_matrix
         return
 
+    def _get_group_codes(self, group_name: str, groups: pd.Index) -> np.ndarray:
+        """Get the int32 position of each obs's group in groups, -1 if the group is missing."""
+        obs_groups = self.get_metadata(group_name)
+        if obs_groups.dtype == "category":
+            # map the categories instead of every obs
+            category_positions = np.append(groups.get_indexer(obs_groups.cat.categories), -1)
+            codes = category_positions[obs_groups.cat.codes.to_numpy()]
+        else:
+            codes = groups.get_indexer(obs_groups)
+        return codes.astype("int32")
+
+    def add_lazy_var_matrix(
+        self, name: str, loader, var_dim: str, obs_dim=None, load: bool = False, dtype: str = None
+    ) -> None:
+        """
+        Add an obj-by-var 2D matrix that is opened on first access.
+
+        Parameters
+        ----------
+        name : name of the feature set
+        loader : function without arguments returning the data array with dimensions (obs_dim, var_dim)
+        var_dim : name of the variable dimension
+        load : whether to load the data into memory
+        dtype : data type to cast the data to
+
+        Returns
+        -------
+        None
+        """
+        if name in self.var_sets:
+            raise ValueError(f"Feature set '{name}' already exists.")
+        self._var_matrix_loaders[name] = (
+            loader,
+            {"var_dim": var_dim, "obs_dim": obs_dim, "load": load, "dtype": dtype},
+        )
+        return
+
+    def warm_up(self) -> None:
+        """Load all lazy coords and var matrices."""
+        for name in list(self._coord_loaders.keys()):
+            self.get_coords(name)
+        for name in list(self._var_matrix_loaders.keys()):
+            self._get_var_matrix(name)
+        return
+
     def add_metadata(self, metadata: pd.Series):
         """
         Add a metadata variable to the dataset.
@@ -89,7 +200,7 @@ class Dataset:
         if metadata.dtype == "category":
             metadata = metadata.astype(str).astype("category")
 
-        self._metadata[metadata.name] = metadata
+        self._metadata[metadata.name] = metadata.reindex(self.obs_ids)
         return
 
     def add_metadata_df(self, metadata: pd.DataFrame) -> None:
@@ -107,7 +218,7 @@ class Dataset:
         for col in metadata.columns:
             if col in self._metadata:
                 raise ValueError(f"Metadata column '{col}' already exists.")
-        self._metadata = pd.concat([self._metadata, metadata], axis=1)
+        self._metadata = pd.concat([self._metadata, metadata.reindex(self.obs_ids)], axis=1)
         return
 
     def add_coords(self, name: str, coords: pd.DataFrame, dtype="float16"):
@@ -118,33 +229,453 @@ class Dataset:
         ----------
         name : name of the coordinates
         coords : data array with dimensions (obs_dim, coord_dim)
-        dtype : data type to cast the data to
+        dtype : data type to cast the data to, the data is not copied if it already has this dtype
 
         Returns
         -------
         None
         """
-        _coords = coords.astype(dtype)
+        _coords = coords.astype(dtype, copy=False)
 
-        _coords.columns = [f"{name}_{c}" for c in range(_coords.shape[1])]
+        _coords = _coords.set_axis([f"{name}_{c}" for c in range(_coords.shape[1])], axis=1, copy=False)
         self._coords[name] = _coords
+        self._coord_obs_positions[name] = self.obs_ids.get_indexer(_coords.index)
+        self._coord_bounds[name] = self._compute_coord_bounds(name, COORD_BOUND_DELTAS)
+        # the sample order, spatial index and missing value mask of replaced coords are recomputed on next use
+        self._sample_orders.pop(name, None)
+        self._coord_grids.pop(name, None)
+        self._coord_null.pop(name, None)
+        return
+
+    def _compute_coord_bounds(self, name: str, deltas) -> dict:
+        values = self._coords[name].to_numpy(dtype="float32")[self._coord_obs_positions[name] >= 0]
+        bounds = {}
+        for delta in deltas:
+            if values.shape[0] == 0:
+                bounds[delta] = np.full((values.shape[1], 2), np.nan, dtype="float32")
+            elif delta == 0:
+                bounds[delta] = np.stack([np.nanmin(values, axis=0), np.nanmax(values, axis=0)], axis=1)
+            else:
+                bounds[delta] = np.nanquantile(values, [delta, 1 - delta], axis=0).T.astype("float32")
+        return bounds
+
+    def get_coord_bounds(self, name: str, delta: float = 0.0) -> np.ndarray:
+        """
+        Get the bounds of each coords dimension over all objects, precomputed when the coords are added.
+
+        Parameters
+        ----------
+        name : name of the coordinates
+        delta : trim fraction, the bounds are the delta and 1 - delta quantiles, 0 gives the exact min and max.
+            Values not in COORD_BOUND_DELTAS are computed on first use.
+
+        Returns
+        -------
+        (n_dims, 2) float32 array of the lower and upper bound of each dimension
+        """
+        self.get_coords(name)
+        bounds = self._coord_bounds[name]
+        try:
+            return bounds[delta]
+        except KeyError:
+            bounds.update(self._compute_coord_bounds(name, [delta]))
+            return bounds[delta]
+
+    def add_lazy_coords(self, name: str, loader, dtype="float16") -> None:
+        """
+        Add coordinates that are loaded on first access.
+
+        Parameters
+        ----------
+        name : name of the coordinates
+        loader : function without arguments returning the coords pd.DataFrame
+        dtype : data type to cast the data to
+
+        Returns
+        -------
+        None
+        """
+        self._coord_loaders[name] = (loader, dtype)
+        return
+
+    def set_sample_order(self, coord: str = None, stratify_by: str = None, min_per_group: int = 5) -> None:
+        """
+        Set how the sample order of coords rows is computed, sampling N objects takes the first N valid rows.
+
+        Parameters
+        ----------
+        coord : name of the coordinates, if None, set the default of all coordinates
+        stratify_by : name of a categorical metadata column, if provided, the first min_per_group objects
+            of each category are put in front of the order, so rare categories survive downsampling
+        min_per_group : number of objects of each category put in front of the order,
+            lowered if the categories would reserve more than SAMPLE_MAX_RESERVED objects in total
+
+        Returns
+        -------
+        None
+        """
+        if coord is None:
+            self._sample_stratify_by = stratify_by
+            self._sample_min_per_group = min_per_group
+            self._sample_orders = {}
+        else:
+            self._sample_orders[coord] = self._compute_sample_order(coord, stratify_by, min_per_group)
         return
 
+    def _compute_sample_order(self, coord: str, stratify_by: str = None, min_per_group: int = 0) -> np.ndarray:
+        self.get_coords(coord)
+        obs_positions = self._coord_obs_positions[coord]
+        key = np.where(obs_positions >= 0, self._obs_sample_key[obs_positions], np.inf)
+        if stratify_by is None:
+            return np.argsort(key, kind="stable")
+
+        codes = pd.Categorical(self.get_metadata(stratify_by)).codes[obs_positions]
+        n_groups = np.unique(codes[codes >= 0]).size
+        if n_groups * min_per_group > SAMPLE_MAX_RESERVED:
+            min_per_group = max(SAMPLE_MAX_RESERVED // n_groups, 1)
+        # rank of each row within its category, in the random key order
+        by_group = np.lexsort((key, codes))
+        group_codes = codes[by_group]
+        group_starts = np.r_[0, np.flatnonzero(np.diff(group_codes)) + 1]
+        group_sizes = np.diff(np.r_[group_starts, group_codes.size])
+        rank = np.empty(codes.size, dtype="int64")
+        rank[by_group] = np.arange(codes.size) - np.repeat(group_starts, group_sizes)
+        reserved = (rank < min_per_group) & (codes >= 0) & (obs_positions >= 0)
+        return np.lexsort((key, ~reserved))
+
+    def _get_sample_order(self, coord: str) -> np.ndarray:
+        try:
+            return self._sample_orders[coord]
+        except KeyError:
+            order = self._compute_sample_order(coord, self._sample_stratify_by, self._sample_min_per_group)
+            self._sample_orders[coord] = order
+            return order
+
+    def _get_coord_null(self, coord: str) -> np.ndarray:
+        try:
+            return self._coord_null[coord]
+        except KeyError:
+            coords = self.get_coords(coord)
+            null = coords.isnull().to_numpy().any(axis=1) | (self._coord_obs_positions[coord] < 0)
+            self._coord_null[coord] = null
+            return null
+
+    def _get_metadata_null(self, name: str) -> np.ndarray:
+        try:
+            return self._metadata_null[name]
+        except KeyError:
+            null = self.get_metadata(name).isnull().to_numpy()
+            self._metadata_null[name] = null
+            return null
+
+    def _build_coord_grid(self, coord: str, grid_size: int = 256) -> dict:
+        """
+        Build a uniform grid spatial index of the coords rows.
+
+        The rows are sorted by their grid cell, cells are ordered row-major,
+        so the rows of consecutive cells in the same grid row are a contiguous slice.
+        """
+        coords = self.get_coords(coord)
+        x = coords.iloc[:, 0].to_numpy(dtype="float32")
+        y = coords.iloc[:, 1].to_numpy(dtype="float32")
+        valid = np.isfinite(x) & np.isfinite(y)
+        if valid.any():
+            xmin, xmax = float(x[valid].min()), float(x[valid].max())
+            ymin, ymax = float(y[valid].min()), float(y[valid].max())
+        else:
+            xmin, xmax, ymin, ymax = 0.0, 1.0, 0.0, 1.0
+        x_step = max(xmax - xmin, 1e-12) / grid_size
+        y_step = max(ymax - ymin, 1e-12) / grid_size
+
+        rows = np.flatnonzero(valid)
+        col = np.clip(((x[rows] - xmin) / x_step).astype("int64"), 0, grid_size - 1)
+        row = np.clip(((y[rows] - ymin) / y_step).astype("int64"), 0, grid_size - 1)
+        cell = row * grid_size + col
+        order = np.argsort(cell, kind="stable")
+        offsets = np.zeros(grid_size * grid_size + 1, dtype="int64")
+        np.cumsum(np.bincount(cell, minlength=grid_size * grid_size), out=offsets[1:])
+        return {
+            "size": grid_size,
+            "origin": (xmin, ymin),
+            "step": (x_step, y_step),
+            "rows": rows[order],
+            "offsets": offsets,
+        }
+
+    def _get_coord_grid(self, coord: str) -> dict:
+        try:
+            return self._coord_grids[coord]
+        except KeyError:
+            grid = self._build_coord_grid(coord)
+            self._coord_grids[coord] = grid
+            return grid
+
+    def query_viewport_rows(self, coord: str, viewport: tuple) -> np.ndarray:
+        """
+        Get the coords rows inside a viewport, using the grid spatial index of the coords.
+
+        Parameters
+        ----------
+        coord : name of the coordinates
+        viewport : (xmin, xmax, ymin, ymax) of the viewport
+
+        Returns
+        -------
+        sorted np.ndarray of integer row positions in the coords
+        """
+        xmin, xmax, ymin, ymax = viewport
+        if xmax < xmin or ymax < ymin:
+            return np.array([], dtype="int64")
+        grid = self._get_coord_grid(coord)
+        size = grid["size"]
+        x0, y0 = grid["origin"]
+        x_step, y_step = grid["step"]
+        offsets = grid["offsets"]
+
+        col_start = int(np.clip(np.floor((xmin - x0) / x_step), 0, size - 1))
+        col_end = int(np.clip(np.floor((xmax - x0) / x_step), 0, size - 1))
+        row_start = int(np.clip(np.floor((ymin - y0) / y_step), 0, size - 1))
+        row_end = int(np.clip(np.floor((ymax - y0) / y_step), 0, size - 1))
+
+        # candidate rows of the overlapping grid cells, one contiguous slice per grid row
+        candidates = [
+            grid["rows"][offsets[r * size + col_start] : offsets[r * size + col_end + 1]]
+            for r in range(row_start, row_end + 1)
+        ]
+        candidates = np.sort(np.concatenate(candidates))
+
+        # exact filter, the border cells are only partly inside the viewport
+        coords = self.get_coords(coord)
+        x = coords.iloc[:, 0].to_numpy()[candidates].astype("float32")
+        y = coords.iloc[:, 1].to_numpy()[candidates].astype("float32")
+        inside = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+        return candidates[inside]
+
+    def query_polygon_rows(self, coord: str, polygon) -> np.ndarray:
+        """
+        Get the coords rows inside a polygon, e.g. a lasso selection.
+
+        The candidate rows in the polygon bounding box are taken from the grid spatial index and sorted by y,
+        each polygon edge then only tests the rows in its y band, with the even-odd crossing rule.
+
+        Parameters
+        ----------
+        coord : name of the coordinates
+        polygon : (n_vertices, 2) array of the polygon x and y, the polygon is closed automatically
+
+        Returns
+        -------
+        sorted np.ndarray of integer row positions in the coords
+        """
+        polygon = np.asarray(polygon, dtype="float64")
+        if polygon.ndim != 2 or polygon.shape[0] < 3:
+            raise ValueError("polygon must have at least 3 vertices.")
+        (xmin, ymin), (xmax, ymax) = polygon.min(axis=0), polygon.max(axis=0)
+        rows = self.query_viewport_rows(coord, (xmin, xmax, ymin, ymax))
+
+        coords = self.get_coords(coord)
+        x = coords.iloc[:, 0].to_numpy()[rows].astype("float64")
+        y = coords.iloc[:, 1].to_numpy()[rows].astype("float64")
+        by_y = np.argsort(y, kind="stable")
+        x = x[by_y]
+        y = y[by_y]
+
+        inside = np.zeros(rows.size, dtype=bool)
+        for (xa, ya), (xb, yb) in zip(polygon, np.roll(polygon, -1, axis=0)):
+            if ya == yb:
+                continue
+            # rows whose horizontal ray crosses the edge have y in [min(ya, yb), max(ya, yb))
+            start, end = np.searchsorted(y, [min(ya, yb), max(ya, yb)], side="left")
+            x_cross = xa + (y[start:end] - ya) * (xb - xa) / (yb - ya)
+            inside[start:end] ^= x[start:end] < x_cross
+        return np.sort(rows[by_y[inside]])
+
+    def to_int_ids(self, obs_ids) -> np.ndarray:
+        """
+        Get the internal int ids of object ids, -1 for ids not in the dataset.
+
+        Parameters
+        ----------
+        obs_ids : object ids
+
+        Returns
+        -------
+        np.ndarray
+        """
+        return self.obs_ids.get_indexer(obs_ids)
+
+    def to_obs_ids(self, int_ids) -> pd.Index:
+        """
+        Get the object ids of internal int ids.
+
+        Parameters
+        ----------
+        int_ids : int ids, or a single int id
+
+        Returns
+        -------
+        pd.Index, or a single object id
+        """
+        return self.obs_ids[int_ids]
+
     @property
     def var_sets(self) -> set:
         """Get the names of the feature sets."""
-        return set(self._var_matrices.keys())
+        return set(self._var_matrices.keys()) | set(self._var_matrix_loaders.keys())
 
     @property
     def coords(self) -> set:
         """Get the names of the coordinates."""
-        return set(self._coords.keys())
+        return set(self._coords.keys()) | set(self._coord_loaders.keys())
 
     @property
     def metadata_names(self) -> set:
         """Get the names of the metadata columns."""
         return set(self._metadata.columns)
 
+    @property
+    def var_cache_stats(self) -> dict:
+        """Get the hit, miss and eviction statistics of the var column cache."""
+        return self._var_cache.stats
+
+    def set_var_cache(self, max_bytes: int, policy: str = "lru") -> None:
+        """
+        Replace the var column cache with a new memory budget and eviction policy.
+
+        Parameters
+        ----------
+        max_bytes : memory budget of the cached columns in bytes, 0 disables the cache
+        policy : eviction policy, either 'lru' or 'lfu'
+
+        Returns
+        -------
+        None
+        """
+        self._var_cache = SizedCache(max_bytes=max_bytes, policy=policy)
+        return
+
+    def _get_var_matrix(self, set_name: str) -> xr.DataArray:
+        try:
+            return self._var_matrices[set_name]
+        except KeyError:
+            pass
+        with self._lazy_lock:
+            if set_name not in self._var_matrices:
+                try:
+                    loader, kwargs = self._var_matrix_loaders[set_name]
+                except KeyError:
+                    raise KeyError(f"Feature set '{set_name}' not found.")
+                self.add_var_matrix(set_name, loader(), **kwargs)
+                del self._var_matrix_loaders[set_name]
+        return self._var_matrices[set_name]
+
+    def _read_var_columns(self, set_name: str, var_names: list, obs_positions: np.ndarray = None) -> dict:
+        """
+        Read the columns of several variables from the var matrix, grouped by the var chunks.
+
+        Variables sharing a chunk along the var dimension are read together, so each chunk is read once.
+
+        Parameters
+        ----------
+        set_name : the name of the feature set
+        var_names : the names of the variables
+        obs_positions : integer positions of the objects in obs_ids to read, None to read all objects
+
+        Returns
+        -------
+        dict of variable name to np.ndarray
+        """
+        _da = self._get_var_matrix(set_name)
+        var_positions = _da.get_index("var").get_indexer(var_names)
+        if (var_positions < 0).any():
+            missing = [v for v, p in zip(var_names, var_positions) if p < 0]
+            raise KeyError(f"Variable {missing} not found in feature set '{set_name}'.")
+
+        # translate obs positions to the var matrix positions, objects not in the matrix are missing values
+        matrix_positions = self._var_obs_positions.get(set_name)
+        if matrix_positions is not None:
+            obs_positions = matrix_positions if obs_positions is None else matrix_positions[obs_positions]
+            not_in_matrix = obs_positions < 0
+            obs_positions = np.where(not_in_matrix, 0, obs_positions)
+        else:
+            not_in_matrix = None
+
+        if obs_positions is not None:
+            # read in sorted order for locality, then restore the requested order
+            order = np.argsort(obs_positions, kind="stable")
+            _da = _da.isel(obs=obs_positions[order])
+
+        if _da.chunks is None:
+            chunk_bounds = np.array([0, _da.shape[1]])
+        else:
+            chunk_bounds = np.cumsum((0,) + _da.chunks[1])
+        chunk_ids = np.searchsorted(chunk_bounds, var_positions, side="right") - 1
+
+        columns = {}
+        for chunk_id in np.unique(chunk_ids):
+            _positions = np.unique(var_positions[chunk_ids == chunk_id])
+            values = _da.isel(var=_positions).values
+            for i, pos in enumerate(_positions):
+                column = values[:, i]
+                if obs_positions is not None:
+                    _column = np.empty_like(column)
+                    _column[order] = column
+                    column = _column
+                if not_in_matrix is not None and not_in_matrix.any():
+                    column = column.astype("float32", copy=False)
+                    column[not_in_matrix] = np.nan
+                columns[pos] = column
+        return {v: columns[p] for v, p in zip(var_names, var_positions)}
+
+    def _to_cache_column(self, set_name: str, column: np.ndarray) -> np.ndarray:
+        if set_name in self._var_group_codes:
+            # append a missing value for the objects not in any group, whose code is -1
+            column = np.append(column.astype("float32"), np.float32(np.nan))
+        else:
+            column = np.ascontiguousarray(column)
+        column.flags.writeable = False
+        return column
+
+    def _get_var_columns(self, set_name: str, var_names: list, read: bool = True) -> dict:
+        """
+        Get the full columns of variables from the cache, read them from the var matrix on cache miss.
+
+        Parameters
+        ----------
+        set_name : the name of the feature set
+        var_names : the names of the variables
+        read : whether to read the columns on cache miss, if False, missed variables are not returned
+
+        Returns
+        -------
+        dict of variable name to np.ndarray aligned with obs_ids for obs level matrices,
+        or pd.Series indexed by groups for group level matrices
+        """
+        columns = {}
+        for var_name in var_names:
+            column = self._var_cache.get((set_name, var_name))
+            if column is not None:
+                columns[var_name] = column
+        missing = [v for v in var_names if v not in columns]
+        if read and len(missing) > 0:
+            for var_name, column in self._read_var_columns(set_name, missing).items():
+                column = self._to_cache_column(set_name, column)
+                self._var_cache.put((set_name, var_name), column)
+                columns[var_name] = column
+        return columns
+
+    def _column_at(self, set_name: str, column: np.ndarray, obs_positions: np.ndarray = None) -> np.ndarray:
+        try:
+            # expand group level values to obs level by the group codes
+            codes = self._var_group_codes[set_name]
+            return column.take(codes if obs_positions is None else codes[obs_positions])
+        except KeyError:
+            pass
+        if obs_positions is None:
+            return column
+        else:
+            return column[obs_positions]
+
     def get_var_values(self, set_name: str, var_name: str) -> pd.Series:
         """
         Get a series of values for a given variable in a given feature set.
@@ -158,19 +689,27 @@ class Dataset:
         -------
         pd.Series
         """
-        try:
-            _da = self._var_matrices[set_name]
-        except KeyError:
-            raise KeyError(f"Feature set '{set_name}' not found.")
-        try:
-            _data = _da.sel(var=var_name).to_pandas()
-        except KeyError:
-            raise KeyError(f"Variable '{var_name}' not found in feature set '{set_name}'.")
+        column = self._get_var_columns(set_name, [var_name])[var_name]
+        return pd.Series(self._column_at(set_name, column), index=self.obs_ids, name=var_name)
+
+    def get_var_values_batch(self, set_name: str, var_names: list) -> pd.DataFrame:
+        """
+        Get the values of several variables in a given feature set.
 
-        if _data.index.name not in {self.obs_dim, "obs"}:
-            # map data to cell level
-            _data = self.get_metadata(_data.index.name).map(_data)
-        return _data
+        Variables sharing the same chunk are read together, each chunk is read only once.
+
+        Parameters
+        ----------
+        set_name : the name of the feature set
+        var_names : the names of the variables
+
+        Returns
+        -------
+        pd.DataFrame with obs_ids as index and the unique var_names as columns, in the input order
+        """
+        var_names = list(dict.fromkeys(var_names))
+        columns = self._get_var_columns(set_name, var_names)
+        return pd.DataFrame({v: self._column_at(set_name, columns[v]) for v in var_names}, index=self.obs_ids)
 
     def get_coords(self, name: str) -> pd.DataFrame:
         """
@@ -187,7 +726,16 @@ class Dataset:
         try:
             return self._coords[name]
         except KeyError:
-            raise KeyError(f"Coordinates '{name}' not found.")
+            pass
+        with self._lazy_lock:
+            if name not in self._coords:
+                try:
+                    loader, dtype = self._coord_loaders[name]
+                except KeyError:
+                    raise KeyError(f"Coordinates '{name}' not found.")
+                self.add_coords(name, loader(), dtype=dtype)
+                del self._coord_loaders[name]
+        return self._coords[name]
 
     def get_metadata(self, name: str) -> pd.Series:
         """
@@ -206,7 +754,169 @@ class Dataset:
         except KeyError:
             raise KeyError(f"Metadata '{name}' not found.")
 
-    def get_plot_data(
+    def _get_metadata_row_store(self, names: tuple) -> tuple:
+        try:
+            return self._metadata_row_stores[names]
+        except KeyError:
+            pass
+        codes = {}
+        categories = {}
+        for name in names:
+            _cat = pd.Categorical(self.get_metadata(name))
+            codes[name] = _cat.codes
+            categories[name] = _cat.categories
+        # one row of category codes per object, so all columns of an object are read at once
+        store = np.empty(self.total_obs, dtype=[(name, codes[name].dtype) for name in names])
+        for name in names:
+            store[name] = codes[name]
+        self._metadata_row_stores[names] = (store, categories)
+        return store, categories
+
+    def get_metadata_counts(self, int_ids, name: str) -> pd.Series:
+        """
+        Count the values of a metadata column in a batch of objects, missing values are not counted.
+
+        Parameters
+        ----------
+        int_ids : int ids of the objects
+        name : name of the metadata column
+
+        Returns
+        -------
+        pd.Series of counts with the metadata values as index, sorted by count in descending order
+        """
+        store, categories = self._get_metadata_row_store((name,))
+        codes = store[name][np.asarray(int_ids, dtype="int64")]
+        counts = np.bincount(codes[codes >= 0], minlength=len(categories[name]))
+        counts = pd.Series(counts, index=categories[name], name=name)
+        return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+    def get_metadata_rows(self, int_ids, names: list) -> pd.DataFrame:
+        """
+        Get several metadata columns of a batch of objects with a single positional read.
+
+        The columns are kept as category codes in a structured array row store built on first use,
+        only the codes of the requested rows are resolved to their values.
+
+        Parameters
+        ----------
+        int_ids : int ids of the objects
+        names : names of the metadata columns
+
+        Returns
+        -------
+        pd.DataFrame with int ids as index and names as columns
+        """
+        int_ids = np.atleast_1d(np.asarray(int_ids, dtype="int64"))
+        store, categories = self._get_metadata_row_store(tuple(names))
+        rows = store[int_ids]
+        data = {}
+        for name in names:
+            codes = rows[name]
+            if len(categories[name]) == 0:
+                values = np.full(codes.size, np.nan, dtype=object)
+            else:
+                values = categories[name].take(np.where(codes < 0, 0, codes)).to_numpy(dtype=object)
+                values[codes < 0] = np.nan
+            data[name] = values
+        return pd.DataFrame(data, index=pd.Index(int_ids))
+
+    def _seen_vars(self, set_name: str, var_names: list) -> set:
+        """Get the variables that were recently requested but missed in the var cache."""
+        return {v for v in var_names if self._var_cache.seen((set_name, v))}
+
+    def _get_var_values_at(self, set_name: str, var_names: list, obs_positions: np.ndarray, seen: set = None) -> dict:
+        """
+        Get the values of variables only for the given obs positions.
+
+        Only the rows in obs_positions are read from the var matrix (orthogonal indexing),
+        so the chunks that do not contain any of these rows are never touched.
+
+        Parameters
+        ----------
+        set_name : the name of the feature set
+        var_names : the names of the variables
+        obs_positions : integer positions of the objects in obs_ids
+        seen : variables requested before, their full columns are read and cached, default checks the var cache;
+            requests reading several batches check once before the first batch, each batch records a cache miss
+
+        Returns
+        -------
+        dict of variable name to np.ndarray
+        """
+        _da = self._get_var_matrix(set_name)
+        if seen is None:
+            seen = self._seen_vars(set_name, var_names)
+        columns = self._get_var_columns(set_name, var_names, read=False)
+        missing = [v for v in var_names if v not in columns]
+
+        # read full columns of group level matrices, which are small,
+        # and of obs level variables that are requested repeatedly, they are cached for the next requests
+        if _da.dims[0] != "obs" or obs_positions.size == self.total_obs:
+            read_full = missing
+        elif self._var_cache.max_bytes > 0:
+            read_full = [v for v in missing if v in seen]
+        else:
+            read_full = []
+        if len(read_full) > 0:
+            columns.update(self._get_var_columns(set_name, read_full))
+        values = {v: self._column_at(set_name, c, obs_positions) for v, c in columns.items()}
+
+        # first request of these variables, read only the requested rows
+        read_rows = [v for v in missing if v not in columns]
+        if len(read_rows) > 0:
+            values.update(self._read_var_columns(set_name, read_rows, obs_positions))
+        return {v: values[v] for v in var_names}
+
+    def _plan_rows(
+        self,
+        coord: str,
+        metadata: list,
+        use_obs: pd.Index = None,
+        missing_value: str = "drop",
+        viewport: tuple = None,
+    ) -> np.ndarray:
+        """
+        Plan the candidate coords rows from coords, metadata, use_obs and viewport, before reading any var values.
+
+        Parameters
+        ----------
+        coord : name of the coordinates
+        metadata : list of metadata column names
+        use_obs : list of object ids to use
+        missing_value : how to handle missing values, either 'drop' or 'raise'
+        viewport : (xmin, xmax, ymin, ymax), only use the rows inside it
+
+        Returns
+        -------
+        np.ndarray of integer row positions in the coords
+        """
+        coords = self.get_coords(coord)
+        obs_positions = self._coord_obs_positions[coord]
+
+        if use_obs is None:
+            rows = np.arange(coords.shape[0])
+        else:
+            rows = coords.index.get_indexer(use_obs)
+            if (rows < 0).any():
+                raise KeyError(f"{(rows < 0).sum()} objects in use_obs not found in coordinates '{coord}'.")
+        if viewport is not None:
+            view_rows = self.query_viewport_rows(coord, viewport)
+            rows = view_rows if use_obs is None else rows[np.isin(rows, view_rows)]
+
+        null = self._get_coord_null(coord)[rows]
+        for m in metadata:
+            null |= self._get_metadata_null(m)[obs_positions[rows]]
+
+        if missing_value == "drop":
+            rows = rows[~null]
+        elif missing_value == "raise":
+            assert not null.any()
+        else:
+            raise ValueError(f"Invalid value for missing_value: '{missing_value}'")
+        return rows
+
+    def get_plot_arrays(
         self,
         coord: str,
         metadata: Union[str, list] = None,
@@ -214,9 +924,15 @@ class Dataset:
         use_obs: pd.Index = None,
         missing_value: str = "drop",
         sample: int = None,
-    ) -> pd.DataFrame:
+        viewport: tuple = None,
+    ) -> Tuple[np.ndarray, dict]:
         """
-        Get the tidy data for plots.
+        Get the plot data as a dict of arrays.
+
+        The final rows are planned from coords, metadata, use_obs and sample first,
+        var values are then read only for the planned rows.
+        The cached coords and metadata are never modified, if all of their rows are used,
+        the returned arrays are views of them instead of copies.
 
         Parameters
         ----------
@@ -226,42 +942,110 @@ class Dataset:
         use_obs : list of object ids to use
         missing_value : how to handle missing values, either 'drop' or 'raise'
         sample : number of objects to sample
+        viewport : (xmin, xmax, ymin, ymax), only use the objects inside it, the sample is taken inside it
 
         Returns
         -------
-        pd.DataFrame
+        int ids of the rows, dict of column name to array
         """
-        plot_data = self.get_coords(coord)
+        if metadata is None:
+            metadata = []
+        elif isinstance(metadata, str):
+            metadata = [metadata]
 
-        if metadata is not None:
-            if isinstance(metadata, str):
-                _metadata = self._metadata[metadata]
-                plot_data[metadata] = _metadata
-            else:
-                for m in metadata:
-                    _metadata = self._metadata[m]
-                    plot_data[m] = _metadata
-
-        if var_dict is not None:
-            for name, var in var_dict.items():
-                if isinstance(var, str):
-                    plot_data[f"{name}:{var}"] = self.get_var_values(name, var)
-                else:
-                    for _v in var:
-                        plot_data[f"{name}:{_v}"] = self.get_var_values(name, _v)
-
-        if use_obs is not None:
-            plot_data = plot_data.loc[use_obs].copy()
-        if missing_value == "drop":
-            plot_data = plot_data.dropna()
-        elif missing_value == "raise":
-            assert not plot_data.isnull().any().any()
+        if var_dict is None:
+            var_dict = {}
+        var_dict = {name: [var] if isinstance(var, str) else list(var) for name, var in var_dict.items()}
+
+        rows = self._plan_rows(coord, metadata, use_obs, missing_value, viewport)
+        if sample is not None and rows.size > sample:
+            # take the valid rows in the precomputed sample order, the first sample rows are used
+            order = self._get_sample_order(coord)
+            is_valid = np.zeros(order.size, dtype=bool)
+            is_valid[rows] = True
+            rows = order[is_valid[order]]
+            n_target = sample
         else:
-            raise ValueError(f"Invalid value for missing_value: '{missing_value}'")
+            n_target = rows.size
+        obs_positions = self._coord_obs_positions[coord]
+
+        # read var values only for the planned rows, top up with the next candidate rows
+        # if some of them are dropped due to missing var values.
+        # Whether a variable was requested before is checked once, the top up batches are the same request
+        seen = {name: self._seen_vars(name, var_list) for name, var_list in var_dict.items()}
+        kept_rows = []
+        var_values = {f"{name}:{var}": [] for name, var_list in var_dict.items() for var in var_list}
+        n_kept = 0
+        start = 0
+        while n_kept < n_target and start < rows.size:
+            batch = rows[start : start + n_target - n_kept]
+            start += batch.size
+            _values = {}
+            for name, var_list in var_dict.items():
+                _set_values = self._get_var_values_at(name, var_list, obs_positions[batch], seen=seen[name])
+                _values.update({f"{name}:{var}": v for var, v in _set_values.items()})
+            null = np.zeros(batch.size, dtype=bool)
+            for v in _values.values():
+                null |= pd.isnull(v)
+            if null.any():
+                if missing_value == "raise":
+                    raise AssertionError(f"Missing values found in {list(_values.keys())}")
+                batch = batch[~null]
+                _values = {k: v[~null] for k, v in _values.items()}
+            kept_rows.append(batch)
+            for k, v in _values.items():
+                var_values[k].append(v)
+            n_kept += batch.size
+        rows = np.concatenate(kept_rows) if len(kept_rows) > 0 else rows[:0]
 
-        if sample is not None and plot_data.shape[0] > sample:
-            plot_data = plot_data.sample(sample, random_state=0)
+        coords = self.get_coords(coord)
+        int_ids = obs_positions[rows]
+        all_coords = rows.size == coords.shape[0] and np.array_equal(rows, np.arange(rows.size))
+        all_obs = int_ids.size == self.total_obs and np.array_equal(int_ids, np.arange(int_ids.size))
 
-        # change index to int ids
-        plot_data.index = plot_data.index.map(self._original_id_to_int_id)
-        return plot_data
+        arrays = {}
+        for col in coords.columns:
+            values = coords[col].to_numpy()
+            arrays[col] = values if all_coords else values[rows]
+        for m in metadata:
+            values = self.get_metadata(m).array
+            arrays[m] = values if all_obs else values.take(int_ids)
+        for k, v in var_values.items():
+            if len(v) == 0:
+                arrays[k] = np.array([], dtype="float32")
+            else:
+                arrays[k] = v[0] if len(v) == 1 else np.concatenate(v)
+        return int_ids, arrays
+
+    def get_plot_data(
+        self,
+        coord: str,
+        metadata: Union[str, list] = None,
+        var_dict: dict = None,
+        use_obs: pd.Index = None,
+        missing_value: str = "drop",
+        sample: int = None,
+        viewport: tuple = None,
+    ) -> pd.DataFrame:
+        """
+        Get the tidy data for plots.
+
+        The data frame is built from the arrays of get_plot_arrays without copying them,
+        adding or replacing its columns does not change the cached coords and metadata.
+
+        Parameters
+        ----------
+        coord : name of the coordinates
+        metadata : name of the metadata columns
+        var_dict : dictionary of feature sets and variables
+        use_obs : list of object ids to use
+        missing_value : how to handle missing values, either 'drop' or 'raise'
+        sample : number of objects to sample
+        viewport : (xmin, xmax, ymin, ymax), only use the objects inside it, the sample is taken inside it
+
+        Returns
+        -------
+        pd.DataFrame with int ids as index
+        """
+        int_ids, arrays = self.get_plot_arrays(coord, metadata, var_dict, use_obs, missing_value, sample, viewport)
+        return pd.DataFrame(arrays, index=pd.Index(int_ids), copy=False)
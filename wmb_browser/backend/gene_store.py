@@ -0,0 +1,123 @@
+"""
+Build the browser-optimized gene-major store of the cell-by-gene methylation matrices.
+
+The browser reads the cell-by-gene matrices one gene at a time for all or many cells,
+so the gene-major store puts all cells of a gene into the same chunk.
+This is an offline build step, run it once after the analysis pipeline produced the original store:
+
+    python -m wmb_browser.backend.gene_store /cemba/wmb/GeneChunks/CEMBA.snmC/ /cemba/wmb/GeneChunks/CEMBA.snmC.gene_major.zarr
+"""
+
+import argparse
+import pathlib
+import shutil
+
+import xarray as xr
+import zarr
+from numcodecs import Blosc
+
+CELL_BY_GENE_MC_FRAC_ZARR_PATH = "/cemba/wmb/GeneChunks/CEMBA.snmC/"
+GENE_MAJOR_MC_FRAC_ZARR_PATH = "/cemba/wmb/GeneChunks/CEMBA.snmC.gene_major.zarr"
+GENE_MC_FRAC_DA_NAME = "geneslop2k-vm23_da_frac_fc"
+GENE_DIM = "geneslop2k-vm23"
+
+
+def gene_major_store_path():
+    """
+    Get the path of the gene-major store if it has been built, otherwise the original store path.
+
+    The store is built in a temporary directory and only moved to its path once complete.
+    """
+    if pathlib.Path(GENE_MAJOR_MC_FRAC_ZARR_PATH).exists():
+        return GENE_MAJOR_MC_FRAC_ZARR_PATH
+    else:
+        return CELL_BY_GENE_MC_FRAC_ZARR_PATH
+
+
+def build_gene_major_store(
+    input_path: str,
+    output_path: str,
+    da_name: str = GENE_MC_FRAC_DA_NAME,
+    gene_dim: str = GENE_DIM,
+    genes_per_chunk: int = 1,
+    genes_per_block: int = 256,
+    compressor_level: int = 3,
+) -> None:
+    """
+    Rewrite a cell-by-gene data array into a gene-major zarr store.
+
+    Each chunk contains all cells of genes_per_chunk genes and one mc_type,
+    compressed with zstd and bit-shuffle, the store metadata is consolidated.
+    The store is written to "{output_path}.building" and renamed to output_path when it is complete,
+    so an interrupted or running build is never read by the browser.
+
+    Parameters
+    ----------
+    input_path : path of the original zarr store
+    output_path : path of the gene-major zarr store
+    da_name : name of the data array to rewrite
+    gene_dim : name of the gene dimension
+    genes_per_chunk : number of genes in each chunk
+    genes_per_block : number of genes loaded into memory and written at a time,
+        must be a multiple of genes_per_chunk
+    compressor_level : zstd compression level
+
+    Returns
+    -------
+    None
+    """
+    if genes_per_block % genes_per_chunk != 0:
+        raise ValueError("genes_per_block must be a multiple of genes_per_chunk.")
+
+    da = xr.open_zarr(input_path)[da_name]
+    da.encoding.clear()
+    chunks = {dim: -1 for dim in da.dims}
+    chunks[gene_dim] = genes_per_chunk
+    if "mc_type" in da.dims:
+        chunks["mc_type"] = 1
+    encoding = {
+        da_name: {
+            "chunks": tuple(da.sizes[dim] if chunks[dim] == -1 else chunks[dim] for dim in da.dims),
+            "compressor": Blosc(cname="zstd", clevel=compressor_level, shuffle=Blosc.BITSHUFFLE),
+        }
+    }
+
+    output_path = pathlib.Path(output_path)
+    building_path = output_path.with_name(f"{output_path.name}.building")
+    if building_path.exists():
+        shutil.rmtree(building_path)
+
+    # write the store metadata and coords, data is written block by block
+    ds = da.chunk(chunks).to_dataset(name=da_name)
+    ds.to_zarr(building_path, mode="w", compute=False, encoding=encoding, consolidated=True)
+
+    drop_vars = [k for k, v in ds.variables.items() if gene_dim not in v.dims]
+    n_genes = da.sizes[gene_dim]
+    for start in range(0, n_genes, genes_per_block):
+        region = slice(start, min(start + genes_per_block, n_genes))
+        print(f"Writing genes {region.start}-{region.stop} of {n_genes}")
+        block = da.isel({gene_dim: region}).load().to_dataset(name=da_name)
+        block.drop_vars(drop_vars).to_zarr(building_path, region={gene_dim: region})
+
+    zarr.consolidate_metadata(str(building_path))
+    if output_path.exists():
+        shutil.rmtree(output_path)
+    building_path.rename(output_path)
+    return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the gene-major store of the cell-by-gene matrices.")
+    parser.add_argument("input_path", nargs="?", default=CELL_BY_GENE_MC_FRAC_ZARR_PATH)
+    parser.add_argument("output_path", nargs="?", default=GENE_MAJOR_MC_FRAC_ZARR_PATH)
+    parser.add_argument("--genes-per-chunk", type=int, default=1)
+    parser.add_argument("--genes-per-block", type=int, default=256)
+    parser.add_argument("--compressor-level", type=int, default=3)
+    args = parser.parse_args()
+    build_gene_major_store(
+        args.input_path,
+        args.output_path,
+        genes_per_chunk=args.genes_per_chunk,
+        genes_per_block=args.genes_per_block,
+        compressor_level=args.compressor_level,
+    )
@@ -1,11 +1,113 @@
+import re
+
 import numpy as np
 import pandas as pd
 
+from .registry import registry
+
 ENCODE_BLACKLIST_PATH = "/ref/blacklist/mm10-blacklist.v2.bed.gz"
 GENCODE_MM10_vm23 = "/ref/mm10/gencode/biccn/modified_gencode.vM23.primary_assembly.annotation.gene.flat.tsv.gz"
 MM10_TF_GENE_TABLE_PATH = "/ref/SCENIC/allTFs_mm.gene_info.csv"
 MM10_MAIN_CHROM_SIZES_PATH = "/ref/mm10/mm10.main.chrom.sizes"
 
+_REGION_PATTERN = re.compile(r"^(.+?)[:\-,](\d+)[:\-,](\d+)$")
+
+
+class GenomeCoordIndex:
+    """
+    Global coordinates of genomic regions and genes, chromosomes are concatenated in the chrom sizes order.
+
+    The chromosome offsets and the gene positions are computed once, so converting a region or a gene
+    to global coordinates is a few dict lookups, and batches of loci are converted with numpy at once.
+    """
+
+    def __init__(self, chrom_sizes: pd.Series, gene_meta: pd.DataFrame) -> None:
+        """
+        Build the index.
+
+        Parameters
+        ----------
+        chrom_sizes : chromosome sizes with chromosome names as index, in the global coordinate order
+        gene_meta : gene table with gene ids as index, and chrom, start, end, gene_name columns
+        """
+        self.chroms = pd.Index(chrom_sizes.index)
+        self.chrom_sizes = chrom_sizes.to_numpy(dtype="int64")
+        self.chrom_offsets = np.concatenate([[0], np.cumsum(self.chrom_sizes)[:-1]]).astype("int64")
+        self.genome_size = int(self.chrom_sizes.sum())
+        self._chrom_index = {chrom: i for i, chrom in enumerate(self.chroms)}
+
+        # genes on the indexed chromosomes, as arrays of chrom index, start and end
+        indexed_genes = gene_meta[gene_meta["chrom"].isin(self.chroms)]
+        self.gene_chrom = self.chroms.get_indexer(indexed_genes["chrom"]).astype("int32")
+        self.gene_start = indexed_genes["start"].to_numpy(dtype="int64")
+        self.gene_end = indexed_genes["end"].to_numpy(dtype="int64")
+
+        # gene id, gene id without version and gene name to the gene row, names are resolved to gene ids
+        # over the whole table like MM10GenomeRef.gene_name_to_id, so the last gene wins for duplicated names
+        id_row = {gene_id: row for row, gene_id in enumerate(indexed_genes.index)}
+        name_to_id = {name: gene_id for gene_id, name in gene_meta["gene_name"].items()}
+        id_base_to_id = {gene_id.split(".")[0]: gene_id for gene_id in gene_meta.index}
+        self._gene_row = {}
+        for key, gene_id in [*name_to_id.items(), *id_base_to_id.items()]:
+            try:
+                self._gene_row[key] = id_row[gene_id]
+            except KeyError:
+                # the gene is not on the indexed chromosomes
+                continue
+        self._gene_row.update(id_row)
+        return
+
+    def parse_regions(self, regions: list) -> tuple:
+        """
+        Parse region strings or gene names to chromosome index, start and end.
+
+        Parameters
+        ----------
+        regions : region strings, e.g. "chr1:1000-2000", or gene names or gene ids
+
+        Returns
+        -------
+        int arrays of chromosome index, start and end
+        """
+        chrom_index = np.empty(len(regions), dtype="int64")
+        starts = np.empty(len(regions), dtype="int64")
+        ends = np.empty(len(regions), dtype="int64")
+        for i, region in enumerate(regions):
+            match = _REGION_PATTERN.match(region.replace(" ", ""))
+            if match is not None:
+                chrom, start, end = match.groups()
+                try:
+                    chrom_index[i] = self._chrom_index[chrom]
+                except KeyError:
+                    raise KeyError(f"Chromosome '{chrom}' not found in chrom sizes.")
+                starts[i] = int(start)
+                ends[i] = int(end)
+            else:
+                try:
+                    row = self._gene_row[region.strip()]
+                except KeyError:
+                    raise KeyError(f"'{region}' is neither a region nor a known gene.")
+                chrom_index[i] = self.gene_chrom[row]
+                starts[i] = self.gene_start[row]
+                ends[i] = self.gene_end[row]
+        return chrom_index, starts, ends
+
+    def to_global_coords(self, regions: list) -> np.ndarray:
+        """
+        Convert region strings or gene names to global coordinates.
+
+        Parameters
+        ----------
+        regions : region strings, e.g. "chr1:1000-2000", or gene names or gene ids
+
+        Returns
+        -------
+        (n_regions, 2) int64 array of global start and end
+        """
+        chrom_index, starts, ends = self.parse_regions(regions)
+        offsets = self.chrom_offsets[chrom_index]
+        return np.stack([offsets + starts, offsets + ends], axis=1)
+
 
 class MM10GenomeRef:
     def __init__(self):
@@ -100,9 +202,25 @@ class MM10GenomeRef:
     def get_tf_gene_names(self):
         return pd.Index(self.get_tf_gene_table()["gene_name"].unique())
 
+    def get_coord_index(self, chrom_sizes: pd.Series = None) -> GenomeCoordIndex:
+        """
+        Get the genome coordinate index of the GENCODE genes.
+
+        Parameters
+        ----------
+        chrom_sizes : chromosome sizes defining the global coordinate order, default is the mm10 main chrom sizes
+
+        Returns
+        -------
+        GenomeCoordIndex
+        """
+        if chrom_sizes is None:
+            chrom_sizes = pd.read_csv(self.MAIN_CHROM_SIZES_PATH, index_col=0, sep="\t", header=None).squeeze()
+        return GenomeCoordIndex(chrom_sizes, self.get_gene_metadata())
+
     def get_tf_motif_table(self):
         df = pd.read_csv(self.CISTARGET_MGI_MOTIF_TF_TABLE_PATH, sep="\t")
         return df
 
 
-mm10 = MM10GenomeRef()
+mm10 = registry.register("mm10", MM10GenomeRef)
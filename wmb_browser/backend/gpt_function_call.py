@@ -1,11 +1,13 @@
 import json
+from functools import lru_cache
 from typing import Tuple
 
 from openai import OpenAI
 
 from wmb_browser.backend.cemba_cell import cemba_cell
+from wmb_browser.backend.registry import registry
 
-client = OpenAI()
+client = registry.register("openai_client", OpenAI)
 
 categorical_variables = [
     "CCFRegionAcronym",
@@ -72,115 +74,119 @@ alias = {
 # make alias key case insensitive
 alias = {k.lower(): v for k, v in alias.items()}
 
-FUNCTIONS = [
-    {
-        "name": "make_cell_scatter_plot",
-        "description": (
-            "Making tsne or umap scatter plot color by categorical or continous variable on named coordinates."
-        ),
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "coord": {
-                    "type": "string",
-                    "description": (
-                        "The coords name can be any one of these regex: "
-                        "'mc_all_(tsne|umap)', '\w+_mr_(tsne|umap)', 'slice\d+_merfish'. "
-                        "The 'mc_all_(tsne|umap)' stand for a global coords for the entire dataset; "
-                        "The '\w+_mr_(tsne|umap)' stand for major brain region coords, including these brain regions: "
-                        f"({cemba_cell.get_metadata('MajorRegion').cat.categories.tolist()}); "
-                        "the 'slice\d+_merfish' stand for MERFISH spatial coords for cornoal brain slices."
-                    ),
-                    "default": (
-                        "If no coords provided, use 'mc_all_tsne'; if not clear about which major region coords, "
-                        "use 'HPF_mr_tsne'; if not clear about which merfish MERFISH coords, use 'slice59_merfish'"
-                    ),
-                },
-                "color": {
-                    "type": "string",
-                    "description": (
-                        "A variable name for scatter color. "
-                        f"Categorical names: {categorical_variables}; "
-                        f"Continuous names: {continuous_variables}; "
-                        "Continuous variable can also be in the form of "
-                        "VALUE_TYPE:GENE_NAME, for example 'mch:Gad1', 'mcg:Foxp2', 'rna:Rorb'. "
-                        "mch stands for gene mCH fraction; mcg stands for gene mCG fraction; "
-                        "rna stands for gene expression."
-                    ),
-                    "default": (
-                        "If user isn't clear about color, use the 'CCFRegionAcronym' for MERFISH coords, "
-                        "and use 'CellSubclass' for other coords"
-                    ),
-                },
-                "scatter_type": {
-                    "type": "string",
-                    "description": (
-                        "Determine the type of coloring variable. This can be infered from the color parameter."
-                    ),
-                    "enum": ["continuous", "categorical"],
+
+@lru_cache(maxsize=None)
+def get_functions() -> list:
+    """Get the GPT function specs, built on first call because they need the cell metadata."""
+    return [
+        {
+            "name": "make_cell_scatter_plot",
+            "description": (
+                "Making tsne or umap scatter plot color by categorical or continous variable on named coordinates."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "coord": {
+                        "type": "string",
+                        "description": (
+                            "The coords name can be any one of these regex: "
+                            "'mc_all_(tsne|umap)', '\w+_mr_(tsne|umap)', 'slice\d+_merfish'. "
+                            "The 'mc_all_(tsne|umap)' stand for a global coords for the entire dataset; "
+                            "The '\w+_mr_(tsne|umap)' stand for major brain region coords, including these brain regions: "
+                            f"({cemba_cell.get_metadata('MajorRegion').cat.categories.tolist()}); "
+                            "the 'slice\d+_merfish' stand for MERFISH spatial coords for cornoal brain slices."
+                        ),
+                        "default": (
+                            "If no coords provided, use 'mc_all_tsne'; if not clear about which major region coords, "
+                            "use 'HPF_mr_tsne'; if not clear about which merfish MERFISH coords, use 'slice59_merfish'"
+                        ),
+                    },
+                    "color": {
+                        "type": "string",
+                        "description": (
+                            "A variable name for scatter color. "
+                            f"Categorical names: {categorical_variables}; "
+                            f"Continuous names: {continuous_variables}; "
+                            "Continuous variable can also be in the form of "
+                            "VALUE_TYPE:GENE_NAME, for example 'mch:Gad1', 'mcg:Foxp2', 'rna:Rorb'. "
+                            "mch stands for gene mCH fraction; mcg stands for gene mCG fraction; "
+                            "rna stands for gene expression."
+                        ),
+                        "default": (
+                            "If user isn't clear about color, use the 'CCFRegionAcronym' for MERFISH coords, "
+                            "and use 'CellSubclass' for other coords"
+                        ),
+                    },
+                    "scatter_type": {
+                        "type": "string",
+                        "description": (
+                            "Determine the type of coloring variable. This can be infered from the color parameter."
+                        ),
+                        "enum": ["continuous", "categorical"],
+                    },
                 },
+                "required": ["scatter_type", "color", "coord"],
             },
-            "required": ["scatter_type", "color", "coord"],
         },
-    },
-    {
-        "name": "higlass_browser",
-        "description": "Making a cell type HiGlass browser. Each browser can take one or two or multiple cell types.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "cell_types": {
-                    "type": "array",
-                    "description": "A list of cell types to be plotted in the browser.",
-                    "items": {
+        {
+            "name": "higlass_browser",
+            "description": "Making a cell type HiGlass browser. Each browser can take one or two or multiple cell types.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "cell_types": {
+                        "type": "array",
+                        "description": "A list of cell types to be plotted in the browser.",
+                        "items": {
+                            "type": "string",
+                            "descriptions": (
+                                "Cell types names are short terms of "
+                                f"{cemba_cell.get_metadata('CellSubClass').cat.categories[[0, 32, 50, 80, 100, 150]]}"
+                            ),
+                        },
+                        "default": ["CA3 Glut", "Sst Gaba"],
+                    },
+                    "modalities": {
+                        "type": "array",
+                        "description": "A list of modalities to be plotted in the browser.",
+                        "items": {
+                            "type": "string",
+                            "enum": modalities,
+                        },
+                    },
+                    "browser_type": {
                         "type": "string",
-                        "descriptions": (
-                            "Cell types names are short terms of "
-                            f"{cemba_cell.get_metadata('CellSubClass').cat.categories[[0, 32, 50, 80, 100, 150]]}"
+                        "description": (
+                            "The type of the browser to be plotted. "
+                            "The multi_cell_type_1d or _2d browser can fit in multiple cell types. "
+                            "The two_cell_type_diff browser is for comparing the track "
+                            "difference between two cell types. "
+                            "The loop_zoom_in browser is for the large-scale and "
+                            "zoom-in view of a single cell type."
                         ),
+                        "enum": ["multi_cell_type_1d", "multi_cell_type_2d", "two_cell_type_diff", "loop_zoom_in"],
+                        "default": "multi_cell_type_2d",
                     },
-                    "default": ["CA3 Glut", "Sst Gaba"],
-                },
-                "modalities": {
-                    "type": "array",
-                    "description": "A list of modalities to be plotted in the browser.",
-                    "items": {
+                    "region": {
                         "type": "string",
-                        "enum": modalities,
+                        "description": (
+                            "The genome region of the browser, can be CHROM:START-END or a gene name. "
+                            "For example: chr1:2000000-2100000 or Gad1"
+                        ),
+                        "default": "Gad1",
                     },
                 },
-                "browser_type": {
-                    "type": "string",
-                    "description": (
-                        "The type of the browser to be plotted. "
-                        "The multi_cell_type_1d or _2d browser can fit in multiple cell types. "
-                        "The two_cell_type_diff browser is for comparing the track "
-                        "difference between two cell types. "
-                        "The loop_zoom_in browser is for the large-scale and "
-                        "zoom-in view of a single cell type."
-                    ),
-                    "enum": ["multi_cell_type_1d", "multi_cell_type_2d", "two_cell_type_diff", "loop_zoom_in"],
-                    "default": "multi_cell_type_2d",
-                },
-                "region": {
-                    "type": "string",
-                    "description": (
-                        "The genome region of the browser, can be CHROM:START-END or a gene name. "
-                        "For example: chr1:2000000-2100000 or Gad1"
-                    ),
-                    "default": "Gad1",
-                },
+                "required": ["cell_types", "browser_type", "region"],
             },
-            "required": ["cell_types", "browser_type", "region"],
         },
-    },
-]
+    ]
 
 
 def parse_user_input(user_input: str) -> Tuple[str, dict, object]:
     """Parse user input and return function_name, function_args, and full response."""
     messages = [{"role": "user", "content": user_input}]
-    functions = FUNCTIONS
+    functions = get_functions()
     response = client.chat.completions.create(
         model="gpt-4o-mini-2024-07-18", messages=messages, functions=functions, function_call="auto"
     )
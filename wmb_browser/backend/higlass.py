@@ -1,3 +1,4 @@
+import inspect
 import re
 from collections import defaultdict
 from functools import partial
@@ -7,14 +8,22 @@ import numpy as np
 import pandas as pd
 from higlass.api import display, gather_plugin_urls
 
+from .cache import SizedCache
 from .colors import color_collection
 from .genome import mm10
+from .track_catalog import TrackCatalog
 
 TRACK_TABLE_PATH = "/browser/metadata/HiglassTracks.csv.gz"
 CHROM_SIZES_PATH = "/browser/genome/mm10.main.chrom.sizes"
+REMOTE_TILE_SERVER = "https://mousebrain.salk.edu:8001/api/v1"
 
 DEFAULT_HEIGHT_1D = 25
 DEFAULT_HEIGHT_2D = 450
+HTML_CACHE_BYTES = 64 * 1024**2
+
+# viewconf arguments normalized for the html cache key
+_LIST_ARGS = {"cell_types", "modalities", "modality_1d"}
+_REGION_ARGS = {"region", "region1", "region2", "zoom_region1", "zoom_region2"}
 
 MODALITY_PALETTE = {
     # modality: {color key: value}
@@ -54,6 +63,15 @@ def string_to_list(string):
         return string
 
 
+def _freeze(value):
+    """Turn a value into a hashable cache key part."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    elif isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
 def _auto_view_width(ncts):
     if ncts <= 1:
         view_width = 12
@@ -106,11 +124,20 @@ class HiglassBrowser:
         self.toggle_position_search_box = toggle_position_search_box
 
         self.track_table = pd.read_csv(TRACK_TABLE_PATH, index_col=0)
-        self.subclass_list = self.track_table["CellSubClass"].dropna().unique().tolist()
+        self.track_catalog = TrackCatalog(self.track_table)
+        self.subclass_list = self.track_catalog.cell_types
         self.chrom_sizes = pd.read_csv(CHROM_SIZES_PATH, index_col=0, sep="\t", header=None).squeeze()
-
-        self.all_modality_1d = ["ATAC CPM", "SMART CPM", "mCH Frac", "mCG Frac", "Domain Boundary", "Compartment Score"]
-        self.all_modality_2d = ["Impute 100K", "Impute 10K", "Raw 100K"]
+        self.coord_index = mm10.get_coord_index(self.chrom_sizes)
+
+        # only keep the modalities having tracks in the catalog
+        self.all_modality_1d = [
+            m
+            for m in ["ATAC CPM", "SMART CPM", "mCH Frac", "mCG Frac", "Domain Boundary", "Compartment Score"]
+            if m in self.track_catalog.modalities
+        ]
+        self.all_modality_2d = [
+            m for m in ["Impute 100K", "Impute 10K", "Raw 100K"] if m in self.track_catalog.modalities
+        ]
         self.modality_list = self.all_modality_1d + self.all_modality_2d
 
         self.subclass_palette = color_collection.get_colors("subclass")
@@ -118,6 +145,9 @@ class HiglassBrowser:
         self.modality_palette = MODALITY_PALETTE
         self.genome_tilesets = GENOME_TILESETS
 
+        # cache of the rendered html and height, key: layout name and normalized viewconf arguments
+        self._html_cache = SizedCache(max_bytes=HTML_CACHE_BYTES, sizeof=lambda v: len(v[0]))
+
     def _default_track_options(self, track_option_dict):
         if track_option_dict is None:
             track_option_dict = {}
@@ -142,8 +172,6 @@ class HiglassBrowser:
         ----------
         region : str
             Region string, e.g. chr1:1000-2000
-        chrom_sizes : pd.Series
-            Chromosome sizes
         extend_fold : float, optional
             Extend the region by this fold, by default 0.5
 
@@ -152,35 +180,39 @@ class HiglassBrowser:
         global_start, global_end
             Global coordinates
         """
-        if not re.search(".+(:|-|,)\d+(:|-|,)\d+", region):
-            region = mm10.get_gene_region(region)
-        chrom, _, start, _, end = re.split("(:|-|,)", region.replace(" ", ""))
+        return tuple(self._regions_to_global_coords([region], extend_fold, min_extend_length)[0].tolist())
 
-        chrom_order_index = self.chrom_sizes.index.tolist().index(chrom)
-        global_chrom_start = self.chrom_sizes[:chrom_order_index].sum()
+    def _regions_to_global_coords(self, regions, extend_fold=0.5, min_extend_length=500000):
+        """
+        Turn region strings or gene names into extended global number coordinates at once.
 
-        global_start = global_chrom_start + int(start)
-        global_end = global_chrom_start + int(end)
+        Parameters
+        ----------
+        regions : list of str
+            Region strings, e.g. chr1:1000-2000, or gene names
+        extend_fold : float, optional
+            Extend the regions by this fold, by default 0.5
+        min_extend_length : int, optional
+            Extend the regions by at least this length, by default 500000
 
-        length = global_end - global_start
-        extend_length = max(abs(length) * extend_fold, min_extend_length)
-        global_start -= extend_length
-        global_end += extend_length
+        Returns
+        -------
+        np.ndarray
+            (n_regions, 2) global start and end of each region
+        """
+        coords = self.coord_index.to_global_coords(regions).astype("float64")
+        global_start, global_end = coords[:, 0], coords[:, 1]
 
-        if global_start > global_end:
-            global_start, global_end = global_end, global_start
+        length = global_end - global_start
+        extend_length = np.maximum(np.abs(length) * extend_fold, min_extend_length)
+        global_start = global_start - extend_length
+        global_end = global_end + extend_length
 
-        global_start = max(0, global_start)
-        global_end = min(self.chrom_sizes.sum(), global_end)
-        return global_start, global_end
+        coords = np.sort(np.stack([global_start, global_end], axis=1), axis=1)
+        return np.clip(coords, 0, self.coord_index.genome_size)
 
     def _has_tileset(self, ct_or_name, track_type=None):
-        if ct_or_name in self.track_table.index:
-            return True
-        elif f"{ct_or_name} {track_type}" in self.track_table.index:
-            return True
-        else:
-            return False
+        return self.track_catalog.has_track(ct_or_name, track_type)
 
     def get_ct_tileset(self, ct_or_name, track_type=None):
         """
@@ -198,21 +230,18 @@ class HiglassBrowser:
         tileset
             Tileset object
         """
-        try:
-            row = self.track_table.loc[ct_or_name]
-            name = ct_or_name
-        except KeyError:
-            try:
-                row = self.track_table.loc[f"{ct_or_name} {track_type}"]
-                name = f"{ct_or_name} {track_type}"
-            except KeyError:
-                raise KeyError(f"Cannot find {ct_or_name} {track_type} in track table")
-
-        uuid = row["uuid"]
-
+        name, uuid = self.track_catalog.resolve(ct_or_name, track_type)
         tileset = higlass.remote(uid=uuid, server=self.server, name=name)
         return tileset
 
+    def _normalize_modalities(self, modality_2d, modality_1d):
+        """Split the 1D modalities and fill in the defaults of None modalities, the same rule as the view builders."""
+        if modality_2d is None:
+            modality_2d = self.default_modality_2d
+        if modality_1d is None:
+            modality_1d = self.default_modality_1d
+        return modality_2d, string_to_list(modality_1d)
+
     def _get_cell_type_2d_view(
         self,
         cell_type,
@@ -223,10 +252,7 @@ class HiglassBrowser:
         track_option_dict="default",
     ):
         """Get a 2D view for a given cell type"""
-        if modality_2d is None:
-            modality_2d = self.default_modality_2d
-        if modality_1d is None:
-            modality_1d = self.default_modality_1d
+        modality_2d, modality_1d = self._normalize_modalities(modality_2d, modality_1d)
 
         _get_tileset = partial(self.get_ct_tileset, ct_or_name=cell_type)
 
@@ -272,7 +298,9 @@ class HiglassBrowser:
         track_option_dict="default",
     ):
         cell_types = string_to_list(cell_types)
-        modality_1d = string_to_list(modality_1d)
+        # the same normalized modalities are validated and passed to the view builder
+        modality_2d, modality_1d = self._normalize_modalities(modality_2d, modality_1d)
+        self.track_catalog.check_tracks(cell_types, [modality_2d, *modality_1d])
 
         if view_width == "auto":
             view_width = _auto_view_width(len(cell_types))
@@ -291,12 +319,13 @@ class HiglassBrowser:
             )
 
         # set initial domain
-        for v in views:
+        if region1 is not None:
             if region2 is None:
                 region2 = region1
-            if region1 is not None:
-                v.domain(x=self._region_to_global_coord(region1), inplace=True)
-                v.domain(y=self._region_to_global_coord(region2), inplace=True)
+            domain_x, domain_y = map(tuple, self._regions_to_global_coords([region1, region2]).tolist())
+            for v in views:
+                v.domain(x=domain_x, inplace=True)
+                v.domain(y=domain_y, inplace=True)
 
         if len(cell_types) > 1:
             locks = []
@@ -362,6 +391,7 @@ class HiglassBrowser:
 
         if modalities is None:
             modalities = self.default_modality_1d
+        self.track_catalog.check_tracks(cell_types, modalities)
         if groupby == "modality":
             groups = [(_ct, _m) for _m in modalities for _ct in cell_types]
         else:
@@ -437,12 +467,8 @@ class HiglassBrowser:
         region2=None,
         track_option_dict="default",
     ):
-        if modality_1d is None:
-            modality_1d = self.default_modality_1d
-        if modality_2d is None:
-            modality_2d = self.default_modality_2d
-
-        modality_1d = string_to_list(modality_1d)
+        modality_2d, modality_1d = self._normalize_modalities(modality_2d, modality_1d)
+        self.track_catalog.check_tracks([cell_type_1, cell_type_2], [modality_2d, *modality_1d])
 
         # center tracks
         center1 = self.get_ct_tileset(ct_or_name=cell_type_1, track_type=modality_2d).track(
@@ -520,12 +546,13 @@ class HiglassBrowser:
         viewconf = (v1 | v3 | v2).locks(*locks)
 
         # set initial domain
-        for v in viewconf.views:
+        if region1 is not None:
             if region2 is None:
                 region2 = region1
-            if region1 is not None:
-                v.domain(x=self._region_to_global_coord(region1), inplace=True)
-                v.domain(y=self._region_to_global_coord(region2), inplace=True)
+            domain_x, domain_y = map(tuple, self._regions_to_global_coords([region1, region2]).tolist())
+            for v in viewconf.views:
+                v.domain(x=domain_x, inplace=True)
+                v.domain(y=domain_y, inplace=True)
 
         viewconf_height = _get_view_height(viewconf.views[0])
         return viewconf, viewconf_height
@@ -542,12 +569,8 @@ class HiglassBrowser:
         modality_1d=None,
         track_option_dict="default",
     ):
-        modality_1d = string_to_list(modality_1d)
-
-        if modality_2d is None:
-            modality_2d = self.default_modality_2d
-        if modality_1d is None:
-            modality_1d = self.default_modality_1d
+        modality_2d, modality_1d = self._normalize_modalities(modality_2d, modality_1d)
+        self.track_catalog.check_tracks([cell_type], [modality_2d, *modality_1d])
 
         if region2 is None:
             region2 = region1
@@ -556,10 +579,10 @@ class HiglassBrowser:
         if zoom_region2 is None:
             zoom_region2 = zoom_region1
 
-        domain_x = self._region_to_global_coord(region1)
-        domain_y = self._region_to_global_coord(region2)
-        zoom_domain_x = self._region_to_global_coord(zoom_region1, min_extend_length=5000)
-        zoom_domain_y = self._region_to_global_coord(zoom_region2, min_extend_length=5000)
+        domain_x, domain_y = map(tuple, self._regions_to_global_coords([region1, region2]).tolist())
+        zoom_domain_x, zoom_domain_y = map(
+            tuple, self._regions_to_global_coords([zoom_region1, zoom_region2], min_extend_length=5000).tolist()
+        )
 
         coord_min = np.min([domain_x, domain_y])
         coord_max = np.max([domain_x, domain_y])
@@ -645,10 +668,56 @@ class HiglassBrowser:
         plugin_urls = [] if viewconf.views is None else gather_plugin_urls(viewconf.views)
         return renderer(view_dict, plugin_urls=plugin_urls)["text/html"]
 
+    def _normalize_region(self, region):
+        if region is None:
+            return None
+        chrom_index, start, end = self.coord_index.parse_regions([region])
+        return f"{self.coord_index.chroms[chrom_index[0]]}:{start[0]}-{end[0]}"
+
+    def _normalize_viewconf_args(self, viewconf_func, args, kwargs):
+        """
+        Normalize the viewconf arguments, the normalized arguments are both the cache key and the viewconf input.
+
+        Defaults are filled in, list arguments given as "A+B" strings are split and stripped,
+        gene names are resolved to regions. The list order is kept, it decides the view and track order.
+        """
+        bound = inspect.signature(viewconf_func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        for name, value in bound.arguments.items():
+            if name in _LIST_ARGS and value is not None:
+                bound.arguments[name] = [v.strip() for v in string_to_list(value)]
+            elif name in _REGION_ARGS:
+                bound.arguments[name] = self._normalize_region(value)
+        return bound
+
     def get_higlass_html(self, layout_name, *args, **kwargs):
+        """
+        Get the html and height of a layout, the result is cached by the layout name and normalized arguments.
+
+        Parameters
+        ----------
+        layout_name : name of the layout, e.g. multi_cell_type_2d
+        args, kwargs : arguments of the layout viewconf function
+
+        Returns
+        -------
+        html, viewconf_height
+        """
         # get viewconf function by layout name
         viewconf_func = getattr(self, f"{layout_name}_viewconf")
 
-        viewconf, viewconf_height = viewconf_func(*args, **kwargs)
-        html = self.render_viewconf_to_html(viewconf)
-        return html, viewconf_height
+        # the layout is made from the same normalized arguments as the key, so equal keys give equal layouts
+        bound = self._normalize_viewconf_args(viewconf_func, args, kwargs)
+        key = (layout_name, *((name, _freeze(value)) for name, value in bound.arguments.items()))
+        result = self._html_cache.get(key)
+        if result is None:
+            viewconf, viewconf_height = viewconf_func(*bound.args, **bound.kwargs)
+            html = self.render_viewconf_to_html(viewconf)
+            result = (html, viewconf_height)
+            self._html_cache.put(key, result)
+        return result
+
+    @property
+    def html_cache_stats(self) -> dict:
+        """Get the html cache statistics."""
+        return self._html_cache.stats
@@ -1,9 +1,13 @@
 import inspect
+from functools import partial
 
 import dash_bootstrap_components as dbc
 from dash import dcc, html
 
-from .higlass import HiglassBrowser, string_to_list
+from .higlass import REMOTE_TILE_SERVER, HiglassBrowser, string_to_list
+from .registry import registry
+from .tile_proxy import TILE_PROXY_URL, tile_proxy
+from .tile_server import TILE_SERVER_URL, tile_server
 
 
 class HiglassDash(HiglassBrowser):
@@ -566,6 +570,13 @@ class HiglassDash(HiglassBrowser):
 
 
 # TODO write a func to auto detect server in debug or production mode
-server = "https://mousebrain.salk.edu:8001/api/v1"
-
-higlass = HiglassDash(server=server)
+if tile_server is not None:
+    # the local tile server mounted on the Dash server
+    server = TILE_SERVER_URL
+elif tile_proxy is not None:
+    # the caching proxy of the remote tile server mounted on the Dash server
+    server = TILE_PROXY_URL
+else:
+    server = REMOTE_TILE_SERVER
+
+higlass = registry.register("higlass", partial(HiglassDash, server=server))
@@ -0,0 +1,211 @@
+"""
+Server-side rasterization of scatter plots.
+
+The points are binned into a fixed pixel grid with numpy, each pixel is colored by the mean value
+or the majority category of its points, and the grid is encoded as a PNG image.
+The image size only depends on the grid size, so all objects can be plotted regardless of their number.
+"""
+
+import base64
+import struct
+import zlib
+
+import numpy as np
+
+
+def _pixel_index(x, y, x_range, y_range, width, height):
+    """
+    Get the flat pixel index of each point, row 0 is the top of the image.
+
+    Returns
+    -------
+    flat pixel index of the points inside the ranges, boolean mask of the points inside the ranges
+    """
+    x = np.asarray(x, dtype="float32")
+    y = np.asarray(y, dtype="float32")
+    xmin, xmax = x_range
+    ymin, ymax = y_range
+    col = np.floor((x - xmin) / (xmax - xmin) * width)
+    row = np.floor((ymax - y) / (ymax - ymin) * height)
+    # points exactly on the max edge go to the last pixel
+    col[x == xmax] = width - 1
+    row[y == ymin] = height - 1
+    inside = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+    pixel = row[inside].astype("int64") * width + col[inside].astype("int64")
+    return pixel, inside
+
+
+def rasterize_mean(x, y, values, x_range, y_range, width=512, height=512) -> np.ndarray:
+    """
+    Bin the points into a pixel grid and get the mean value of each pixel.
+
+    Parameters
+    ----------
+    x, y : coordinates of the points
+    values : values of the points
+    x_range, y_range : (min, max) of the grid
+    width, height : number of pixels of the grid
+
+    Returns
+    -------
+    (height, width) float32 array, NaN for pixels without any point
+    """
+    pixel, inside = _pixel_index(x, y, x_range, y_range, width, height)
+    values = np.asarray(values, dtype="float64")[inside]
+    n_pixels = width * height
+    counts = np.bincount(pixel, minlength=n_pixels)
+    sums = np.bincount(pixel, weights=values, minlength=n_pixels)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / counts
+    return mean.astype("float32").reshape(height, width)
+
+
+def rasterize_majority(x, y, codes, x_range, y_range, width=512, height=512) -> np.ndarray:
+    """
+    Bin the points into a pixel grid and get the most frequent category of each pixel.
+
+    Parameters
+    ----------
+    x, y : coordinates of the points
+    codes : non-negative integer category codes of the points, negative codes are ignored
+    x_range, y_range : (min, max) of the grid
+    width, height : number of pixels of the grid
+
+    Returns
+    -------
+    (height, width) int32 array of category codes, -1 for pixels without any point
+    """
+    pixel, inside = _pixel_index(x, y, x_range, y_range, width, height)
+    codes = np.asarray(codes)[inside].astype("int64")
+    use = codes >= 0
+    pixel = pixel[use]
+    codes = codes[use]
+
+    grid = np.full(width * height, -1, dtype="int32")
+    if pixel.size == 0:
+        return grid.reshape(height, width)
+
+    # count each (pixel, code) pair, then keep the code with the largest count in each pixel
+    n_codes = int(codes.max()) + 1
+    pairs, counts = np.unique(pixel * n_codes + codes, return_counts=True)
+    pair_pixel = pairs // n_codes
+    order = np.lexsort((counts, pair_pixel))
+    pair_pixel = pair_pixel[order]
+    is_last = np.ones(pair_pixel.size, dtype=bool)
+    is_last[:-1] = pair_pixel[1:] != pair_pixel[:-1]
+    grid[pair_pixel[is_last]] = pairs[order][is_last] % n_codes
+    return grid.reshape(height, width)
+
+
+def to_rgb_array(colors: list) -> np.ndarray:
+    """
+    Convert colors to an (n, 3) uint8 array.
+
+    Parameters
+    ----------
+    colors : list of "#rrggbb" hex or "rgb(r, g, b)" colors
+
+    Returns
+    -------
+    (n, 3) uint8 array of RGB values
+    """
+    rgb = []
+    for color in colors:
+        color = color.strip()
+        if color.startswith("#"):
+            color = color.lstrip("#")
+            if len(color) == 3:
+                color = "".join(c * 2 for c in color)
+            rgb.append([int(color[i : i + 2], 16) for i in (0, 2, 4)])
+        elif color.startswith("rgb"):
+            rgb.append([round(float(c)) for c in color[color.index("(") + 1 : color.index(")")].split(",")[:3]])
+        else:
+            raise ValueError(f"Unsupported color '{color}', use hex or rgb() colors.")
+    return np.array(rgb, dtype="uint8").reshape(-1, 3)
+
+
+def colorize_continuous(grid: np.ndarray, vmin: float, vmax: float, colorscale: list, n_colors=256) -> np.ndarray:
+    """
+    Color a grid of values with a continuous colorscale.
+
+    Parameters
+    ----------
+    grid : (height, width) array of values, NaN pixels are transparent
+    vmin, vmax : value range of the colorscale, values outside are clipped
+    colorscale : list of evenly spaced colors, e.g. plotly.colors.sequential.Viridis
+    n_colors : number of colors of the interpolated lookup table
+
+    Returns
+    -------
+    (height, width, 4) uint8 RGBA array
+    """
+    anchors = to_rgb_array(colorscale).astype("float32")
+    positions = np.linspace(0, 1, anchors.shape[0])
+    lut_positions = np.linspace(0, 1, n_colors)
+    lut = np.stack([np.interp(lut_positions, positions, anchors[:, i]) for i in range(3)], axis=1)
+    lut = np.round(lut).astype("uint8")
+
+    empty = np.isnan(grid)
+    scaled = (np.nan_to_num(grid, nan=vmin) - vmin) / max(vmax - vmin, 1e-12)
+    index = np.clip(np.round(scaled * (n_colors - 1)), 0, n_colors - 1).astype("int32")
+
+    rgba = np.empty((*grid.shape, 4), dtype="uint8")
+    rgba[..., :3] = lut[index]
+    rgba[..., 3] = np.where(empty, 0, 255)
+    return rgba
+
+
+def colorize_categorical(grid: np.ndarray, colors: np.ndarray) -> np.ndarray:
+    """
+    Color a grid of category codes.
+
+    Parameters
+    ----------
+    grid : (height, width) array of category codes, negative codes are transparent
+    colors : (n_categories, 3) uint8 array of the RGB color of each code
+
+    Returns
+    -------
+    (height, width, 4) uint8 RGBA array
+    """
+    empty = grid < 0
+    rgba = np.empty((*grid.shape, 4), dtype="uint8")
+    rgba[..., :3] = colors[np.where(empty, 0, grid)]
+    rgba[..., 3] = np.where(empty, 0, 255)
+    return rgba
+
+
+def encode_png(rgba: np.ndarray, compress_level: int = 6) -> bytes:
+    """
+    Encode an RGBA image as PNG.
+
+    Parameters
+    ----------
+    rgba : (height, width, 4) uint8 array
+    compress_level : zlib compression level
+
+    Returns
+    -------
+    PNG file content
+    """
+    height, width, _ = rgba.shape
+    # each scanline starts with the filter type byte, 0 means no filter
+    scanlines = np.zeros((height, width * 4 + 1), dtype="uint8")
+    scanlines[:, 1:] = rgba.reshape(height, width * 4)
+
+    def _chunk(chunk_type, data):
+        chunk = chunk_type + data
+        return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        _chunk(b"IHDR", header),
+        _chunk(b"IDAT", zlib.compress(scanlines.tobytes(), compress_level)),
+        _chunk(b"IEND", b""),
+    ])
+
+
+def png_data_uri(rgba: np.ndarray) -> str:
+    """Encode an RGBA image as a PNG data URI, which can be used as the source of a plotly layout image."""
+    return "data:image/png;base64," + base64.b64encode(encode_png(rgba)).decode("ascii")
@@ -0,0 +1,143 @@
+"""Lazy registry of the backend components, each component is created on first access."""
+
+import contextlib
+import threading
+import time
+import traceback
+
+try:
+    import dask
+except ImportError:
+    dask = None
+
+
+class LazyObject:
+    """Proxy of a backend component, the component is created by its factory on first attribute access."""
+
+    def __init__(self, name: str, factory) -> None:
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_obj", None)
+        object.__setattr__(self, "_lock", threading.RLock())
+        object.__setattr__(self, "load_seconds", None)
+        return
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the component has been created."""
+        return self._obj is not None
+
+    def load(self):
+        """Create the component if it has not been created, return the component."""
+        if self._obj is None:
+            with self._lock:
+                if self._obj is None:
+                    start = time.perf_counter()
+                    obj = self._factory()
+                    object.__setattr__(self, "load_seconds", time.perf_counter() - start)
+                    object.__setattr__(self, "_obj", obj)
+                    print(f"Loaded {self._name} in {self.load_seconds:.1f}s")
+        return self._obj
+
+    def __getattr__(self, item):
+        return getattr(self.load(), item)
+
+    def __setattr__(self, key, value):
+        setattr(self.load(), key, value)
+
+    def __repr__(self) -> str:
+        status = "loaded" if self.loaded else "not loaded"
+        return f"<LazyObject {self._name} ({status})>"
+
+
+class LazyRegistry:
+    """Registry of the lazy backend components."""
+
+    def __init__(self) -> None:
+        self._components = {}
+        self._warm_up_thread = None
+        # name: repr of the exception raised while warming up the component
+        self._warm_up_errors = {}
+        return
+
+    def register(self, name: str, factory) -> LazyObject:
+        """
+        Register a component, it is created by factory on first access.
+
+        Parameters
+        ----------
+        name : name of the component
+        factory : function without arguments creating the component
+
+        Returns
+        -------
+        LazyObject proxy of the component
+        """
+        if name in self._components:
+            raise ValueError(f"Component '{name}' already registered.")
+        component = LazyObject(name, factory)
+        self._components[name] = component
+        return component
+
+    def __getitem__(self, name: str) -> LazyObject:
+        return self._components[name]
+
+    def _warm_up(self, names, synchronous=False):
+        if synchronous and dask is not None:
+            scheduler = dask.config.set(scheduler="synchronous")
+        else:
+            scheduler = contextlib.nullcontext()
+        with scheduler:
+            for name in names:
+                # one failing component must not leave the others cold, the error is printed and kept in status
+                try:
+                    obj = self._components[name].load()
+                    # also load the lazy parts of the component, e.g. dataset coords and var matrices
+                    warm_up = getattr(obj, "warm_up", None)
+                    if callable(warm_up):
+                        warm_up()
+                except Exception as e:
+                    self._warm_up_errors[name] = repr(e)
+                    print(f"Failed to warm up {name}: {e!r}")
+                    traceback.print_exc()
+                else:
+                    self._warm_up_errors.pop(name, None)
+        return
+
+    def warm_up(self, names: list = None, background: bool = False, synchronous: bool = False):
+        """
+        Create the registered components before they are requested.
+
+        Parameters
+        ----------
+        names : names of the components to warm up, default all
+        background : whether to warm up in a daemon thread and return immediately
+        synchronous : whether to compute the dask arrays with the synchronous scheduler, needed before forking,
+            the pool and locks of the threaded scheduler are copied into the forked processes without their threads,
+            so the first dask compute of the forked processes would hang
+
+        Returns
+        -------
+        the warm up thread if background is True, otherwise None
+        """
+        if names is None:
+            names = list(self._components.keys())
+        if not background:
+            self._warm_up(names, synchronous)
+            return None
+        self._warm_up_thread = threading.Thread(target=self._warm_up, args=(names, synchronous), daemon=True)
+        self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    @property
+    def status(self) -> dict:
+        """Get the load status of each component, and the error of the components failed to warm up."""
+        status = {}
+        for name, c in self._components.items():
+            status[name] = {"loaded": c.loaded, "load_seconds": c.load_seconds}
+            if name in self._warm_up_errors:
+                status[name]["warm_up_error"] = self._warm_up_errors[name]
+        return status
+
+
+registry = LazyRegistry()
@@ -0,0 +1,260 @@
+"""
+Optional caching proxy in front of the upstream HiGlass tile server.
+
+The proxy serves the HiGlass server API on the Dash server and forwards the tile and tileset info requests to the
+upstream server through a pooled requests session, or through urllib without connection pooling if the optional
+requests package is not installed. Responses are kept in a disk LRU cache with a time to live,
+shared by all gunicorn workers, and duplicate tile ids requested while a fetch is in flight wait for that fetch
+instead of requesting the tile again.
+
+Set WMB_BROWSER_TILE_PROXY_DIR to enable the proxy, the HiGlass views then load the tiles from
+WMB_BROWSER_TILE_PROXY_URL (default "/proxy/api/v1", relative to the Dash host).
+WMB_BROWSER_TILE_PROXY_UPSTREAM changes the upstream server, e.g. to a local tile server for testing.
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .cache import DiskCache
+from .higlass import REMOTE_TILE_SERVER
+from .registry import registry
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
+TILE_PROXY_DIR = os.environ.get("WMB_BROWSER_TILE_PROXY_DIR")
+TILE_PROXY_URL = os.environ.get("WMB_BROWSER_TILE_PROXY_URL", "/proxy/api/v1")
+TILE_PROXY_UPSTREAM = os.environ.get("WMB_BROWSER_TILE_PROXY_UPSTREAM", REMOTE_TILE_SERVER)
+
+TILE_PROXY_CACHE_BYTES = 4 * 1024**3
+TILE_PROXY_TTL = 7 * 24 * 3600
+TILE_PROXY_POOL_SIZE = 16
+TILE_PROXY_TIMEOUT = 30
+IDS_PER_UPSTREAM_REQUEST = 32
+
+
+class TileProxy:
+    """
+    Caching proxy of a HiGlass tile server.
+
+    Parameters
+    ----------
+    upstream : URL of the upstream HiGlass server API, e.g. https://higlass.io/api/v1
+    cache_dir : directory of the disk cache
+    cache_bytes : disk budget of the cache in bytes
+    ttl : time to live of the cached responses in seconds
+    pool_size : number of pooled upstream connections and fetch threads
+    timeout : timeout of the upstream requests in seconds, requests wait at most twice as long for their tiles
+    """
+
+    def __init__(
+        self,
+        upstream,
+        cache_dir,
+        cache_bytes=TILE_PROXY_CACHE_BYTES,
+        ttl=TILE_PROXY_TTL,
+        pool_size=TILE_PROXY_POOL_SIZE,
+        timeout=TILE_PROXY_TIMEOUT,
+    ) -> None:
+        self.upstream = upstream.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        # tiles are small, only scan the cache directory for eviction after every 1% of the budget is written
+        self._cache = DiskCache(cache_dir, max_bytes=cache_bytes, ttl=ttl, evict_every_bytes=cache_bytes // 100)
+
+        # key: (route, id), value: Future of the response json of the id
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self._tileset_hits = Counter()
+        self._tileset_misses = Counter()
+
+        # the session and thread pool are created in each process on first use,
+        # connections and threads must not be shared with the gunicorn workers forked from the master
+        self._session = None
+        self._executor = None
+        self._pid = None
+        return
+
+    def _get_session_and_executor(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    if requests is not None:
+                        session = requests.Session()
+                        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                        session.mount("http://", adapter)
+                        session.mount("https://", adapter)
+                        self._session = session
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size)
+                    self._inflight = {}
+                    self._pid = os.getpid()
+        return self._session, self._executor
+
+    def _fetch_upstream(self, route, ids) -> dict:
+        """Request the ids from the upstream server, return the response dict of id to value."""
+        session, _ = self._get_session_and_executor()
+        params = [("d", i) for i in ids]
+        if session is None:
+            url = f"{self.upstream}/{route}/?{urllib.parse.urlencode(params)}"
+            # raises HTTPError for error status codes, like raise_for_status
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                result = json.load(response)
+        else:
+            response = session.get(f"{self.upstream}/{route}/", params=params, timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+        if not isinstance(result, dict):
+            raise ValueError(f"Upstream response is a {type(result).__name__}, not a JSON object")
+        return result
+
+    def _resolve(self, route, i, future, value_json=None, error=None) -> None:
+        with self._lock:
+            self._inflight.pop((route, i), None)
+        if future.done():
+            return
+        if error is None:
+            future.set_result(value_json)
+        else:
+            future.set_exception(error)
+        return
+
+    def _fetch_and_resolve(self, route, ids, futures) -> None:
+        """Fetch the ids, cache the valid responses and resolve the futures with the response json strings."""
+        try:
+            try:
+                result = self._fetch_upstream(route, ids)
+                missing = {"error": "Missing in upstream response"}
+            except Exception as e:
+                result = {}
+                missing = {"error": f"Upstream request failed: {e}"}
+
+            for i in ids:
+                value = result.get(i, missing)
+                value_json = json.dumps(value)
+                # error responses are not cached, so they are requested again next time
+                if not (isinstance(value, dict) and "error" in value):
+                    try:
+                        self._cache.put((route, i), value_json.encode())
+                    except OSError as e:
+                        # the response is still served, only caching it failed
+                        print(f"Tile proxy failed to cache {route} {i}: {e}")
+                self._resolve(route, i, futures[i], value_json=value_json)
+        finally:
+            # never leave a waiter or an in-flight key behind
+            for i in ids:
+                self._resolve(route, i, futures[i], error=RuntimeError(f"Tile proxy failed to resolve {i}"))
+        return
+
+    def get_json(self, route, ids) -> str:
+        """
+        Get the responses of the ids as a JSON object string of id to response.
+
+        Parameters
+        ----------
+        route : "tiles" or "tileset_info"
+        ids : list of tile ids or tileset uuids
+
+        Returns
+        -------
+        JSON object string
+        """
+        ids = list(dict.fromkeys(ids))
+        values = {}
+        futures = {}
+        to_fetch = []
+        _, executor = self._get_session_and_executor()
+        for i in ids:
+            uuid = i.split(".")[0]
+            value = self._cache.get((route, i))
+            if value is not None:
+                with self._lock:
+                    self._tileset_hits[uuid] += 1
+                values[i] = value.decode()
+                continue
+
+            # wait for the fetch in flight instead of requesting the id again
+            with self._lock:
+                self._tileset_misses[uuid] += 1
+                future = self._inflight.get((route, i))
+                if future is None:
+                    future = Future()
+                    self._inflight[(route, i)] = future
+                    to_fetch.append(i)
+                else:
+                    self.coalesced += 1
+            futures[i] = future
+
+        for start in range(0, len(to_fetch), IDS_PER_UPSTREAM_REQUEST):
+            chunk = to_fetch[start : start + IDS_PER_UPSTREAM_REQUEST]
+            executor.submit(self._fetch_and_resolve, route, chunk, futures)
+
+        deadline = time.monotonic() + 2 * self.timeout
+        for i, future in futures.items():
+            try:
+                values[i] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                # the fetch in flight may still finish and cache the response for the next requests
+                values[i] = json.dumps({"error": f"Tile proxy request failed: {e!r}"})
+        return "{" + ",".join(f"{json.dumps(i)}:{values[i]}" for i in ids) + "}"
+
+    @property
+    def stats(self) -> dict:
+        """Get the disk cache statistics, the coalesced request count and the hit rate of each tileset."""
+        tilesets = {}
+        for uuid in set(self._tileset_hits) | set(self._tileset_misses):
+            hits = self._tileset_hits[uuid]
+            misses = self._tileset_misses[uuid]
+            tilesets[uuid] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+        return {"disk": self._cache.stats, "coalesced": self.coalesced, "tilesets": tilesets}
+
+
+def register_tile_proxy_routes(server, tile_proxy, prefix="/proxy/api/v1") -> None:
+    """
+    Register the HiGlass server API routes of the tile proxy on a Flask server.
+
+    Parameters
+    ----------
+    server : Flask server, e.g. the Dash app.server
+    tile_proxy : TileProxy or its registry LazyObject
+    prefix : URL prefix of the routes
+
+    Returns
+    -------
+    None
+    """
+    from flask import Response, request
+
+    def _json_response(text):
+        response = Response(text, mimetype="application/json")
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        return response
+
+    @server.route(f"{prefix}/tileset_info/", endpoint="proxy_tileset_info")
+    def tileset_info():
+        return _json_response(tile_proxy.get_json("tileset_info", request.args.getlist("d")))
+
+    @server.route(f"{prefix}/tiles/", endpoint="proxy_tiles")
+    def tiles():
+        return _json_response(tile_proxy.get_json("tiles", request.args.getlist("d")))
+
+    return
+
+
+def _create_tile_proxy():
+    return TileProxy(TILE_PROXY_UPSTREAM, TILE_PROXY_DIR)
+
+
+if TILE_PROXY_DIR is not None:
+    tile_proxy = registry.register("tile_proxy", _create_tile_proxy)
+else:
+    tile_proxy = None
@@ -0,0 +1,433 @@
+"""
+Optional local HiGlass tile server mounted on the Dash Flask server.
+
+The tile server serves local tilesets with the HiGlass server API, so the browser can run without the remote
+tile server. Each tileset is stored in the tile server directory as ``{uuid}{suffix}``, the uuid is the one in the
+track table. Cooler (.mcool), bigwig (.bw) and beddb (.beddb) files need the optional clodius package,
+dense 1D tilesets (.npy) are served with numpy only.
+
+Set WMB_BROWSER_TILE_SERVER_DIR to enable the tile server, the HiGlass views then load the tiles from
+WMB_BROWSER_TILE_SERVER_URL (default "/api/v1", relative to the Dash host).
+Write synthetic dense 1D tilesets for some cell types to test the browser offline:
+
+    python -m wmb_browser.backend.tile_server OUTPUT_DIR "CA3 Glut" "Sst Gaba"
+"""
+
+import base64
+import json
+import os
+import pathlib
+import sys
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .cache import SizedCache
+from .higlass import CHROM_SIZES_PATH, TRACK_TABLE_PATH
+from .registry import registry
+
+try:
+    import clodius.tiles.beddb
+    import clodius.tiles.bigwig
+    import clodius.tiles.cooler
+except ImportError:
+    clodius = None
+
+TILE_SERVER_DIR = os.environ.get("WMB_BROWSER_TILE_SERVER_DIR")
+TILE_SERVER_URL = os.environ.get("WMB_BROWSER_TILE_SERVER_URL", "/api/v1")
+
+TILE_CACHE_BYTES = 256 * 1024**2
+TILE_WORKERS = 8
+TILES_PER_TASK = 16
+
+DENSE_BIN_SIZE = 10000
+DENSE_TILE_SIZE = 1024
+
+# tileset file suffix: file type, the first existing file of a tileset is served
+FILE_SUFFIXES = {
+    ".npy": "dense",
+    ".mcool": "cooler",
+    ".cool": "cooler",
+    ".bw": "bigwig",
+    ".bigwig": "bigwig",
+    ".beddb": "beddb",
+}
+
+
+def _json_default(value):
+    """Serialize the numpy values in clodius tiles."""
+    if isinstance(value, np.generic):
+        return value.item()
+    elif isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _to_json(value) -> str:
+    return json.dumps(value, default=_json_default)
+
+
+class DenseTileset:
+    """
+    Dense 1D tileset of a (n_bins,) value array along the concatenated genome.
+
+    Parameters
+    ----------
+    path : path of the .npy value array, opened with np.memmap
+    bin_size : genome length of each value bin
+    tile_size : number of values in each tile
+    """
+
+    def __init__(self, path, bin_size=DENSE_BIN_SIZE, tile_size=DENSE_TILE_SIZE) -> None:
+        self.values = np.load(path, mmap_mode="r")
+        self.bin_size = bin_size
+        self.tile_size = tile_size
+        self.n_bins = self.values.shape[0]
+        self.max_zoom = max(int(np.ceil(np.log2(self.n_bins / tile_size))), 0)
+        return
+
+    def tileset_info(self) -> dict:
+        """Get the HiGlass tileset info."""
+        return {
+            "min_pos": [0],
+            "max_pos": [self.n_bins * self.bin_size],
+            "max_width": self.tile_size * 2**self.max_zoom * self.bin_size,
+            "tile_size": self.tile_size,
+            "max_zoom": self.max_zoom,
+        }
+
+    def tile(self, zoom: int, x: int) -> dict:
+        """
+        Get a dense tile, each tile value is the mean of 2 ** (max_zoom - zoom) bins.
+
+        Parameters
+        ----------
+        zoom : zoom level of the tile
+        x : position of the tile in the zoom level
+
+        Returns
+        -------
+        HiGlass dense tile dict
+        """
+        if not 0 <= zoom <= self.max_zoom or x < 0:
+            raise ValueError(f"Invalid tile position {zoom}.{x}")
+        bins_per_value = 2 ** (self.max_zoom - zoom)
+        start = x * self.tile_size * bins_per_value
+        end = start + self.tile_size * bins_per_value
+
+        chunk = np.full(end - start, np.nan, dtype="float32")
+        values = np.asarray(self.values[start:end], dtype="float32")
+        chunk[: values.size] = values
+        chunk = chunk.reshape(self.tile_size, bins_per_value)
+        counts = (~np.isnan(chunk)).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            tile = np.nansum(chunk, axis=1) / counts
+        tile = tile.astype("float32")
+
+        has_value = counts > 0
+        return {
+            "dense": base64.b64encode(tile.tobytes()).decode("ascii"),
+            "dtype": "float32",
+            "min_value": float(tile[has_value].min()) if has_value.any() else 0.0,
+            "max_value": float(tile[has_value].max()) if has_value.any() else 0.0,
+        }
+
+    def tiles(self, tile_ids) -> list:
+        """Get the dense tiles of the tile ids "{uuid}.{zoom}.{x}", return a list of (tile_id, tile)."""
+        result = []
+        for tile_id in tile_ids:
+            _, zoom, x = tile_id.split(".")[:3]
+            result.append((tile_id, self.tile(int(zoom), int(x))))
+        return result
+
+
+class LocalTileServer:
+    """
+    Local HiGlass tile server.
+
+    Tiles are kept in an in-process LRU cache as serialized JSON, the missing tiles of a request are generated
+    concurrently in a thread pool, grouped by tileset.
+
+    Parameters
+    ----------
+    tilesets : dict of uuid to (file type, file path)
+    cache_bytes : memory budget of the tile cache in bytes
+    max_workers : number of tile generation threads
+    """
+
+    def __init__(self, tilesets: dict, cache_bytes=TILE_CACHE_BYTES, max_workers=TILE_WORKERS) -> None:
+        self.tilesets = tilesets
+        self.max_workers = max_workers
+
+        self._dense_tilesets = {}
+        self._tileset_infos = {}
+        self._tile_cache = SizedCache(max_bytes=cache_bytes, sizeof=len)
+
+        # the thread pool is created in each process on first use, threads do not survive the gunicorn fork
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        return
+
+    @classmethod
+    def from_track_table(cls, track_table: pd.DataFrame, tileset_dir, **kwargs):
+        """
+        Create the tile server with the tilesets of the track table found in tileset_dir.
+
+        Parameters
+        ----------
+        track_table : track table with tileset uuids in the "uuid" column
+        tileset_dir : directory of the tileset files, named by "{uuid}{suffix}"
+        kwargs : other arguments of LocalTileServer
+
+        Returns
+        -------
+        LocalTileServer
+        """
+        tileset_dir = pathlib.Path(tileset_dir)
+        tilesets = {}
+        for uuid in track_table["uuid"]:
+            for suffix, file_type in FILE_SUFFIXES.items():
+                path = tileset_dir / f"{uuid}{suffix}"
+                if path.exists():
+                    tilesets[uuid] = (file_type, str(path))
+                    break
+        n_clodius = sum(file_type != "dense" for file_type, _ in tilesets.values())
+        if n_clodius > 0 and clodius is None:
+            print(f"{n_clodius} tilesets need the clodius package to be served, install clodius to serve them.")
+        print(f"Local tile server found {len(tilesets)} of {track_table.shape[0]} tilesets in {tileset_dir}")
+        return cls(tilesets, **kwargs)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _get_dense_tileset(self, uuid) -> DenseTileset:
+        try:
+            return self._dense_tilesets[uuid]
+        except KeyError:
+            tileset = DenseTileset(self.tilesets[uuid][1])
+            self._dense_tilesets[uuid] = tileset
+            return tileset
+
+    def _get_tileset_info(self, uuid) -> dict:
+        try:
+            return self._tileset_infos[uuid]
+        except KeyError:
+            pass
+
+        file_type, path = self.tilesets[uuid]
+        if file_type == "dense":
+            info = self._get_dense_tileset(uuid).tileset_info()
+        elif clodius is None:
+            raise ValueError(f"Serving {file_type} tilesets needs the clodius package")
+        elif file_type == "cooler":
+            info = clodius.tiles.cooler.tileset_info(path)
+        elif file_type == "bigwig":
+            info = clodius.tiles.bigwig.tileset_info(path)
+        elif file_type == "beddb":
+            info = clodius.tiles.beddb.tileset_info(path)
+        else:
+            raise ValueError(f"Unknown tileset file type {file_type}")
+        self._tileset_infos[uuid] = info
+        return info
+
+    def tileset_info(self, uuids) -> dict:
+        """
+        Get the tileset info of each uuid, unknown uuids get an error message like the HiGlass server.
+
+        Parameters
+        ----------
+        uuids : list of tileset uuids
+
+        Returns
+        -------
+        dict of uuid to tileset info
+        """
+        infos = {}
+        for uuid in uuids:
+            if uuid not in self.tilesets:
+                infos[uuid] = {"error": f"No such tileset with uid: {uuid}"}
+                continue
+            try:
+                infos[uuid] = self._get_tileset_info(uuid)
+            except Exception as e:
+                infos[uuid] = {"error": str(e)}
+        return infos
+
+    def _tileset_tiles(self, uuid, tile_ids) -> list:
+        file_type, path = self.tilesets[uuid]
+        if file_type == "dense":
+            return self._get_dense_tileset(uuid).tiles(tile_ids)
+        elif clodius is None:
+            raise ValueError(f"Serving {file_type} tilesets needs the clodius package")
+        elif file_type == "cooler":
+            return clodius.tiles.cooler.tiles(path, tile_ids)
+        elif file_type == "bigwig":
+            return clodius.tiles.bigwig.tiles(path, tile_ids)
+        elif file_type == "beddb":
+            return clodius.tiles.beddb.tiles(path, tile_ids)
+        else:
+            raise ValueError(f"Unknown tileset file type {file_type}")
+
+    def _generate_tiles(self, uuid, tile_ids) -> list:
+        """Generate the tiles of one tileset, return a list of (tile_id, tile), failed tiles get an error message."""
+        try:
+            return self._tileset_tiles(uuid, tile_ids)
+        except Exception as e:
+            if len(tile_ids) == 1:
+                return [(tile_ids[0], {"error": str(e)})]
+
+        # generate the tiles one by one, so one invalid tile does not fail the others
+        result = []
+        for tile_id in tile_ids:
+            result.extend(self._generate_tiles(uuid, [tile_id]))
+        return result
+
+    def tiles_json(self, tile_ids) -> str:
+        """
+        Get the tiles as a JSON object string of tile id to tile.
+
+        Parameters
+        ----------
+        tile_ids : list of tile ids "{uuid}.{zoom}.{x}" for 1D tiles or "{uuid}.{zoom}.{x}.{y}" for 2D tiles
+
+        Returns
+        -------
+        JSON object string
+        """
+        tile_ids = list(dict.fromkeys(tile_ids))
+        tile_jsons = {}
+        missing = defaultdict(list)  # key: uuid, value: list of missing tile ids
+        for tile_id in tile_ids:
+            tile_json = self._tile_cache.get(tile_id)
+            if tile_json is not None:
+                tile_jsons[tile_id] = tile_json
+                continue
+            uuid = tile_id.split(".")[0]
+            if uuid in self.tilesets:
+                missing[uuid].append(tile_id)
+            else:
+                tile_jsons[tile_id] = _to_json({"error": f"No such tileset with uid: {uuid}"})
+
+        # generate the missing tiles concurrently, in chunks of each tileset
+        futures = []
+        executor = self._get_executor()
+        for uuid, uuid_tile_ids in missing.items():
+            for start in range(0, len(uuid_tile_ids), TILES_PER_TASK):
+                chunk = uuid_tile_ids[start : start + TILES_PER_TASK]
+                futures.append(executor.submit(self._generate_tiles, uuid, chunk))
+        for future in futures:
+            for tile_id, tile in future.result():
+                tile_json = _to_json(tile)
+                if "error" not in tile:
+                    self._tile_cache.put(tile_id, tile_json)
+                tile_jsons[tile_id] = tile_json
+
+        no_tile_json = _to_json({"error": "Tile not generated"})
+        return "{" + ",".join(f"{json.dumps(k)}:{tile_jsons.get(k, no_tile_json)}" for k in tile_ids) + "}"
+
+    @property
+    def tile_cache_stats(self) -> dict:
+        """Get the tile cache statistics."""
+        return self._tile_cache.stats
+
+
+def register_tile_routes(server, tile_server, prefix="/api/v1") -> None:
+    """
+    Register the HiGlass server API routes of the tile server on a Flask server.
+
+    Parameters
+    ----------
+    server : Flask server, e.g. the Dash app.server
+    tile_server : LocalTileServer or its registry LazyObject
+    prefix : URL prefix of the routes
+
+    Returns
+    -------
+    None
+    """
+    from flask import Response, request
+
+    def _json_response(text):
+        response = Response(text, mimetype="application/json")
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        return response
+
+    @server.route(f"{prefix}/tileset_info/", endpoint="local_tileset_info")
+    def tileset_info():
+        return _json_response(_to_json(tile_server.tileset_info(request.args.getlist("d"))))
+
+    @server.route(f"{prefix}/tiles/", endpoint="local_tiles")
+    def tiles():
+        return _json_response(tile_server.tiles_json(request.args.getlist("d")))
+
+    return
+
+
+def write_synthetic_tilesets(
+    track_table: pd.DataFrame, chrom_sizes: pd.Series, output_dir, cell_types, modalities=None, seed=0
+) -> list:
+    """
+    Write synthetic dense 1D tilesets of some cell types, to test the browser offline.
+
+    Parameters
+    ----------
+    track_table : track table with "uuid", "CellSubClass" and "TrackType" columns
+    chrom_sizes : chromosome sizes, the values cover the concatenated genome
+    output_dir : tile server directory
+    cell_types : cell types to write
+    modalities : 1D modalities to write, default all track types of the cell types
+    seed : random seed
+
+    Returns
+    -------
+    list of the written tileset uuids
+    """
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    use_rows = track_table["CellSubClass"].isin(cell_types)
+    if modalities is not None:
+        use_rows &= track_table["TrackType"].isin(modalities)
+
+    n_bins = int(np.ceil(chrom_sizes.sum() / DENSE_BIN_SIZE))
+    rng = np.random.default_rng(seed)
+    uuids = []
+    for uuid in track_table.loc[use_rows, "uuid"]:
+        # smoothed random signal, so zooming in shows some structure
+        signal = np.convolve(rng.exponential(size=n_bins), np.ones(25) / 25, mode="same")
+        np.save(output_dir / f"{uuid}.npy", signal.astype("float32"))
+        uuids.append(uuid)
+    return uuids
+
+
+def _create_tile_server():
+    track_table = pd.read_csv(TRACK_TABLE_PATH, index_col=0)
+    return LocalTileServer.from_track_table(track_table, TILE_SERVER_DIR)
+
+
+if TILE_SERVER_DIR is not None:
+    tile_server = registry.register("tile_server", _create_tile_server)
+else:
+    tile_server = None
+
+
+if __name__ == "__main__":
+    _track_table = pd.read_csv(TRACK_TABLE_PATH, index_col=0)
+    _chrom_sizes = pd.read_csv(CHROM_SIZES_PATH, index_col=0, sep="\t", header=None).squeeze()
+    # 2D modalities need cooler files, only write the 1D modalities
+    _uuids = write_synthetic_tilesets(
+        _track_table,
+        _chrom_sizes,
+        sys.argv[1],
+        cell_types=sys.argv[2:],
+        modalities=["ATAC CPM", "SMART CPM", "mCH Frac", "mCG Frac", "Domain Boundary", "Compartment Score"],
+    )
+    print(f"Wrote {len(_uuids)} synthetic tilesets to {sys.argv[1]}")
@@ -0,0 +1,132 @@
+"""
+Indexed catalog of the HiGlass tracks.
+
+The track table is indexed once at startup: a track name to uuid dict, a (cell type, modality) to track name dict,
+and a boolean availability matrix of which cell type has which modality.
+"""
+
+import pandas as pd
+
+
+class TrackCatalog:
+    """
+    Catalog of the HiGlass tracks.
+
+    Parameters
+    ----------
+    track_table : pd.DataFrame
+        Track table with track names "{cell type} {track type}" as index, and "uuid", "CellSubClass" columns.
+        The track type is read from the "TrackType" column if present, otherwise from the track name.
+        Tracks without CellSubClass (e.g. genome tracks) can only be resolved by their track name.
+    """
+
+    def __init__(self, track_table: pd.DataFrame) -> None:
+        self.uuids = track_table["uuid"].to_dict()
+
+        cell_tracks = track_table.dropna(subset=["CellSubClass"])
+        if "TrackType" in cell_tracks.columns:
+            track_types = cell_tracks["TrackType"]
+        else:
+            track_types = pd.Series(
+                [
+                    name[len(ct) + 1 :] if name.startswith(f"{ct} ") else None
+                    for name, ct in zip(cell_tracks.index, cell_tracks["CellSubClass"])
+                ],
+                index=cell_tracks.index,
+                dtype="object",
+            )
+        use_rows = track_types.notna()
+        cell_tracks = cell_tracks[use_rows]
+        track_types = track_types[use_rows]
+
+        self.cell_types = cell_tracks["CellSubClass"].unique().tolist()
+        self.modalities = track_types.unique().tolist()
+        self.track_names = {
+            (ct, m): name for name, ct, m in zip(cell_tracks.index, cell_tracks["CellSubClass"], track_types)
+        }
+
+        # cell type by modality matrix, True if the track exists
+        self.availability = (
+            pd.crosstab(cell_tracks["CellSubClass"], track_types)
+            .reindex(index=self.cell_types, columns=self.modalities, fill_value=0)
+            .gt(0)
+        )
+        return
+
+    def resolve(self, ct_or_name, track_type=None):
+        """
+        Get the track name and uuid of a cell type track or a named track.
+
+        Parameters
+        ----------
+        ct_or_name : str
+            Cell type name or track name
+        track_type : str, optional
+            Track type, by default None
+
+        Returns
+        -------
+        name, uuid
+        """
+        if ct_or_name in self.uuids:
+            name = ct_or_name
+        else:
+            try:
+                name = self.track_names[(ct_or_name, track_type)]
+            except KeyError:
+                raise KeyError(f"Cannot find {ct_or_name} {track_type} in track table")
+        return name, self.uuids[name]
+
+    def has_track(self, ct_or_name, track_type=None) -> bool:
+        """Whether a cell type track or a named track exists."""
+        return ct_or_name in self.uuids or (ct_or_name, track_type) in self.track_names
+
+    def missing_tracks(self, cell_types, modalities) -> list:
+        """
+        Get all the missing tracks of the cell types and modalities combinations.
+
+        The combinations are checked in one pass over the availability matrix, the ones not in the matrix are
+        checked again with has_track, so full track names are accepted like in resolve.
+
+        Parameters
+        ----------
+        cell_types : list of str
+            Cell type names
+        modalities : list of str
+            Modality names
+
+        Returns
+        -------
+        list of (cell type, modality) tuples without a track
+        """
+        cell_types = list(dict.fromkeys(cell_types))
+        modalities = list(dict.fromkeys(modalities))
+        available = self.availability.reindex(index=cell_types, columns=modalities, fill_value=False)
+        rows, cols = (~available.to_numpy(dtype=bool)).nonzero()
+        return [
+            (cell_types[i], modalities[j])
+            for i, j in zip(rows, cols)
+            if not self.has_track(cell_types[i], modalities[j])
+        ]
+
+    def check_tracks(self, cell_types, modalities) -> None:
+        """
+        Check that all the cell types have all the modalities, raise KeyError listing every missing track.
+
+        Parameters
+        ----------
+        cell_types : list of str
+            Cell type names
+        modalities : list of str
+            Modality names
+
+        Returns
+        -------
+        None
+        """
+        missing = self.missing_tracks(cell_types, modalities)
+        if len(missing) > 0:
+            missing_str = ", ".join(f"{ct} {m}" for ct, m in missing)
+            raise KeyError(f"Cannot find {len(missing)} tracks in track table: {missing_str}")
+        return
+
@@ -1,3 +1,9 @@
+import glob
+import os
+
+import numpy as np
+
+
 def auto_size(n, scale=3):
     """Auto determine dot size based on ax size and n dots"""
     if n < 500:
@@ -39,3 +45,91 @@ def auto_size(n, scale=3):
 
     s = s * scale
     return s
+
+
+def get_process_memory(pid="self"):
+    """
+    Get the resident and shared memory of a process in MB, read from /proc/<pid>/smaps_rollup (Linux only).
+
+    Rss is the resident memory, Pss splits the shared pages evenly between the processes sharing them,
+    Shared is the resident memory shared with other processes (e.g. pages inherited from the gunicorn master
+    and the page cache of memory-mapped files), Private is the resident memory only used by this process.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "pid": os.getpid() if pid == "self" else int(pid),
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def get_child_pids(pid):
+    """Get the pids of the child processes of a process."""
+    child_pids = []
+    for stat_path in glob.glob("/proc/[0-9]*/stat"):
+        try:
+            with open(stat_path) as f:
+                # the process name is in parentheses and may contain spaces, ppid is the second field after it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            child_pids.append(int(stat_path.split("/")[2]))
+    return sorted(child_pids)
+
+
+def get_workers_memory_report(master_pid=None):
+    """
+    Get the resident vs. shared memory of the gunicorn master and each of its workers, in MB.
+
+    Parameters
+    ----------
+    master_pid
+        pid of the gunicorn master, default is the parent of the current process (i.e. called in a worker)
+
+    Returns
+    -------
+    dict with "master" and "workers" memory reports
+    """
+    if master_pid is None:
+        master_pid = os.getppid()
+    workers = []
+    for pid in get_child_pids(master_pid):
+        try:
+            workers.append(get_process_memory(pid))
+        except OSError:
+            continue
+    return {"master": get_process_memory(master_pid), "workers": workers}
+
+
+def quantize(values, value_range, n_levels=4096):
+    """
+    Round values to the fewest decimals that still resolve n_levels steps of value_range.
+
+    The rounded float64 values are serialized to short JSON numbers,
+    e.g. a float16 coordinate 3.1796875 becomes 3.18 for a value range of 10.
+
+    Parameters
+    ----------
+    values
+        array of values
+    value_range
+        (min, max) of the values that need to be resolved, e.g. the axis range of a plot
+    n_levels
+        number of distinguishable levels in value_range
+
+    Returns
+    -------
+    float64 np.ndarray of rounded values
+    """
+    vmin, vmax = value_range
+    step = abs(float(vmax) - float(vmin)) / n_levels
+    decimals = max(0, int(np.ceil(-np.log10(step)))) if step > 0 else 6
+    return np.round(np.asarray(values, dtype="float64"), decimals)